@@ -0,0 +1,80 @@
+import random
+import re
+
+# inputs are generated from a seed rather than checked in, so every run
+# (and every machine) benchmarks exactly the same text.
+
+SIZES = ('1KB', '1MB', '100MB')
+UNITS = {'': 1, 'B': 1, 'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3}
+
+SYMBOLS = ('define', 'lambda', 'let*', 'car', 'cdr', 'x', 'foo-bar', '+',
+           'list2', 'a')
+
+
+def parse_size(size):
+    "'1MB' -> 1048576, plain numbers are bytes"
+    got = re.fullmatch(r'(\d+)\s*([KMG]?B?)', size.strip().upper())
+    if got is None:
+        raise ValueError('Not a size: {!r}'.format(size))
+    return int(got.group(1)) * UNITS[got.group(2)]
+
+
+def scheme_source(size, seed=0, separator='\n'):
+    """
+    At least size characters of forms, quoted and backquoted lists of
+    symbols, that both the poyais.lisp grammar and the README grammar
+    accept. The README's whitespace rule has a literal backslash n rather
+    than a newline, so it needs separator=' '.
+    """
+    rand = random.Random(seed)
+    forms = []
+    length = 0
+    while length < size:
+        form = '({})'.format(' '.join(
+            rand.choice(SYMBOLS) for _ in range(rand.randint(1, 6))))
+        form = rand.choice(('', "'", '`')) + form
+        forms.append(form)
+        length += len(form) + len(separator)
+    return separator.join(forms)
+
+
+def grammar_source(size, seed=0):
+    """
+    At least size characters of EBNF, rules built from terminals and
+    references to rules defined before them.
+    """
+    rand = random.Random(seed)
+    rules = []
+    length = 0
+    while length < size:
+        idx = len(rules)
+
+        def element():
+            if idx and rand.random() < 0.4:
+                return 'rule {}'.format(rand.randrange(idx))
+            return '"{}"'.format(''.join(
+                rand.choice('abcdef') for _ in range(rand.randint(1, 3))))
+
+        alternatives = []
+        for _ in range(rand.randint(1, 4)):
+            sequence = ' , '.join(element() for _ in range(rand.randint(1, 3)))
+            group = rand.choice(('{}', '( {} )', '{{ {} }}', '[ {} ]'))
+            alternatives.append(group.format(sequence))
+        rule = 'rule {} = {} ;'.format(idx, ' | '.join(alternatives))
+        rules.append(rule)
+        length += len(rule) + 1
+    return '\n'.join(rules)
+
+
+# the rules the README grammar needs to parse a whole file of forms, the
+# same ones poyais.lisp has.
+PROGRAM_RULES = """
+form = sexp | quoted list | backquoted list | symbol ;
+program = { { whitespace }, form }, { whitespace } ;
+"""
+
+
+def readme_grammar(readme_path):
+    with open(readme_path, encoding='utf-8') as readme:
+        got = re.search(r'``` ebnf\n(.*?)```', readme.read(), re.DOTALL)
+    return got.group(1) + PROGRAM_RULES
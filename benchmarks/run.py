@@ -0,0 +1,217 @@
+"""
+Benchmarks for the lexer, the EBNF compiler and the combinator parsers.
+
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.run --compare results.json --threshold 0.1
+
+Every workload runs at every size (1KB and 1MB unless --sizes says
+otherwise, 100MB is opt in). For each it records the best time of
+--repeat runs, throughput, and peak memory traced by tracemalloc in a
+separate run. Across sizes it fits a scaling exponent: about 1 for
+linear work, about 2 for quadratic.
+"""
+from collections import namedtuple, deque
+import argparse
+import json
+import math
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+from poyais import __version__
+from poyais.arena import arena_parser_table
+from poyais.combinator import make_parser_table
+from poyais.ebnf import ebnf_lexer, ebnf_lexer_charwise
+from poyais.ir import optimized_parser_table
+from poyais.lexer import lex, FILE_WHITESPACE
+from poyais import lisp_parser
+from poyais.lisp import EBNF_SPEC
+from poyais.vm import vm_parser_table
+
+from benchmarks.inputs import (
+    scheme_source, grammar_source, readme_grammar, parse_size)
+
+README = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'README.md')
+
+# prepare builds the input for a size, outside of anything measured.
+# run is the part being measured.
+Workload = namedtuple('Workload', ('name', 'prepare', 'run'))
+
+
+def _parse_with(grammar, separator='\n', compile_grammar=make_parser_table):
+    def prepare(size):
+        return (compile_grammar(grammar)['program'],
+                scheme_source(size, separator=separator))
+
+    def run(prepared):
+        program, source = prepared
+        got = program(source, 0)
+        assert got is not None and got.end == len(source)
+    return prepare, run
+
+
+WORKLOADS = (
+    Workload('lex', scheme_source,
+             lambda source: deque(lex(source, whitespace=FILE_WHITESPACE),
+                                  maxlen=0)),
+    Workload('ebnf_lexer', grammar_source,
+             lambda grammar: deque(ebnf_lexer(grammar), maxlen=0)),
+    Workload('ebnf_lexer_charwise', grammar_source,
+             lambda grammar: deque(ebnf_lexer_charwise(grammar), maxlen=0)),
+    Workload('make_parser_table', grammar_source, make_parser_table),
+    Workload('parse_scheme', *_parse_with(EBNF_SPEC)),
+    Workload('parse_readme', *_parse_with(readme_grammar(README), ' ')),
+    Workload('parse_scheme_optimized',
+             *_parse_with(EBNF_SPEC, compile_grammar=optimized_parser_table)),
+    Workload('parse_scheme_arena',
+             *_parse_with(EBNF_SPEC, compile_grammar=arena_parser_table)),
+    Workload('parse_scheme_vm',
+             *_parse_with(EBNF_SPEC, compile_grammar=vm_parser_table)),
+    Workload('parse_scheme_generated',
+             *_parse_with(EBNF_SPEC, compile_grammar=lambda grammar:
+                          lisp_parser.PARSER_TABLE)),
+)
+
+Result = namedtuple('Result', ('workload', 'size', 'bytes', 'seconds',
+                               'throughput', 'peak_memory'))
+
+
+def measure(workload, size, repeat, memory=True):
+    prepared = workload.prepare(parse_size(size))
+    source = prepared[1] if isinstance(prepared, tuple) else prepared
+    best = math.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        workload.run(prepared)
+        best = min(best, time.perf_counter() - start)
+    peak = None
+    if memory:
+        tracemalloc.start()
+        try:
+            workload.run(prepared)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return Result(workload.name, size, len(source), best,
+                  len(source) / best if best else math.inf, peak)
+
+
+def scaling_exponent(results):
+    "Slope of log(seconds) against log(bytes), by least squares"
+    points = [(math.log(result.bytes), math.log(result.seconds))
+              for result in results if result.seconds > 0]
+    if len(points) < 2:
+        return None
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    spread = sum((x - mean_x) ** 2 for x, _ in points)
+    if not spread:
+        return None
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / spread
+
+
+def run_benchmarks(workloads, sizes, repeat, memory=True, log=None):
+    results = []
+    for workload in workloads:
+        for size in sizes:
+            result = measure(workload, size, repeat, memory)
+            results.append(result)
+            if log is not None:
+                log(format_result(result))
+    scaling = {
+        workload.name: scaling_exponent(
+            [result for result in results if result.workload == workload.name])
+        for workload in workloads}
+    return {
+        'meta': {
+            'poyais': __version__,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'repeat': repeat,
+        },
+        'results': [result._asdict() for result in results],
+        'scaling': scaling,
+    }
+
+
+def format_result(result):
+    peak = ('{:.1f} MB'.format(result.peak_memory / 1024 ** 2)
+            if result.peak_memory is not None else '-')
+    return '{:<22} {:>6} {:>10.4f}s {:>10.2f} MB/s  peak {}'.format(
+        result.workload, result.size, result.seconds,
+        result.throughput / 1024 ** 2, peak)
+
+
+def compare(baseline, current, threshold):
+    """
+    Regressions of current against baseline: every (workload, size) both
+    have whose time or peak memory grew by more than threshold (0.1 is
+    10%). Returns a list of messages, empty when nothing regressed.
+    """
+    before = {(result['workload'], result['size']): result
+              for result in baseline['results']}
+    regressions = []
+    for result in current['results']:
+        old = before.get((result['workload'], result['size']))
+        if old is None:
+            continue
+        for field in ('seconds', 'peak_memory'):
+            if not old.get(field) or result.get(field) is None:
+                continue
+            ratio = result[field] / old[field]
+            if ratio > 1 + threshold:
+                regressions.append(
+                    '{} {} {}: {:.4g} -> {:.4g} ({:+.0%})'.format(
+                        result['workload'], result['size'], field,
+                        old[field], result[field], ratio - 1))
+    return regressions
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    arg_parser.add_argument('--sizes', default='1KB,1MB',
+                            help='comma separated, from 1KB, 1MB, 100MB or '
+                                 'a number of bytes (default: 1KB,1MB)')
+    arg_parser.add_argument('--workloads', default=None,
+                            help='comma separated, default all of: ' +
+                                 ', '.join(w.name for w in WORKLOADS))
+    arg_parser.add_argument('--repeat', type=int, default=3)
+    arg_parser.add_argument('--no-memory', action='store_true',
+                            help="skip the tracemalloc run")
+    arg_parser.add_argument('--output', help='write results here as JSON')
+    arg_parser.add_argument('--compare', metavar='BASELINE',
+                            help='fail if results regress against BASELINE')
+    arg_parser.add_argument('--threshold', type=float, default=0.1,
+                            help='allowed regression, 0.1 is 10%% '
+                                 '(default: 0.1)')
+    args = arg_parser.parse_args(argv)
+
+    workloads = WORKLOADS
+    if args.workloads:
+        wanted = args.workloads.split(',')
+        workloads = tuple(w for w in WORKLOADS if w.name in wanted)
+    results = run_benchmarks(workloads, args.sizes.split(','), args.repeat,
+                             memory=not args.no_memory, log=print)
+    for name, exponent in results['scaling'].items():
+        if exponent is not None:
+            print('{:<22} scales as n^{:.2f}'.format(name, exponent))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as out:
+            json.dump(results, out, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as baseline:
+            regressions = compare(json.load(baseline), results, args.threshold)
+        for regression in regressions:
+            print('REGRESSION', regression)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,342 @@
+from array import array
+import re
+
+from poyais.lexer import offset_typecode
+from poyais.ir import optimized_rules, lower, Target, PASSES
+from poyais.utility import LanguageToken, UtilityToken, node_from_iterable
+
+# parse trees without an object per node. an arena keeps every element
+# of a parse (nodes, tokens and empty matches) as a row of parallel
+# arrays, and what the parse returns is a view onto the row it built
+# last. views are made on demand and tokens are sliced out of the source
+# when they're asked for, so a finished parse holds seven arrays and the
+# source, however big it was, and the garbage collector has nothing to
+# look at.
+
+# a node's children are the values of the LanguageNode chain the closure
+# parsers would have built for it, linked through next_siblings.
+
+NODE, TOKEN, EMPTY = 0, 1, 2
+KINDS = ('node', 'token', 'empty')
+
+# no parent, child or sibling
+NOWHERE = -1
+
+
+def _index_typecode(length):
+    # rows can outnumber characters, empty matches don't use any up,
+    # but not by anything like this much
+    return 'i' if length < 2 ** 29 else 'q'
+
+
+class TreeArena:
+    """
+    Every element of a parse of source, one row each: its kind, its
+    parent node, its first child if it's a node, its next sibling, and
+    where it starts and ends in source.
+    """
+    __slots__ = ('source', 'kinds', 'parents', 'first_children',
+                 'next_siblings', 'starts', 'ends')
+
+    def __init__(self, source):
+        self.source = source
+        index, offset = (_index_typecode(len(source)),
+                         offset_typecode(len(source)))
+        self.kinds = array('B')
+        self.parents = array(index)
+        self.first_children = array(index)
+        self.next_siblings = array(index)
+        self.starts = array(offset)
+        self.ends = array(offset)
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def add(self, kind, start, end):
+        "A new token or empty match, returns its row"
+        self.kinds.append(kind)
+        self.parents.append(NOWHERE)
+        self.first_children.append(NOWHERE)
+        self.next_siblings.append(NOWHERE)
+        self.starts.append(start)
+        self.ends.append(end)
+        return len(self.kinds) - 1
+
+    def node(self, children):
+        "A new node of the rows in children, in order, returns its row"
+        row = len(self.kinds)
+        parents = self.parents
+        next_siblings = self.next_siblings
+        previous = NOWHERE
+        for child in children:
+            parents[child] = row
+            if previous != NOWHERE:
+                next_siblings[previous] = child
+            previous = child
+        self.kinds.append(NODE)
+        parents.append(NOWHERE)
+        self.first_children.append(children[0])
+        next_siblings.append(NOWHERE)
+        self.starts.append(self.starts[children[0]])
+        self.ends.append(self.ends[previous])
+        return row
+
+    def truncate(self, size):
+        "Forget every row from size on, what a failed match left behind"
+        for rows in (self.kinds, self.parents, self.first_children,
+                     self.next_siblings, self.starts, self.ends):
+            del rows[size:]
+
+    def value(self, row):
+        """
+        What the closure parsers would have for row: an ArenaNode for a
+        node, a LanguageToken or UtilityToken for anything else.
+        """
+        kind = self.kinds[row]
+        if kind == NODE:
+            return ArenaNode(self, self.first_children[row])
+        start, end = self.starts[row], self.ends[row]
+        if kind == TOKEN:
+            return LanguageToken('terminal', self.source[start:end],
+                                 start, end)
+        return UtilityToken('empty', '', start, end)
+
+    def kind(self, row):
+        return KINDS[self.kinds[row]]
+
+
+class ArenaNode:
+    """
+    LanguageNode's interface over an arena. Like a LanguageNode it's a
+    chain: value is the child it starts at, and link the chain from the
+    next child on.
+    """
+    __slots__ = ('arena', 'row')
+
+    def __init__(self, arena, row):
+        self.arena = arena
+        self.row = row
+
+    @property
+    def value(self):
+        return self.arena.value(self.row)
+
+    @property
+    def link(self):
+        following = self.arena.next_siblings[self.row]
+        return None if following == NOWHERE else ArenaNode(
+            self.arena, following)
+
+    @property
+    def start(self):
+        return self.arena.starts[self.row]
+
+    @property
+    def end(self):
+        arena = self.arena
+        return arena.ends[arena.parents[self.row]]
+
+    @property
+    def length(self):
+        return self.end - self.start
+
+    def __iter__(self):
+        arena = self.arena
+        next_siblings = arena.next_siblings
+        row = self.row
+        while row != NOWHERE:
+            yield arena.value(row)
+            row = next_siblings[row]
+
+    def __str__(self):
+        # tokens are the source they matched, and cover the node's span
+        # with nothing in between
+        return self.arena.source[self.start:self.end]
+
+    def __len__(self):
+        return self.end - self.start
+
+    def __eq__(self, other):
+        return (isinstance(other, ArenaNode) and
+                other.arena is self.arena and other.row == self.row)
+
+    def __hash__(self):
+        return hash((id(self.arena), self.row))
+
+    def __repr__(self):
+        return "ArenaNode({}{})".format(
+            self.value, ', ...' if self.link is not None else '')
+
+    def language_node(self):
+        "The same tree as LanguageNodes, as the closure parsers build it"
+        return node_from_iterable(tuple(
+            value.language_node() if isinstance(value, ArenaNode) else value
+            for value in self))
+
+
+# the parsers here take the arena to build in as well: (arena, string,
+# pos) -> the row of what matched, or None. a parser that fails leaves
+# the arena as it found it, so failed alternatives don't take up rows.
+
+def arena_terminal(terminal):
+    size = len(terminal)
+
+    def parser(arena, string, pos):
+        if string.startswith(terminal, pos):
+            return arena.add(TOKEN, pos, pos + size)
+    parser.literals = (terminal,)
+    return parser
+
+
+def arena_delayed(table, rule):
+    def parser(arena, string, pos):
+        return table[rule](arena, string, pos)
+    return parser
+
+
+def arena_literals(literals):
+    "make_literal_matcher, for an arena"
+    if all(len(literal) == 1 for literal in literals):
+        chars = frozenset(literals)
+
+        def parser(arena, string, pos):
+            if string[pos:pos + 1] in chars:
+                return arena.add(TOKEN, pos, pos + 1)
+    else:
+        reg = re.compile('|'.join(re.escape(literal) for literal in literals))
+
+        def parser(arena, string, pos):
+            match = reg.match(string, pos)
+            if match is not None:
+                return arena.add(TOKEN, pos, match.end())
+    parser.literals = literals
+    return parser
+
+
+def arena_choice(*parsers):
+    literals = tuple(getattr(p, 'literals', None) for p in parsers)
+    if all(literals):
+        return arena_literals(
+            tuple(literal for group in literals for literal in group))
+
+    def parser(arena, string, pos):
+        for p in parsers:
+            got = p(arena, string, pos)
+            if got is not None:
+                return got
+    return parser
+
+
+def arena_repeat(parser):
+    literals = getattr(parser, 'literals', None)
+    if literals and all(len(literal) == 1 for literal in literals):
+        reg = re.compile('[{}]+'.format(
+            ''.join(re.escape(char) for char in literals)))
+
+        def run(arena, string, pos):
+            match = reg.match(string, pos)
+            if match is None:
+                return arena.add(EMPTY, pos, pos)
+            return arena.node([arena.add(TOKEN, idx, idx + 1)
+                               for idx in range(pos, match.end())])
+        return run
+
+    def repeated(arena, string, pos):
+        children = []
+        ends = arena.ends
+        here = pos
+        got = parser(arena, string, here)
+        while got is not None:
+            children.append(got)
+            here = ends[got]
+            got = parser(arena, string, here)
+        if children:
+            return arena.node(children)
+        return arena.add(EMPTY, pos, pos)
+    return repeated
+
+
+def arena_optional(parser):
+    def maybe(arena, string, pos):
+        got = parser(arena, string, pos)
+        if got is None:
+            return arena.add(EMPTY, pos, pos)
+        return got
+    return maybe
+
+
+def _match_steps(steps, arena, string, pos, children):
+    "poyais.ir's _match_steps, building in arena"
+    for step in steps:
+        if step.__class__ is tuple:
+            joined, terminals = step
+            if not string.startswith(joined, pos):
+                return None
+            for terminal in terminals:
+                end = pos + len(terminal)
+                children.append(arena.add(TOKEN, pos, end))
+                pos = end
+        else:
+            got = step(arena, string, pos)
+            if got is None:
+                return None
+            children.append(got)
+            pos = arena.ends[got]
+    return pos
+
+
+def arena_sequence(steps):
+    def parser(arena, string, pos):
+        mark = len(arena)
+        children = []
+        if _match_steps(steps, arena, string, pos, children) is None:
+            arena.truncate(mark)
+            return None
+        return arena.node(children)
+    return parser
+
+
+def arena_factor(prefix, rests):
+    def parser(arena, string, pos):
+        mark = len(arena)
+        children = []
+        pos = _match_steps(prefix, arena, string, pos, children)
+        if pos is not None:
+            for rest in rests:
+                rest_mark = len(arena)
+                got = list(children)
+                if _match_steps(rest, arena, string, pos, got) is not None:
+                    return arena.node(got)
+                arena.truncate(rest_mark)
+        arena.truncate(mark)
+        return None
+    return parser
+
+
+ARENA = Target(
+    terminal=arena_terminal,
+    delayed=arena_delayed,
+    choice=arena_choice,
+    repeat=arena_repeat,
+    optional=arena_optional,
+    sequence=arena_sequence,
+    factor=arena_factor)
+
+
+def _entry(parser):
+    def parse(string, pos=0):
+        arena = TreeArena(string)
+        got = parser(arena, string, pos)
+        return None if got is None else arena.value(got)
+    return parse
+
+
+def arena_parser_table(ebnf_string, roots=None, cache_dir=None,
+                       passes=PASSES):
+    """
+    Like optimized_parser_table, but every parse builds its tree in a
+    fresh TreeArena. Nodes come back as ArenaNodes, tokens as they are.
+    """
+    table = lower(optimized_rules(ebnf_string, roots, cache_dir, passes),
+                  ARENA)
+    return {rule: _entry(parser) for rule, parser in table.items()}
@@ -0,0 +1,106 @@
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import os
+
+from poyais.ir import optimized_parser_table
+from poyais.lisp import EBNF_SPEC, lisp_parser_table
+from poyais.utility import what_is_linum_of_idx
+
+# parsing many files across processes. parser tables are closures and
+# don't pickle, so each worker compiles its own once when it starts
+# (with a cache_dir, from the optimized grammar on disk) and only paths
+# go out and trees come back. LanguageNode pickles as a flat tuple, so
+# even long programs make the trip.
+
+# tree is whatever the rule matched, None if nothing. error is the
+# exception that stopped the file from parsing (it couldn't be read, or
+# the rule didn't match all of it), None if nothing did.
+FileResult = namedtuple('FileResult', ('path', 'tree', 'error'))
+
+# a pool worker's parser and transform, set up by _init_worker. only
+# ever set in workers, parsing in this process passes its own along.
+_rule_parser = None
+_transform = None
+
+
+def rule_parser(ebnf_string, rule, cache_dir=None):
+    """
+    The parser parse_files and poyais.forms run rule with, in this
+    process or in a worker. It's the optimized table, which parses to
+    the same trees as make_parser_table. EBNF_SPEC without a cache_dir
+    is poyais.lisp's table, so this process only builds it once.
+    """
+    if ebnf_string == EBNF_SPEC and cache_dir is None:
+        return lisp_parser_table()[rule]
+    return optimized_parser_table(
+        ebnf_string, roots=(rule,), cache_dir=cache_dir)[rule]
+
+
+def _init_worker(ebnf_string, rule, cache_dir, transform):
+    global _rule_parser, _transform
+    _rule_parser = rule_parser(ebnf_string, rule, cache_dir)
+    _transform = transform
+
+
+def parse_source(parser, source, path=None):
+    "Run parser over all of source, as a FileResult"
+    tree = parser(source, 0)
+    end = 0 if tree is None else tree.end
+    if end != len(source):
+        linum = what_is_linum_of_idx(source, end)
+        return FileResult(path, tree, ValueError(
+            "Could not parse {} past line {}, index {}".format(
+                path, linum.line, linum.relative_idx)))
+    return FileResult(path, tree, None)
+
+
+def _parse_path(path, parser, transform):
+    try:
+        with open(path, encoding='utf-8') as program:
+            source = program.read()
+        result = parse_source(parser, source, path)
+        if transform is not None and result.tree is not None:
+            result = result._replace(tree=transform(result.tree))
+        return result
+    except Exception as err:
+        return FileResult(path, None, err)
+
+
+def _parse_paths(paths):
+    return [_parse_path(path, _rule_parser, _transform) for path in paths]
+
+
+def parse_files(paths, jobs=None, ebnf_string=EBNF_SPEC, rule='program',
+                cache_dir=None, chunksize=None, ordered=True, transform=None):
+    """
+    Parse every file in paths with rule, spread over jobs processes (all
+    the cores if None, none but this one if 1). Yields a FileResult per
+    path: in the order of paths if ordered, otherwise as each chunk of
+    chunksize paths finishes. Errors come back in the results, one bad
+    file doesn't stop the rest.
+
+    Sending a whole tree back from a worker costs about as much as
+    parsing it did. If you only need something worked out from the tree,
+    pass that as transform (it has to pickle, so a module level function)
+    and it runs in the worker instead, its result taking the tree's place.
+    """
+    paths = list(paths)
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    if jobs == 1 or len(paths) <= 1:
+        parser = rule_parser(ebnf_string, rule, cache_dir)
+        for path in paths:
+            yield _parse_path(path, parser, transform)
+        return
+    if chunksize is None:
+        # a few chunks per worker, so one slow chunk doesn't leave the
+        # rest idle at the end.
+        chunksize = max(1, -(-len(paths) // (jobs * 4)))
+    chunks = [paths[idx:idx + chunksize]
+              for idx in range(0, len(paths), chunksize)]
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                             initargs=(ebnf_string, rule, cache_dir,
+                                       transform)) as pool:
+        futures = [pool.submit(_parse_paths, chunk) for chunk in chunks]
+        for future in (futures if ordered else as_completed(futures)):
+            yield from future.result()
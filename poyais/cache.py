@@ -0,0 +1,91 @@
+from hashlib import sha256
+import json
+import os
+import tempfile
+
+from poyais import __version__
+from poyais.ebnf import ebnf_lexer, LexedRule, EBNFToken
+
+# the closures in a parser table can't be pickled, but the lexed rules
+# they're compiled from are plain tuples, and so is the optimized
+# grammar poyais.ir lowers (kept with cached). for make_parser_table
+# lexing is all there is to keep. for the optimized tables it's the
+# passes that cost, so that's what they keep on disk.
+
+# bump this whenever the layout of the cache files changes.
+CACHE_FORMAT = 2
+
+
+def grammar_key(ebnf_string, *parts):
+    """
+    Cache key of a grammar, changes with the grammar text and the
+    version. parts tell apart the things kept for the same grammar.
+    """
+    digest = sha256()
+    for part in ('poyais', __version__, str(CACHE_FORMAT), ebnf_string,
+                 *parts):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def dump_rules(lexed_rules):
+    return json.dumps({
+        'format': CACHE_FORMAT,
+        'rules': [[rule.identifier, [list(token) for token in rule.tokens]]
+                  for rule in lexed_rules],
+    })
+
+
+def load_rules(serialized):
+    got = json.loads(serialized)
+    if got.get('format') != CACHE_FORMAT:
+        raise ValueError('Unknown grammar cache format')
+    return tuple(
+        LexedRule(identifier, tuple(EBNFToken(*token) for token in tokens))
+        for identifier, tokens in got['rules'])
+
+
+def cached(cache_dir, key, build, dump, load):
+    """
+    build(), but read from cache_dir when it's been kept under key
+    before. dump turns what build returns into a string and load turns
+    that back. A missing, stale or unreadable cache file just means
+    building again, the cache is never load bearing.
+    """
+    path = os.path.join(cache_dir, key + '.json')
+    try:
+        with open(path, encoding='utf-8') as kept:
+            return load(kept.read())
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    built = build()
+    tmp_path = None
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        # write then rename, so a concurrent reader never sees half a file
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as out:
+            out.write(dump(built))
+        os.replace(tmp_path, path)
+    except OSError:
+        if tmp_path is not None:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+    return built
+
+
+def cached_ebnf_lexer(ebnf_string, cache_dir=None):
+    """
+    ebnf_lexer, but read from cache_dir when this grammar has been lexed
+    before. Without a cache_dir it's just ebnf_lexer, as a tuple.
+    """
+    def build():
+        return tuple(ebnf_lexer(ebnf_string))
+    if cache_dir is None:
+        return build()
+    return cached(cache_dir, grammar_key(ebnf_string), build,
+                  dump_rules, load_rules)
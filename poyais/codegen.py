@@ -0,0 +1,278 @@
+"""
+Writes a grammar out as a python module: one function per rule, with
+terminals checked inline and positions kept in locals. The module only
+needs poyais.utility for its tokens and nodes, importing it doesn't
+compile anything, and its parsers build the same trees as
+make_parser_table's.
+
+    python -m poyais.codegen grammar.ebnf -o grammar_parser.py
+"""
+import argparse
+import keyword
+import re
+import sys
+
+from poyais.cache import cached_ebnf_lexer
+from poyais.vm import rule_expressions, Analysis
+
+HEADER = '''\
+# Generated by poyais.codegen, edit the grammar instead of this file.
+import re
+
+from poyais.utility import LanguageToken, UtilityToken, node_from_iterable
+
+'''
+
+
+# CPython's limit is 20, and every and, or and many opens one
+MAX_LOOPS = 16
+
+
+def generate_parser(ebnf_string, cache_dir=None):
+    "Source of a module parsing ebnf_string, see the module docstring"
+    lexed_rules = cached_ebnf_lexer(ebnf_string, cache_dir)
+    return _Generator(rule_expressions(lexed_rules)).module()
+
+
+def function_name(rule, taken):
+    name = 'parse_' + re.sub(r'\W', '_', rule)
+    if keyword.iskeyword(name) or name in taken:
+        name += '_{}'.format(len(taken))
+    taken.add(name)
+    return name
+
+
+class _Generator:
+    def __init__(self, rules):
+        self.rules = rules
+        self.analysis = Analysis(rules)
+        taken = set()
+        self.names = {rule: function_name(rule, taken) for rule in rules}
+        # module level constants: source -> name
+        self.constants = {}
+        self.count = 0
+        self.helpers = []
+        # loops open around the code being generated
+        self.loops = 0
+
+    def module(self):
+        functions = [self.function(self.names[rule], expr, rule)
+                     for rule, expr in self.rules.items()]
+        constants = ''.join('{} = {}\n'.format(name, source)
+                            for source, name in self.constants.items())
+        table = ''.join('    {!r}: {},\n'.format(rule, name)
+                        for rule, name in self.names.items())
+        return '{}{}\n\n{}\n\nPARSER_TABLE = {{\n{}}}\n'.format(
+            HEADER, constants, '\n\n'.join(self.helpers + functions), table)
+
+    def function(self, name, expr, rule=None):
+        lines = ['def {}(string, pos):'.format(name)]
+        if rule is not None:
+            lines.append('    # {}'.format(rule))
+        out, end, body = self.expr(expr, 'pos')
+        lines.extend('    ' + line for line in body)
+        lines.append('    return {}'.format(out))
+        return '\n'.join(lines) + '\n'
+
+    def local(self, prefix):
+        self.count += 1
+        return '{}{}'.format(prefix, self.count)
+
+    def constant(self, source, prefix):
+        if source not in self.constants:
+            self.constants[source] = '{}{}'.format(
+                prefix, len(self.constants))
+        return self.constants[source]
+
+    # each of these returns (out, end, lines): after the lines run, out
+    # is what expr matched from pos, None if nothing, and end is where
+    # the match stopped.
+
+    def expr(self, expr, pos):
+        kind = expr[0]
+        literals = self.analysis.literals(expr)
+        if literals is not None and kind != 'terminal':
+            return self.literals(literals, pos)
+        if self.loops >= MAX_LOOPS and kind in ('and', 'or', 'many'):
+            return self.hoist(expr, pos)
+        self.loops += kind in ('and', 'or', 'many')
+        try:
+            return getattr(self, '_' + kind)(expr, pos)
+        finally:
+            self.loops -= kind in ('and', 'or', 'many')
+
+    def hoist(self, expr, pos):
+        """
+        python only allows 20 loops inside each other in a function, so
+        deeper expressions go in functions of their own.
+        """
+        self.count += 1
+        name = '_part{}'.format(self.count)
+        loops, self.loops = self.loops, 0
+        try:
+            self.helpers.append(self.function(name, expr))
+        finally:
+            self.loops = loops
+        return self._call(('call', None), pos, name)
+
+    def _terminal(self, expr, pos):
+        out, end = self.local('out'), self.local('end')
+        literal = expr[1]
+        return out, end, [
+            'if string.startswith({!r}, {}):'.format(literal, pos),
+            '    {} = {} + {}'.format(end, pos, len(literal)),
+            "    {} = LanguageToken('terminal', {!r}, {}, {})".format(
+                out, literal, pos, end),
+            'else:',
+            '    {} = None'.format(out),
+        ]
+
+    def literals(self, literals, pos):
+        out, end = self.local('out'), self.local('end')
+        if all(len(literal) == 1 for literal in literals):
+            chars = self.constant(
+                'frozenset({!r})'.format(''.join(literals)), 'CHARS')
+            char = self.local('char')
+            return out, end, [
+                '{} = string[{}:{} + 1]'.format(char, pos, pos),
+                'if {} in {}:'.format(char, chars),
+                '    {} = {} + 1'.format(end, pos),
+                "    {} = LanguageToken('terminal', {}, {}, {})".format(
+                    out, char, pos, end),
+                'else:',
+                '    {} = None'.format(out),
+            ]
+        reg = self.constant('re.compile({!r})'.format(
+            '|'.join(re.escape(literal) for literal in literals)), 'REG')
+        match = self.local('match')
+        return out, end, [
+            '{} = {}.match(string, {})'.format(match, reg, pos),
+            'if {} is not None:'.format(match),
+            '    {} = {}.end()'.format(end, match),
+            "    {} = LanguageToken('terminal', {}.group(), {}, {})".format(
+                out, match, pos, end),
+            'else:',
+            '    {} = None'.format(out),
+        ]
+
+    def _call(self, expr, pos, name=None):
+        if name is None:
+            if expr[1] not in self.names:
+                raise KeyError("Undefined rule: {}".format(expr[1]))
+            name = self.names[expr[1]]
+        out, end = self.local('out'), self.local('end')
+        return out, end, [
+            '{} = {}(string, {})'.format(out, name, pos),
+            'if {} is not None:'.format(out),
+            '    {} = {}.end'.format(end, out),
+        ]
+
+    def _and(self, expr, pos):
+        out, end = self.local('out'), self.local('end')
+        lines = ['{} = None'.format(out), 'while True:']
+        values = []
+        here = pos
+        for sub_expr in expr[1]:
+            sub_out, sub_end, sub_lines = self.expr(sub_expr, here)
+            lines.extend('    ' + line for line in sub_lines)
+            lines.append('    if {} is None:'.format(sub_out))
+            lines.append('        break')
+            values.append(sub_out)
+            here = sub_end
+        lines.append('    {} = node_from_iterable(({},))'.format(
+            out, ', '.join(values)))
+        lines.append('    {} = {}'.format(end, here))
+        lines.append('    break')
+        return out, end, lines
+
+    def _or(self, expr, pos):
+        out, end = self.local('out'), self.local('end')
+        lines = ['{} = None'.format(out), 'while True:']
+        for alternative in expr[1]:
+            sub_out, sub_end, sub_lines = self.expr(alternative, pos)
+            first = self.analysis.first(alternative)
+            indent = '    '
+            if first is not None and not first.nullable:
+                # can't match unless it starts with one of these
+                chars = self.constant('frozenset({!r})'.format(
+                    ''.join(sorted(first.chars))), 'CHARS')
+                lines.append('    if string[{}:{} + 1] in {}:'.format(
+                    pos, pos, chars))
+                indent = '        '
+            lines.extend(indent + line for line in sub_lines)
+            lines.append(indent + 'if {} is not None:'.format(sub_out))
+            lines.append(indent + '    {}, {} = {}, {}'.format(
+                out, end, sub_out, sub_end))
+            lines.append(indent + '    break')
+        lines.append('    break')
+        return out, end, lines
+
+    def _optional(self, expr, pos):
+        out, end, lines = self.expr(expr[1], pos)
+        return out, end, lines + [
+            'if {} is None:'.format(out),
+            "    {} = UtilityToken('empty', '', {}, {})".format(
+                out, pos, pos),
+            '    {} = {}'.format(end, pos),
+        ]
+
+    def _many(self, expr, pos):
+        out, end = self.local('out'), self.local('end')
+        inner = self.analysis.literals(expr[1])
+        if inner and all(len(literal) == 1 for literal in inner):
+            reg = self.constant('re.compile({!r})'.format('[{}]+'.format(
+                ''.join(re.escape(char) for char in inner))), 'REG')
+            match = self.local('match')
+            return out, end, [
+                '{} = {}.match(string, {})'.format(match, reg, pos),
+                'if {} is None:'.format(match),
+                "    {} = UtilityToken('empty', '', {}, {})".format(
+                    out, pos, pos),
+                '    {} = {}'.format(end, pos),
+                'else:',
+                '    {} = {}.end()'.format(end, match),
+                '    {} = node_from_iterable(tuple('.format(out),
+                "        LanguageToken('terminal', char, idx, idx + 1)",
+                '        for idx, char in enumerate({}.group(), {})))'.format(
+                    match, pos),
+            ]
+        items = self.local('items')
+        sub_out, sub_end, sub_lines = self.expr(expr[1], end)
+        return out, end, [
+            '{} = []'.format(items),
+            '{} = {}'.format(end, pos),
+            'while True:',
+        ] + ['    ' + line for line in sub_lines] + [
+            '    if {} is None:'.format(sub_out),
+            '        break',
+            '    {}.append({})'.format(items, sub_out),
+            '    {} = {}'.format(end, sub_end),
+            'if {}:'.format(items),
+            '    {} = node_from_iterable({})'.format(out, items),
+            'else:',
+            "    {} = UtilityToken('empty', '', {}, {})".format(
+                out, pos, pos),
+        ]
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(
+        description='Write an EBNF grammar out as a python parser module')
+    arg_parser.add_argument('grammar', help='EBNF file, - for stdin')
+    arg_parser.add_argument('-o', '--output', help='default: stdout')
+    args = arg_parser.parse_args(argv)
+    if args.grammar == '-':
+        ebnf_string = sys.stdin.read()
+    else:
+        with open(args.grammar, encoding='utf-8') as grammar:
+            ebnf_string = grammar.read()
+    source = generate_parser(ebnf_string)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as out:
+            out.write(source)
+    else:
+        sys.stdout.write(source)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,11 @@
+from collections import namedtuple
+import functools
+import re
+
 from poyais.utility import (
     LanguageToken, node_from_iterable, what_is_linum_of_idx,
     len_of_token_or_node, UtilityToken)
-from poyais.ebnf import ebnf_lexer
+from poyais.cache import cached_ebnf_lexer
 
 
 # the fundamental parser unit is constructed from a tag
@@ -26,13 +30,51 @@ from poyais.ebnf import ebnf_lexer
 # nonzero repetition. How does EBNF handle a fixed number of rhs
 # elements? I guess that's just a bunch of ands.
 
+
+# FIRST sets: the characters a parser's match can start with, and
+# whether it can match the empty string. parsers carry a first_set
+# function that works this out, and None means nobody knows (a hand
+# written closure, or a rule we recursed back into). or_parsers uses
+# them to skip alternatives that can't possibly start at the lookahead.
+First = namedtuple('First', ('chars', 'nullable'))
+
+
+def first_of(parser):
+    first_set = getattr(parser, 'first_set', None)
+    return None if first_set is None else first_set()
+
+
+def lazy_first(compute):
+    """
+    Computes a FIRST set once, on first use, since identifiers can only
+    be resolved once the parser table is complete. Asking while it's
+    being computed (a recursive rule) answers None.
+    """
+    got = []
+
+    def first_set():
+        if not got:
+            got.append(None)
+            got[0] = compute()
+        return got[0]
+    return first_set
+
+
+def first_sets(parser_table):
+    "FIRST set of every rule in the table"
+    return {rule: first_of(p) for rule, p in parser_table.items()}
+
+
 def _make_tagged_matcher(match_type, tag, regex_string):
     # build the regex, then return a function that takes a string,
     # applies the reg to the string, if it succeeds
     # return a tagged match with the tag and the string that matched.
     def parser(string, pos):
         if string.startswith(regex_string, pos):
-            return match_type(tag, regex_string)
+            return match_type(tag, regex_string,
+                              pos, pos + len(regex_string))
+    first = First(frozenset(regex_string[:1]), regex_string == '')
+    parser.first_set = lambda: first
     return parser
 
 
@@ -60,21 +102,70 @@ def and_parsers(*parsers):
                 # fail the whole parser.
                 return None
         return node_from_iterable(out)
+
+    def first_set():
+        chars = set()
+        for p in parsers:
+            first = first_of(p)
+            if first is None:
+                return None
+            chars |= first.chars
+            if not first.nullable:
+                return First(frozenset(chars), False)
+        return First(frozenset(chars), True)
+    parser.first_set = lazy_first(first_set)
     return parser
 
 
 # Many<parsers> -> parser -> Optional<Node>
 def or_parsers(*parsers):
+    # lookahead character -> alternatives that could start with it.
+    # built on first use, for the same reason as lazy_first.
+    lookahead = None
+
     def parser(string, pos):
-        for p in parsers:
+        nonlocal lookahead
+        if lookahead is None:
+            lookahead = _build_lookahead(parsers)
+        dispatch, fallback = lookahead
+        for p in dispatch.get(string[pos:pos + 1], fallback):
             maybe = p(string, pos)
             if maybe is not None:
                 return maybe
         else:
             return None
+
+    def first_set():
+        firsts = tuple(first_of(p) for p in parsers)
+        if None in firsts:
+            return None
+        return First(frozenset().union(*(f.chars for f in firsts)),
+                     any(f.nullable for f in firsts))
+    parser.first_set = lazy_first(first_set)
     return parser
 
 
+def _build_lookahead(parsers):
+    """
+    Returns a dict of lookahead character -> alternatives to try, and the
+    alternatives to try for any other character (or end of input). Each
+    keeps the original order, so where FIRST sets overlap we still fall
+    back to trying them one after another.
+    """
+    firsts = tuple(first_of(p) for p in parsers)
+    always = tuple(first is None or first.nullable for first in firsts)
+    chars = set()
+    for first in firsts:
+        if first is not None:
+            chars |= first.chars
+    dispatch = {
+        char: tuple(p for p, first, anyway in zip(parsers, firsts, always)
+                    if anyway or char in first.chars)
+        for char in chars}
+    fallback = tuple(p for p, anyway in zip(parsers, always) if anyway)
+    return dispatch, fallback
+
+
 # parser -> parser -> Optional<Node>
 def many_parser(parser):
     def p(string, pos):
@@ -86,9 +177,82 @@ def many_parser(parser):
             idx += len_of_token_or_node(maybe)
             maybe = parser(string, idx)
         return node_from_iterable(out)
+    p.first_set = lambda: first_of(parser)
     return optional_parser(p)
 
 
+# Many<str> -> parser -> Optional<LanguageToken>
+def make_literal_matcher(literals):
+    """
+    A single matcher standing in for an or_parsers chain of terminals.
+    Literals are tried in the order the chain would have tried them.
+    """
+    if all(len(literal) == 1 for literal in literals):
+        chars = frozenset(literals)
+
+        def parser(string, pos):
+            char = string[pos:pos + 1]
+            if char in chars:
+                return LanguageToken('terminal', char, pos, pos + 1)
+    else:
+        # regex alternation is ordered, same as or_parsers
+        reg = re.compile('|'.join(re.escape(literal) for literal in literals))
+        # every match shares its literal's string rather than a new copy
+        shared = {literal: literal for literal in literals}
+
+        def parser(string, pos):
+            match = reg.match(string, pos)
+            if match is not None:
+                return LanguageToken('terminal', shared[match.group()], pos,
+                                     match.end())
+    parser.literals = literals
+    first = First(frozenset(literal[:1] for literal in literals if literal),
+                  '' in literals)
+    parser.first_set = lambda: first
+    return parser
+
+
+# Many<str> -> parser -> Optional<Node>
+def make_literal_run_parser(chars):
+    """
+    many_parser over a set of single characters, matched with one regex
+    character class instead of one call per character.
+    """
+    reg = re.compile('[{}]+'.format(''.join(re.escape(c) for c in chars)))
+
+    def parser(string, pos):
+        match = reg.match(string, pos)
+        if match is None:
+            return EMPTY_PARSER(string, pos)
+        return node_from_iterable(tuple(
+            LanguageToken('terminal', char, idx, idx + 1)
+            for idx, char in enumerate(match.group(), pos)))
+    first = First(frozenset(chars), True)
+    parser.first_set = lambda: first
+    return parser
+
+
+# the grammar compiler goes through these instead of or_parsers and
+# many_parser directly, so that terminals can be collapsed. the trees
+# they produce are the same either way.
+
+# Many<parsers> -> parser -> Optional<Node>
+def compiled_or_parsers(*parsers):
+    literals = tuple(getattr(p, 'literals', None) for p in parsers)
+    if all(literals):
+        return make_literal_matcher(
+            tuple(literal for group in literals for literal in group))
+    return or_parsers(*parsers)
+
+
+# parser -> parser -> Optional<Node>
+def compiled_many_parser(parser):
+    literals = getattr(parser, 'literals', None)
+    if literals and all(len(literal) == 1 for literal in literals):
+        return make_literal_run_parser(literals)
+    return many_parser(parser)
+
+
 # parser -> parser
 def optional_parser(parser):
     return or_parsers(parser, EMPTY_PARSER)
@@ -102,12 +266,12 @@ def group_parser(parser):
 EMPTY_PARSER = make_anonymous_matcher('empty', '')
 
 COMBINATOR_MAP = {
-    '|': or_parsers,
+    '|': compiled_or_parsers,
     ',': and_parsers,
 }
 
 GROUP_MAP = {
-    '}': many_parser,
+    '}': compiled_many_parser,
     ']': optional_parser,
     ')': group_parser
 }
@@ -123,15 +287,16 @@ def make_parser_from_terminal(rule, terminal, _cache={}):
     # this is the only time I can confidently cache a parser
     if terminal not in _cache:
         out = make_tagged_matcher('terminal', terminal)
+        out.literals = (terminal,)
         _cache[terminal] = out
         return out
     else:
         return _cache[terminal]
 
 
-def flatten_parsers(rule, stack, curr_combinator):
+def flatten_parsers(rule, stack, curr_combinator, comb_map=COMBINATOR_MAP):
     if curr_combinator:
-        return COMBINATOR_MAP[curr_combinator](*stack)
+        return comb_map[curr_combinator](*stack)
     elif len(stack) == 1:
         return stack[0]
     else:
@@ -140,26 +305,40 @@ def flatten_parsers(rule, stack, curr_combinator):
 
 def delay_and_raise(parser_table, identifier):
     def parser(string, pos):
-        print("identifier called")
         return parser_table[identifier](string, pos)
         # return LanguageNode(parser_table[identifier](string, pos))
+
+    def first_set():
+        if identifier in parser_table:
+            return first_of(parser_table[identifier])
+    parser.first_set = lazy_first(first_set)
+    return parser
+
+
+def _untracked(parser):
     return parser
 
 
 def dispatch(parser_table, rule, token_itr, sub_rule=None,
              comb_map=COMBINATOR_MAP, group_map=GROUP_MAP,
-             group_comp=GROUP_COMPANIONS):
+             group_comp=GROUP_COMPANIONS, track=_untracked,
+             make_terminal=make_parser_from_terminal,
+             make_identifier=delay_and_raise):
+    # track wraps every parser built here. incremental parsing uses it to
+    # find out how far into the string a rule looked.
+
+    # swapping out the maps and the make_ functions builds something
+    # other than closures from the same rule, see poyais.vm.
     stack = []
     curr_combinator = None
     while True:
         try:
             got = next(token_itr)
         except StopIteration:
-            return flatten_parsers(
-                rule, stack, curr_combinator)
+            return track(flatten_parsers(
+                rule, stack, curr_combinator, comb_map))
         if got.type == 'terminal':
-            stack.append(
-                make_parser_from_terminal(rule, got.contents))
+            stack.append(track(make_terminal(rule, got.contents)))
         elif got.type == 'EBNFSymbol':
             # now we have to dispatch on contents
             # this is the worst it'll get, I promise.
@@ -167,35 +346,159 @@ def dispatch(parser_table, rule, token_itr, sub_rule=None,
             if contents in group_comp:
                 stack.append(
                     dispatch(parser_table, rule, token_itr,
-                             group_comp[contents]))
+                             group_comp[contents], comb_map, group_map,
+                             group_comp, track, make_terminal,
+                             make_identifier))
             elif contents == sub_rule:
                 flattened = flatten_parsers(
-                    rule, stack, curr_combinator)
-                return group_map[sub_rule](flattened)
+                    rule, stack, curr_combinator, comb_map)
+                return track(group_map[sub_rule](flattened))
             elif contents in comb_map:
                 if curr_combinator is None:
                     curr_combinator = contents
                 elif curr_combinator != contents:
-                    stack = [comb_map[curr_combinator](*stack)]
+                    stack = [track(comb_map[curr_combinator](*stack))]
                     curr_combinator = contents
             else:
                 raise AssertionError(
                     errmsg('improperly_nested', rule, contents, sub_rule))
         elif got.type == 'identifier':
-            stack.append(delay_and_raise(parser_table, got.contents))
-
-
-def make_parser_from_rule(parser_table, rule):
-    return dispatch(parser_table, rule, iter(rule.tokens), {})
-
-
-def make_parser_table(ebnf_string):
+            compiled = parser_table.get(got.contents)
+            if getattr(compiled, 'literals', None):
+                # a rule that is only literals returns exactly what its
+                # matcher does, so skip the indirection and let the
+                # combinators collapse it. rules are compiled in order,
+                # so this only catches rules defined before their use.
+                stack.append(track(compiled))
+            else:
+                stack.append(make_identifier(parser_table, got.contents))
+
+
+def make_parser_from_rule(parser_table, rule, track=_untracked,
+                          group_map=GROUP_MAP):
+    return dispatch(parser_table, rule, iter(rule.tokens), {},
+                    group_map=group_map, track=track)
+
+
+def make_parser_table(ebnf_string, memo=None, cache_dir=None,
+                      profiler=None):
+    """
+    Compile ebnf_string into a dict of rule -> parser.
+
+    Passing a PackratMemo turns on packrat mode: every rule is memoized
+    on (rule, pos), so backtracking never re-runs a rule at a position
+    it's already been tried at.
+
+    With a cache_dir the lexed grammar is kept on disk between processes,
+    see poyais.cache.
+
+    Passing a Profiler records what each rule costs while parsing, see
+    poyais.profiling.
+    """
+    lexed_rules = cached_ebnf_lexer(ebnf_string, cache_dir)
+    track = _untracked
+    readers = [obj for obj in (memo, profiler) if hasattr(obj, 'reader')]
+    if readers:
+        # these want to know how far rules read, see poyais.incremental.
+        # no matcher looks further past where it's called (or where it
+        # stopped matching) than the longest terminal.
+        lookahead = max([len(token.contents)
+                         for lexed_rule in lexed_rules
+                         for token in lexed_rule.tokens
+                         if token.type == 'terminal'] + [1])
+
+        def track(parser):
+            for obj in readers:
+                parser = obj.reader(parser, lookahead)
+            return parser
+    group_map = GROUP_MAP
+    if hasattr(memo, 'many'):
+        # a memo that keeps results between parses can keep repetitions
+        # too, see poyais.incremental
+        group_map = dict(GROUP_MAP, **{'}': memo.many})
     out = {}
-    for lexed_rule in ebnf_lexer(ebnf_string):
-        out[lexed_rule.identifier] = make_parser_from_rule(out, lexed_rule)
+    for lexed_rule in lexed_rules:
+        parser = make_parser_from_rule(out, lexed_rule, track, group_map)
+        if memo is not None:
+            parser = memo.wrap(lexed_rule.identifier, parser)
+        if profiler is not None:
+            parser = profiler.wrap(lexed_rule.identifier, parser)
+        out[lexed_rule.identifier] = parser
     return out
 
 
+def track_reach(owner, parser, lookahead):
+    """
+    parser, raising owner.reach to the furthest it could have read: where
+    its match ended (or where it was called, if it didn't match) plus
+    lookahead. The reader incremental parsing and profiling hand to
+    make_parser_table.
+    """
+    @functools.wraps(parser)
+    def tracked(string, pos):
+        out = parser(string, pos)
+        reach = (pos if out is None else out.end) + lookahead
+        if reach > owner.reach:
+            owner.reach = reach
+        return out
+    return tracked
+
+
+MemoStats = namedtuple('MemoStats', ('hits', 'misses', 'evictions', 'entries'))
+
+
+class PackratMemo:
+    """
+    Memo table for make_parser_table's packrat mode.
+
+    Entries are keyed on (rule, pos) and only live for one parse: handing
+    the table a different string drops everything. max_entries bounds the
+    table for very large inputs, evicting the oldest entries first. Since
+    parsing mostly moves forward those tend to be the ones furthest behind.
+    """
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries
+        self.table = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._string = None
+
+    def clear(self):
+        self.table.clear()
+        self._string = None
+
+    def stats(self):
+        return MemoStats(self.hits, self.misses, self.evictions,
+                         len(self.table))
+
+    def wrap(self, rule, parser):
+        table = self.table
+
+        @functools.wraps(parser)
+        def memoized(string, pos):
+            if string is not self._string:
+                table.clear()
+                self._string = string
+            key = (rule, pos)
+            try:
+                out = table[key]
+            except KeyError:
+                self.misses += 1
+                out = parser(string, pos)
+                table[key] = out
+                if (self.max_entries is not None and
+                        len(table) > self.max_entries):
+                    # dicts remember insertion order, so this is the
+                    # oldest entry.
+                    del table[next(iter(table))]
+                    self.evictions += 1
+                return out
+            self.hits += 1
+            return out
+        return memoized
+
+
 # exclusive to parsing, so just leave it here instead of shoving into utility
 def errmsg(err_name, *args):
     return {
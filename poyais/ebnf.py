@@ -1,4 +1,6 @@
 from collections import namedtuple
+import re
+
 
 Rule = namedtuple('Rule', ('lhs', 'rhs'))
 LexedRule = namedtuple('LexedRule', ('identifier', 'tokens'))
@@ -6,7 +8,8 @@ LexedRule = namedtuple('LexedRule', ('identifier', 'tokens'))
 
 def dispatch_charwise(dispatch, ebnf_string, state):
     linum, idx = 0, 0
-    for line in ebnf_string.split("\n"):
+    # keep the newlines, a quoted "\n" is a perfectly good terminal.
+    for line in ebnf_string.splitlines(keepends=True):
         # we increment before so that we correctly handle end of file easily
         while idx < len(line):
             maybe_result = dispatch(line, linum, idx, state)
@@ -67,7 +70,10 @@ EBNFSymbol = "EBNFSymbol"  # associated with kind
 
 #   EBNFSymbol (associated with kind)
 # this could be improved on.
-EBNFToken = namedtuple('EBNFToken', ['type', 'contents'])
+# line (1 based) and column (0 based) are where the token starts in the
+# grammar, when the lexer knows.
+EBNFToken = namedtuple('EBNFToken', ['type', 'contents', 'line', 'column'],
+                       defaults=(None, None))
 
 EBNFSYMBOLS = frozenset('{[(|,)]}')
 QUOTES_STR = "'\""
@@ -83,7 +89,8 @@ def lex_rule(rule, symbols=EBNFSYMBOLS, quotes=QUOTES):
             got.append(char)
             if char == quoted:
                 quoted = False
-                yield EBNFToken('terminal', ''.join(got).strip(QUOTES_STR))
+                # only drop the delimiters, "'" is a terminal too.
+                yield EBNFToken('terminal', ''.join(got)[1:-1])
                 got = []
         elif char in quotes:
             quoted = char
@@ -125,6 +132,70 @@ def errmsg_rule(why, rule):
     }[why] + ": {} - {}".format(*rule)
 
 
-def ebnf_lexer(ebnf_string):
+def ebnf_lexer_charwise(ebnf_string):
+    "The original character at a time lexer, kept to check ebnf_lexer against"
     for rule in split_into_rules(ebnf_string):
         yield LexedRule(rule.lhs, tuple(lex_rule(rule)))
+
+
+# ebnf_lexer is one regex run over the whole grammar with finditer, each
+# match a token. a rule's left hand side is whatever comes between the
+# end of the last rule and the =. unlike the charwise splitter, a ; or =
+# inside a quoted terminal is just part of the terminal.
+EBNF_TOKEN_REG = re.compile(r"""\s*(?:
+    (?P<terminal>"[^"]*"|'[^']*')
+  | (?P<EBNFSymbol>[{}])
+  | (?P<identifier>[^"'{}=;]*[^\s"'{}=;])
+  | (?P<end>;)
+  | (?P<equals>=)
+  | (?P<unclosed>["'])
+  | $)""".format(
+    *(''.join(re.escape(symbol) for symbol in sorted(EBNFSYMBOLS)),) * 3),
+    re.VERBOSE)
+
+
+def ebnf_lexer(ebnf_string):
+    end = len(ebnf_string)
+    # lines are counted as we go, tokens come in order
+    line, line_start = 1, 0
+    next_newline = ebnf_string.find('\n')
+    if next_newline < 0:
+        next_newline = end
+    rule_start = 0
+    lhs = None
+    tokens = []
+    for got in EBNF_TOKEN_REG.finditer(ebnf_string):
+        kind = got.lastgroup
+        if kind is None:
+            # whatever's after the last ; never became a rule
+            return
+        start = got.start(kind)
+        if start > next_newline:
+            line += ebnf_string.count('\n', line_start, start)
+            line_start = ebnf_string.rfind('\n', 0, start) + 1
+            next_newline = ebnf_string.find('\n', start)
+            if next_newline < 0:
+                next_newline = end
+        if lhs is None:
+            if kind == 'equals':
+                lhs = ebnf_string[rule_start:start].strip()
+            elif kind == 'end':
+                raise AssertionError(errmsg(
+                    'lhs_semicolon', line, start - line_start))
+        elif kind == 'end':
+            yield LexedRule(lhs, tuple(tokens))
+            lhs = None
+            tokens = []
+            rule_start = got.end()
+        elif kind == 'terminal':
+            tokens.append(EBNFToken(
+                kind, got.group(kind)[1:-1], line, start - line_start))
+        elif kind == 'equals':
+            raise AssertionError(errmsg(
+                'rhs_unquoted_equals', line, start - line_start))
+        elif kind == 'unclosed':
+            raise AssertionError(errmsg_rule(
+                'unquoted terminal', Rule(lhs, ebnf_string[start:])))
+        else:
+            tokens.append(EBNFToken(
+                kind, got.group(kind), line, start - line_start))
@@ -0,0 +1,349 @@
+from collections import namedtuple, deque
+from concurrent.futures import ProcessPoolExecutor
+import asyncio
+import codecs
+import os
+
+from poyais.batch import rule_parser
+from poyais.lexer import (
+    _scanner, string_end, TOKEN_CHARS, FILE_WHITESPACE, SYMBOL_REG)
+from poyais.lisp import EBNF_SPEC, lisp_parser_table
+from poyais.utility import shift_positions
+
+# a scheme file is a run of top level forms, and where one ends and the
+# next starts only takes the lexer's rules and counting parens to find
+# out. once we know, every form can be parsed on its own, in parallel.
+
+OPENERS = frozenset(("'", '`'))
+
+
+def lisp_whitespace():
+    """
+    What poyais.lisp's whitespace rule matches. Anything else between
+    forms isn't something the grammar would parse, so the scanner
+    mustn't skip over it either.
+    """
+    return frozenset(lisp_parser_table()['whitespace'].literals)
+
+
+class FormScanner:
+    """
+    Finds the spans of top level forms, fed a chunk of text at a time.
+    Runs the lexer's scanner over each chunk and counts parens, keeping
+    only the unfinished token at the end of a chunk for the next one,
+    the way lex_stream does.
+
+    A form is a list (with any quotes in front of it), a symbol, or a
+    string. Where the text stops making sense (a stray ')', something
+    the lexer can't read) the form it's in runs on to the end of its
+    list, or failing that to the next newline or top level '(', and
+    scanning picks up again from there. Parsing that span fails where a
+    parse of the whole text would have.
+    """
+    def __init__(self, token_chars=TOKEN_CHARS, whitespace=FILE_WHITESPACE,
+                 symbol_reg=SYMBOL_REG):
+        self._scan = _scanner(frozenset(token_chars), frozenset(whitespace),
+                              symbol_reg)
+        self._symbol_reg = symbol_reg
+        self.depth = 0
+        # where the form being scanned started and its last token ended,
+        # None between forms
+        self.start = None
+        self.end = None
+        # where the unfinished token, or failing that the next chunk,
+        # starts in the whole text
+        self.offset = 0
+        # whether the form being scanned has stopped making sense
+        self.broken = False
+        # the pieces of the unfinished token, its kind, and whether it's
+        # a string with a backslash waiting for its quote
+        self._pending = []
+        self._kind = None
+        self._armed = False
+
+    def feed(self, chunk, final=False):
+        "Spans of the forms chunk finishes, as (start, end) in the whole text"
+        offset = self.offset
+        spans = []
+        text = chunk
+        pending = self._pending
+        if self._kind == 'string':
+            closed, self._armed = string_end(chunk, self._armed)
+            if closed is not None:
+                length = sum(map(len, pending)) + closed
+                self._string(offset, offset + length, spans)
+                offset += length
+                text = chunk[closed:]
+            elif final:
+                # never closes, which the scanner has its own say on
+                text = ''.join(pending) + chunk
+            else:
+                pending.append(chunk)
+                return spans
+        elif self._kind == 'symbol':
+            got = self._symbol_reg.match(chunk)
+            pending.append(chunk)
+            if not final and got is not None and got.end() == len(chunk):
+                return spans
+            text = ''.join(pending)
+        consumed = self._spans(text, offset, final, spans)
+        self.offset = offset + consumed
+        self._pending = [text[consumed:]] if consumed < len(text) else []
+        self._kind = None
+        if self._pending:
+            # _spans only stops early for a symbol or a string
+            if text[consumed] == '"':
+                self._kind = 'string'
+                self._armed = string_end(text, pos=consumed + 1)[1]
+            else:
+                self._kind = 'symbol'
+        if final:
+            if self.start is not None:
+                spans.append((self.start, self.end))
+            self.start = self.end = None
+            self.depth = 0
+            self.broken = False
+        return spans
+
+    def _spans(self, text, offset, final, spans):
+        end = len(text)
+        for got in self._scan(text):
+            kind = got.lastgroup
+            # the end of the text, past any whitespace, if no token
+            pos, token_end = got.span(kind) if kind else (got.end(),) * 2
+            if self.broken and '\n' in text[got.start():pos]:
+                # a newline is as far as a form that's stopped making
+                # sense goes
+                self._resync(spans)
+            if kind is None:
+                continue
+            if kind == 'error' or (kind == 'symbol' and token_end == end):
+                if not final and (kind == 'symbol' or text[pos] == '"'):
+                    # might carry on in the next chunk
+                    return pos
+            char = text[pos]
+            if self.broken and not self.depth and char == '(':
+                # and so is a list starting at the top level
+                self._resync(spans)
+            if self.start is None:
+                self.start = offset + pos
+            self.end = offset + token_end
+            if kind == 'error':
+                self.broken = True
+                continue
+            elif kind == 'token':
+                if char == '(':
+                    self.depth += 1
+                    continue
+                elif char in OPENERS:
+                    continue
+                elif not self.depth:
+                    self.broken = True
+                    continue
+                self.depth -= 1
+            elif self.broken:
+                continue
+            if not self.depth:
+                self._resync(spans)
+        return end
+
+    def _string(self, start, end, spans):
+        "A string that took more than one chunk, from start to end"
+        if self.start is None:
+            self.start = start
+        self.end = end
+        if not self.broken and not self.depth:
+            self._resync(spans)
+
+    def _resync(self, spans):
+        "The form being scanned is over, scan the next from the top level"
+        if self.start is not None:
+            spans.append((self.start, self.end))
+        self.start = self.end = None
+        self.depth = 0
+        self.broken = False
+
+
+def scan_forms(text, whitespace=FILE_WHITESPACE):
+    "(start, end) of every top level form in text"
+    return FormScanner(whitespace=whitespace).feed(text, final=True)
+
+
+def parse_forms(text, jobs=None, chunksize=None, cache_dir=None):
+    """
+    Parse every top level form of text with poyais.lisp's form rule,
+    spread over jobs processes (all the cores if None, none but this one
+    if 1), and return their trees in order. Offsets in the trees are
+    offsets into text, and every tree is what parsing that form out of
+    the whole text gives. Raises ValueError for the first form that
+    doesn't parse.
+    """
+    spans = scan_forms(text, lisp_whitespace())
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    if jobs == 1 or len(spans) <= 1:
+        return _parse_spans(rule_parser(EBNF_SPEC, 'form', cache_dir),
+                            text, 0, spans)
+    if chunksize is None:
+        chunksize = max(1, -(-len(spans) // (jobs * 4)))
+    out = []
+    with ProcessPoolExecutor(
+            max_workers=jobs, initializer=_init_worker,
+            initargs=(cache_dir,)) as pool:
+        futures = []
+        for idx in range(0, len(spans), chunksize):
+            chunk = spans[idx:idx + chunksize]
+            # only the text of the chunk's forms goes to the worker
+            start, end = chunk[0][0], chunk[-1][1]
+            futures.append(pool.submit(
+                _parse_chunk, text[start:end], start,
+                [(s - start, e - start) for s, e in chunk]))
+        for future in futures:
+            out.extend(future.result())
+    return out
+
+
+# a pool worker's form parser, set up by _init_worker
+_form_parser = None
+
+
+def _init_worker(cache_dir):
+    global _form_parser
+    _form_parser = rule_parser(EBNF_SPEC, 'form', cache_dir)
+
+
+def _parse_chunk(chunk, offset, spans):
+    trees = _parse_spans(_form_parser, chunk, offset, spans)
+    if offset:
+        trees = [shift_positions(tree, offset) for tree in trees]
+    return trees
+
+
+def _parse_spans(parser, text, offset, spans):
+    trees = []
+    for start, end in spans:
+        tree = parser(text, start)
+        if tree is None or tree.end != end:
+            raise ValueError(
+                "Could not parse the form at index {}, stopped at {}".format(
+                    offset + start,
+                    offset + (start if tree is None else tree.end)))
+        trees.append(tree)
+    return trees
+
+
+# a form finished by FormReader. tree is what the form rule made of it,
+# None if it didn't parse, in which case error says why.
+Form = namedtuple('Form', ('start', 'end', 'text', 'tree', 'error'))
+
+
+class FormReader:
+    """
+    Push parser for a stream of scheme: feed() it text as it arrives,
+    in chunks of any size, and every top level form is parsed as soon
+    as its last character is in. Only the text of the form still being
+    read is kept around, so a long session costs the same per form as a
+    short one.
+
+    Finished forms queue up until they're taken, either with forms() or
+    by iterating over the reader with async for, which waits for more to
+    be fed and stops after feed_eof().
+
+    Forms are separated by whitespace, which is lisp_whitespace() unless
+    given.
+    """
+    def __init__(self, parser=None, whitespace=None):
+        self.parser = lisp_parser_table()['form'] if parser is None else parser
+        self.scanner = FormScanner(whitespace=lisp_whitespace()
+                                   if whitespace is None else whitespace)
+        # the text from _start on that forms still need
+        self._chunks = []
+        self._start = 0
+        self._ready = deque()
+        self._eof = False
+        self._waiter = None
+
+    def feed(self, chunk):
+        if self._eof:
+            raise ValueError("Fed after feed_eof")
+        self._chunks.append(chunk)
+        self._finish(self.scanner.feed(chunk))
+
+    def feed_eof(self):
+        "No more text is coming, so whatever is left is the last form"
+        if not self._eof:
+            self._finish(self.scanner.feed('', final=True))
+            self._eof = True
+            self._wake()
+
+    def forms(self):
+        "Take the forms finished so far"
+        while self._ready:
+            yield self._ready.popleft()
+
+    def _finish(self, spans):
+        if spans:
+            text = ''.join(self._chunks)
+            for start, end in spans:
+                self._ready.append(self._parse(
+                    text[start - self._start:end - self._start], start))
+            self._wake()
+        else:
+            text = None
+        # everything before the form being read (or the unfinished
+        # token the scanner is holding on to) can go
+        keep_from = self.scanner.start
+        if keep_from is None:
+            keep_from = self.scanner.offset
+        if keep_from > self._start:
+            if text is None:
+                text = ''.join(self._chunks)
+            self._chunks = [text[keep_from - self._start:]]
+            self._start = keep_from
+
+    def _parse(self, text, start):
+        tree = self.parser(text, 0)
+        if tree is None or tree.end != len(text):
+            return Form(start, start + len(text), text, None, ValueError(
+                "Could not parse the form at index {}, stopped at {}".format(
+                    start, start + (0 if tree is None else tree.end))))
+        return Form(start, start + len(text), text,
+                    shift_positions(tree, start) if start else tree, None)
+
+    def _wake(self):
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while not self._ready:
+            if self._eof:
+                raise StopAsyncIteration
+            self._waiter = asyncio.get_running_loop().create_future()
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
+        return self._ready.popleft()
+
+
+async def read_forms(stream, chunk_size=64 * 1024, parser=None):
+    """
+    The forms of an asyncio.StreamReader (or anything with an async
+    read(n) of bytes), as they arrive. Reads utf-8.
+    """
+    reader = FormReader(parser)
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    while True:
+        data = await stream.read(chunk_size)
+        if not data:
+            reader.feed(decoder.decode(b'', final=True))
+            reader.feed_eof()
+        else:
+            reader.feed(decoder.decode(data))
+        for form in reader.forms():
+            yield form
+        if not data:
+            return
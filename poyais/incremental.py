@@ -0,0 +1,250 @@
+import functools
+
+from poyais.combinator import (
+    make_parser_table, PackratMemo, MemoStats, track_reach, first_of,
+    lazy_first, First, make_literal_run_parser)
+from poyais.utility import LanguageNode, UtilityToken, shifted
+
+# reparsing after an edit. everything hangs off the packrat memo: a
+# memoized result is still good after an edit if the rule never looked
+# at the edited text. results after the edit just move along with it,
+# and everything else gets reparsed when the parse asks for it again.
+
+# to know what a rule looked at, make_parser_table wraps every parser it
+# builds with IncrementalMemo.reader, which keeps a high water mark of
+# how far into the string any of them could have read.
+
+# what an edit costs mustn't depend on how big the text is, so nothing
+# in here walks all of it:
+# - entries are kept the way a gap buffer keeps text. those before the
+#   last edit are keyed on their position and those after it on their
+#   distance from the end of the text, which edits before them don't
+#   change. an edit only has to re-key the entries between it and the
+#   last one.
+# - results are shifted when they're looked up, with a view instead of
+#   a copy, see utility.shifted.
+# - repetitions keep what's left of them from each item on, so the part
+#   after an edit is picked up in one go. the part before it is a chain
+#   of new nodes, one per item, there's no way around that with trees
+#   of linked nodes.
+
+
+class IncrementalMemo(PackratMemo):
+    """
+    A PackratMemo that outlives a single parse. Entries remember where
+    they were made and how far their rule read past that, so edit() can
+    keep, move or drop them.
+    """
+    def __init__(self):
+        super().__init__()
+        self.reach = 0
+        # of the text the entries are for
+        self.length = 0
+        # where the last edit was
+        self.gap = 0
+        # position -> {key: [result, made at, read past it]}, before the
+        # gap, and distance from the end -> the same, from the gap on
+        self._before = {}
+        self._after = {}
+        # entries before the gap by (position, key), those that read
+        # past it with how far, the rest by how far they read
+        self._open = {}
+        self._closed = {}
+        self._entries = 0
+
+    def clear(self):
+        self.__init__()
+
+    def stats(self):
+        return MemoStats(self.hits, self.misses, self.evictions,
+                         self._entries)
+
+    def reader(self, parser, lookahead):
+        return track_reach(self, parser, lookahead)
+
+    def _get(self, key, pos, length):
+        if pos < self.gap:
+            entries = self._before.get(pos)
+        else:
+            entries = self._after.get(length - pos)
+        return None if entries is None else entries.get(key)
+
+    def _put(self, key, pos, length, entry):
+        self.length = length
+        if pos < self.gap:
+            entries = self._before.setdefault(pos, {})
+            old = entries.get(key)
+            if old is not None:
+                self._unindex(pos, key, pos + old[2])
+            self._index(pos, key, pos + entry[2])
+        else:
+            entries = self._after.setdefault(length - pos, {})
+        self._entries += key not in entries
+        entries[key] = entry
+
+    def _hit(self, entry, pos):
+        self.hits += 1
+        out, made_at, read = entry
+        if made_at != pos:
+            out = entry[0] = shifted(out, pos - made_at)
+            entry[1] = pos
+        if pos + read > self.reach:
+            self.reach = pos + read
+        return out
+
+    def _index(self, pos, key, reach):
+        if reach > self.gap:
+            self._open[(pos, key)] = reach
+        else:
+            self._closed.setdefault(reach, set()).add((pos, key))
+
+    def _unindex(self, pos, key, reach):
+        if self._open.pop((pos, key), None) is None:
+            bucket = self._closed[reach]
+            bucket.discard((pos, key))
+            if not bucket:
+                del self._closed[reach]
+
+    def wrap(self, rule, parser):
+        @functools.wraps(parser)
+        def memoized(string, pos):
+            entry = self._get(rule, pos, len(string))
+            if entry is not None:
+                return self._hit(entry, pos)
+            self.misses += 1
+            outer_reach, self.reach = self.reach, pos
+            out = parser(string, pos)
+            self._put(rule, pos, len(string), [out, pos, self.reach - pos])
+            self.reach = max(outer_reach, self.reach)
+            return out
+        return memoized
+
+    def many(self, parser):
+        """
+        compiled_many_parser, memoizing what's left of the repetition
+        from each item on. After an edit, a repetition is rebuilt up to
+        where it was made and the rest of it is a hit.
+        """
+        literals = getattr(parser, 'literals', None)
+        if literals and all(len(literal) == 1 for literal in literals):
+            return make_literal_run_parser(literals)
+
+        def repeated(string, pos):
+            length = len(string)
+            outer_reach = self.reach
+            values, starts, reaches = [], [], []
+            tail = None
+            here = pos
+            while True:
+                entry = self._get(repeated, here, length)
+                if entry is not None:
+                    self.reach = here
+                    tail = self._hit(entry, here)
+                    break
+                self.reach = here
+                got = parser(string, here)
+                if got is None:
+                    break
+                values.append(got)
+                starts.append(here)
+                reaches.append(self.reach)
+                here = got.end
+            # built back to front, every link is the rest of the
+            # repetition from its item on, and read as far as the
+            # furthest any of them did
+            reach = self.reach
+            for value, start, item_reach in zip(
+                    reversed(values), reversed(starts), reversed(reaches)):
+                tail = LanguageNode(value, tail)
+                reach = max(reach, item_reach)
+                self._put(repeated, start, length,
+                          [tail, start, reach - start])
+            self.reach = max(outer_reach, reach)
+            if tail is None:
+                return UtilityToken('empty', '', pos, pos)
+            return tail
+
+        def first_set():
+            first = first_of(parser)
+            return None if first is None else First(first.chars, True)
+        repeated.first_set = lazy_first(first_set)
+        return repeated
+
+    def _move_gap(self, to):
+        "Make to the gap, re-keying the entries in between"
+        gap, length = self.gap, self.length
+        self.gap = to
+        if to > gap:
+            for pos in range(gap, to):
+                entries = self._after.pop(length - pos, None)
+                if entries:
+                    self._before[pos] = entries
+                    for key, entry in entries.items():
+                        self._index(pos, key, pos + entry[2])
+            # some that read past the old gap stop before this one
+            for (pos, key), reach in list(self._open.items()):
+                if reach <= to:
+                    del self._open[(pos, key)]
+                    self._closed.setdefault(reach, set()).add((pos, key))
+        elif to < gap:
+            for pos in range(to, gap):
+                entries = self._before.pop(pos, None)
+                if entries:
+                    for key, entry in entries.items():
+                        self._unindex(pos, key, pos + entry[2])
+                    self._after[length - pos] = entries
+            # and some that didn't read past the old gap read past this
+            for reach in range(to + 1, gap + 1):
+                for pos_key in self._closed.pop(reach, ()):
+                    self._open[pos_key] = reach
+
+    def edit(self, offset, deleted, inserted):
+        """
+        Account for deleted characters at offset being replaced by
+        inserted many. Offsets are in the text before the edit.
+        """
+        self._move_gap(offset)
+        # what read into the edit from before it
+        for pos, key in self._open:
+            entries = self._before[pos]
+            del entries[key]
+            if not entries:
+                del self._before[pos]
+        self._entries -= len(self._open)
+        self._open.clear()
+        # and what started in the deleted text. everything after it
+        # keeps its distance from the end, so it moves along by itself.
+        for pos in range(offset, offset + deleted):
+            entries = self._after.pop(self.length - pos, None)
+            if entries:
+                self._entries -= len(entries)
+        self.length += inserted - deleted
+
+
+class IncrementalParser:
+    """
+    Keeps the parse of one text by one rule up to date as the text is
+    edited. Only rules that read the edited region are run again.
+    """
+    def __init__(self, ebnf_string, rule, text, cache_dir=None):
+        self.memo = IncrementalMemo()
+        self.table = make_parser_table(ebnf_string, memo=self.memo,
+                                       cache_dir=cache_dir)
+        self.rule = rule
+        self.text = text
+        self.tree = self._parse()
+
+    def _parse(self):
+        return self.table[self.rule](self.text, 0)
+
+    def edit(self, offset, deleted, inserted):
+        """
+        Replace deleted characters at offset with the string inserted,
+        and return the new tree.
+        """
+        assert 0 <= offset and offset + deleted <= len(self.text)
+        self.text = (self.text[:offset] + inserted +
+                     self.text[offset + deleted:])
+        self.memo.edit(offset, deleted, len(inserted))
+        self.tree = self._parse()
+        return self.tree
@@ -0,0 +1,547 @@
+from collections import namedtuple
+import json
+
+from poyais.cache import cached_ebnf_lexer, cached, grammar_key, CACHE_FORMAT
+from poyais.combinator import (
+    dispatch, GROUP_COMPANIONS, First, first_of, lazy_first, delay_and_raise,
+    make_parser_from_terminal, compiled_or_parsers, make_literal_run_parser)
+from poyais.utility import (
+    LanguageToken, UtilityToken, node_from_iterable, strongly_connected)
+
+# the grammar as data, between the lexer and the closures: one tuple per
+# expression, built by dispatch the way poyais.vm builds its expressions.
+# passes rewrite rule -> expression dicts into smaller or cheaper ones,
+# and lower() turns what's left into parsers.
+
+# every pass keeps the trees the grammar parses to exactly as they were.
+# that rules a few things out: a sequence inside a sequence is a node
+# inside a node, so flattening only applies to choices, and factoring
+# alternatives needs Factor, which builds the node each alternative
+# would have built.
+
+Terminal = namedtuple('Terminal', ('string',))
+Reference = namedtuple('Reference', ('rule',))
+Seq = namedtuple('Seq', ('items',))
+Choice = namedtuple('Choice', ('alternatives',))
+Repeat = namedtuple('Repeat', ('item',))
+Optional = namedtuple('Optional', ('item',))
+
+# only made by the passes:
+
+# terminals next to each other in a sequence, checked all at once. still
+# one token each in the node.
+Terminals = namedtuple('Terminals', ('strings',))
+
+# Choice(Seq(prefix + rest) for rest in rests), matching prefix once
+Factor = namedtuple('Factor', ('prefix', 'rests'))
+
+IR_COMBINATORS = {
+    '|': lambda *exprs: Choice(exprs),
+    ',': lambda *exprs: Seq(exprs),
+}
+
+IR_GROUPS = {
+    '}': Repeat,
+    ']': Optional,
+    ')': lambda expr: expr,
+}
+
+
+def _terminal(rule, terminal):
+    return Terminal(terminal)
+
+
+def _reference(rules, identifier):
+    return Reference(identifier)
+
+
+def grammar_ir(lexed_rules):
+    "rule -> expression, for each of the lexed rules"
+    out = {}
+    for lexed_rule in lexed_rules:
+        out[lexed_rule.identifier] = dispatch(
+            out, lexed_rule, iter(lexed_rule.tokens), {},
+            IR_COMBINATORS, IR_GROUPS, GROUP_COMPANIONS,
+            make_terminal=_terminal, make_identifier=_reference)
+    return out
+
+
+def same(expr, other):
+    """
+    expr == other, telling the kinds of expression apart. They're
+    namedtuples, so == alone has Terminal('a') == Reference('a').
+    """
+    if type(expr) is not type(other):
+        return False
+    if isinstance(expr, tuple):
+        return len(expr) == len(other) and all(map(same, expr, other))
+    return expr == other
+
+
+def children(expr):
+    if isinstance(expr, Seq):
+        return expr.items
+    elif isinstance(expr, Choice):
+        return expr.alternatives
+    elif isinstance(expr, (Repeat, Optional)):
+        return (expr.item,)
+    elif isinstance(expr, Factor):
+        return expr.prefix + tuple(item for rest in expr.rests
+                                   for item in rest)
+    return ()
+
+
+def rewrite(expr, fun):
+    "expr with fun applied to it and everything under it, innermost first"
+    if isinstance(expr, Seq):
+        expr = Seq(tuple(rewrite(item, fun) for item in expr.items))
+    elif isinstance(expr, Choice):
+        expr = Choice(tuple(rewrite(alternative, fun)
+                            for alternative in expr.alternatives))
+    elif isinstance(expr, (Repeat, Optional)):
+        expr = type(expr)(rewrite(expr.item, fun))
+    elif isinstance(expr, Factor):
+        expr = Factor(tuple(rewrite(item, fun) for item in expr.prefix),
+                      tuple(tuple(rewrite(item, fun) for item in rest)
+                            for rest in expr.rests))
+    return fun(expr)
+
+
+def references(expr):
+    "The rules expr calls directly"
+    if isinstance(expr, Reference):
+        return {expr.rule}
+    return set().union(*map(references, children(expr)))
+
+
+def reachable(rules, roots):
+    "roots and every rule they call, however indirectly"
+    seen = set()
+    todo = [root for root in roots if root in rules]
+    while todo:
+        rule = todo.pop()
+        if rule not in seen:
+            seen.add(rule)
+            todo.extend(ref for ref in references(rules[rule])
+                        if ref in rules)
+    return seen
+
+
+def call_graph(rules):
+    "rule -> the defined rules it calls directly"
+    return {rule: sorted(ref for ref in references(expr) if ref in rules)
+            for rule, expr in rules.items()}
+
+
+def recursive_rules(rules):
+    "The rules that can end up calling themselves"
+    graph = call_graph(rules)
+    return {rule for component in strongly_connected(graph)
+            for rule in component
+            if len(component) > 1 or rule in graph[rule]}
+
+
+def is_trivial(expr):
+    "A terminal, a call, or a choice of those: nothing worth a call of its own"
+    if isinstance(expr, Choice):
+        return all(isinstance(alternative, (Terminal, Reference))
+                   for alternative in expr.alternatives)
+    return isinstance(expr, (Terminal, Reference))
+
+
+def inline_rules(rules):
+    """
+    Replace calls to trivial rules with their expressions. A call
+    returns whatever the rule's expression matched, so this only saves
+    the call. Recursive rules are left alone.
+    """
+    recursive = recursive_rules(rules)
+    trivial = {rule for rule, expr in rules.items()
+               if rule not in recursive and is_trivial(expr)}
+    done = {}
+
+    def inline(expr):
+        if isinstance(expr, Reference) and expr.rule in trivial:
+            return done[expr.rule]
+        return expr
+    # callees first, so a trivial rule is done before anything calls it
+    for component in strongly_connected(call_graph(rules)):
+        for rule in component:
+            done[rule] = rewrite(rules[rule], inline)
+    return {rule: done[rule] for rule in rules}
+
+
+def _flatten(expr):
+    if isinstance(expr, Choice):
+        alternatives = []
+        for alternative in expr.alternatives:
+            if isinstance(alternative, Choice):
+                alternatives.extend(alternative.alternatives)
+            else:
+                alternatives.append(alternative)
+        return Choice(tuple(alternatives))
+    elif isinstance(expr, Optional) and isinstance(expr.item, Optional):
+        return expr.item
+    return expr
+
+
+def flatten(rules):
+    """
+    Choices of choices become one choice, and optional optionals one
+    optional. Sequences stay nested, see the top of the module.
+    """
+    return {rule: rewrite(expr, _flatten) for rule, expr in rules.items()}
+
+
+def _left_factor(expr):
+    if not isinstance(expr, Choice):
+        return expr
+    alternatives = []
+    # alternatives next to each other starting with the same item
+    run = []
+    for alternative in expr.alternatives:
+        if (run and isinstance(alternative, Seq) and
+                same(alternative.items[0], run[0].items[0])):
+            run.append(alternative)
+            continue
+        _close_run(run, alternatives)
+        if isinstance(alternative, Seq):
+            run = [alternative]
+        else:
+            run = []
+            alternatives.append(alternative)
+    _close_run(run, alternatives)
+    if len(alternatives) == 1:
+        return alternatives[0]
+    return Choice(tuple(alternatives))
+
+
+def _close_run(run, alternatives):
+    if len(run) > 1:
+        alternatives.append(_factor_run(run))
+    elif run:
+        alternatives.append(run[0])
+
+
+def _factor_run(run):
+    # every alternative keeps at least one item of its own, so each of
+    # them still builds a node of the prefix and the rest
+    shortest = min(len(seq.items) for seq in run)
+    size = 1
+    while (size < shortest - 1 and
+           all(same(seq.items[size], run[0].items[size]) for seq in run)):
+        size += 1
+    return Factor(run[0].items[:size],
+                  tuple(seq.items[size:] for seq in run))
+
+
+def left_factor(rules):
+    """
+    Alternatives next to each other that start the same way match their
+    common start once, then try each of their rests.
+    """
+    return {rule: rewrite(expr, _left_factor) for rule, expr in rules.items()}
+
+
+def _merge_items(items):
+    out = []
+    for item in items:
+        if isinstance(item, Terminal) and out and isinstance(
+                out[-1], (Terminal, Terminals)):
+            last = out.pop()
+            strings = (last.strings if isinstance(last, Terminals)
+                       else (last.string,))
+            out.append(Terminals(strings + (item.string,)))
+        else:
+            out.append(item)
+    return tuple(out)
+
+
+def _merge_terminals(expr):
+    if isinstance(expr, Seq):
+        return Seq(_merge_items(expr.items))
+    elif isinstance(expr, Factor):
+        return Factor(_merge_items(expr.prefix),
+                      tuple(_merge_items(rest) for rest in expr.rests))
+    return expr
+
+
+def merge_terminals(rules):
+    "Runs of terminals in a sequence are checked with one startswith"
+    return {rule: rewrite(expr, _merge_terminals)
+            for rule, expr in rules.items()}
+
+
+def remove_unreachable(rules, roots):
+    "Only roots and the rules they need"
+    keep = reachable(rules, roots)
+    return {rule: expr for rule, expr in rules.items() if rule in keep}
+
+
+PASSES = (inline_rules, flatten, left_factor, merge_terminals)
+
+
+def optimize(rules, roots=None, passes=PASSES):
+    """
+    Run rules through every pass in turn. Given roots, rules none of
+    them need are dropped at the end.
+    """
+    for run_pass in passes:
+        rules = run_pass(rules)
+    if roots is not None:
+        rules = remove_unreachable(rules, roots)
+    return rules
+
+
+KINDS = {kind.__name__: kind for kind in (
+    Terminal, Reference, Seq, Choice, Repeat, Optional, Terminals, Factor)}
+
+
+def _encode(thing):
+    # an expression is {kind: [fields]}, a tuple a list, a string itself
+    if type(thing) in KINDS.values():
+        return {type(thing).__name__: [_encode(field) for field in thing]}
+    elif isinstance(thing, tuple):
+        return [_encode(item) for item in thing]
+    return thing
+
+
+def _decode(thing):
+    if isinstance(thing, dict):
+        (kind, fields), = thing.items()
+        return KINDS[kind](*map(_decode, fields))
+    elif isinstance(thing, list):
+        return tuple(map(_decode, thing))
+    return thing
+
+
+def dump_ir(rules):
+    return json.dumps({
+        'format': CACHE_FORMAT,
+        'rules': [[rule, _encode(expr)] for rule, expr in rules.items()],
+    })
+
+
+def load_ir(serialized):
+    got = json.loads(serialized)
+    if got.get('format') != CACHE_FORMAT:
+        raise ValueError('Unknown grammar cache format')
+    return {rule: _decode(expr) for rule, expr in got['rules']}
+
+
+def optimized_rules(ebnf_string, roots=None, cache_dir=None, passes=PASSES):
+    """
+    optimize(grammar_ir(...)) of ebnf_string, read from cache_dir when
+    it's been worked out for these roots before. Passes other than
+    PASSES aren't kept, there's no telling them apart on disk.
+    """
+    def build():
+        lexed_rules = cached_ebnf_lexer(ebnf_string, cache_dir)
+        return optimize(grammar_ir(lexed_rules), roots, passes)
+    if cache_dir is None or passes is not PASSES:
+        return build()
+    parts = ('ir',) if roots is None else ('ir', 'roots', *sorted(roots))
+    return cached(cache_dir, grammar_key(ebnf_string, *parts), build,
+                  dump_ir, load_ir)
+
+
+# what lower builds each kind of expression with. the closures the rest
+# of poyais uses are CLOSURES, poyais.arena has another.
+Target = namedtuple('Target', (
+    'terminal', 'delayed', 'choice', 'repeat', 'optional', 'sequence',
+    'factor'))
+
+
+def lower(rules, target=None):
+    "rule -> parser, for every rule, built from the expressions"
+    if target is None:
+        target = CLOSURES
+    table = {}
+
+    def lower_expr(expr):
+        if isinstance(expr, Terminal):
+            return target.terminal(expr.string)
+        elif isinstance(expr, Reference):
+            if expr.rule not in rules:
+                raise KeyError("Undefined rule: {}".format(expr.rule))
+            if expr.rule in table:
+                return table[expr.rule]
+            # a call back into the rules being lowered has to wait for
+            # the table to be finished
+            return target.delayed(table, expr.rule)
+        elif isinstance(expr, Choice):
+            return target.choice(*map(lower_expr, expr.alternatives))
+        elif isinstance(expr, Repeat):
+            return target.repeat(lower_expr(expr.item))
+        elif isinstance(expr, Optional):
+            return target.optional(lower_expr(expr.item))
+        elif isinstance(expr, Seq):
+            return target.sequence(lower_items(expr.items))
+        elif isinstance(expr, Factor):
+            return target.factor(lower_items(expr.prefix),
+                                 tuple(map(lower_items, expr.rests)))
+        raise AssertionError('Unknown expression: {}'.format(expr))
+
+    def lower_items(items):
+        return tuple((''.join(item.strings), item.strings)
+                     if isinstance(item, Terminals)
+                     else lower_expr(item) for item in items)
+
+    # callees first, so only calls within a cycle are delayed, and
+    # long chains of rules are lowered without a frame per rule
+    for component in strongly_connected(call_graph(rules)):
+        for rule in component:
+            table[rule] = lower_expr(rules[rule])
+    return {rule: table[rule] for rule in rules}
+
+
+# sequences are lowered to steps: a parser, adding its match to the
+# node, or a run of terminals as (all of them joined, each of them),
+# adding a token for each.
+
+def _match_steps(steps, string, pos, out):
+    "Match steps from pos, adding to out. Where they stopped, or None"
+    for step in steps:
+        if step.__class__ is tuple:
+            joined, terminals = step
+            if not string.startswith(joined, pos):
+                return None
+            for terminal in terminals:
+                end = pos + len(terminal)
+                out.append(LanguageToken('terminal', terminal, pos, end))
+                pos = end
+        else:
+            got = step(string, pos)
+            if got is None:
+                return None
+            out.append(got)
+            pos = got.end
+    return pos
+
+
+def _first_of_steps(steps):
+    chars = set()
+    for step in steps:
+        if step.__class__ is tuple:
+            joined = step[0]
+            first = First(frozenset(joined[:1]), joined == '')
+        else:
+            first = first_of(step)
+        if first is None:
+            return None
+        chars |= first.chars
+        if not first.nullable:
+            return First(frozenset(chars), False)
+    return First(frozenset(chars), True)
+
+
+# Many<step> -> parser -> Optional<Node>
+def sequence_parser(steps):
+    "and_parsers, for steps"
+
+    # _match_steps, written out here: sequences are most of the calls
+    def parser(string, pos):
+        out = []
+        for step in steps:
+            if step.__class__ is tuple:
+                joined, terminals = step
+                if not string.startswith(joined, pos):
+                    return None
+                for terminal in terminals:
+                    end = pos + len(terminal)
+                    out.append(LanguageToken('terminal', terminal, pos, end))
+                    pos = end
+            else:
+                got = step(string, pos)
+                if got is None:
+                    return None
+                out.append(got)
+                pos = got.end
+        return node_from_iterable(out)
+    parser.first_set = lazy_first(lambda: _first_of_steps(steps))
+    return parser
+
+
+# Many<step> -> Many<Many<step>> -> parser -> Optional<Node>
+def factor_parser(prefix, rests):
+    "or_parsers of a sequence_parser for prefix + rest, for each rest"
+    def parser(string, pos):
+        out = []
+        pos = _match_steps(prefix, string, pos, out)
+        if pos is None:
+            return None
+        for rest in rests:
+            got = list(out)
+            if _match_steps(rest, string, pos, got) is not None:
+                return node_from_iterable(got)
+
+    def first_set():
+        first = _first_of_steps(prefix)
+        if first is None or not first.nullable:
+            return first
+        firsts = tuple(_first_of_steps(rest) for rest in rests)
+        if None in firsts:
+            return None
+        return First(first.chars.union(*(f.chars for f in firsts)),
+                     any(f.nullable for f in firsts))
+    parser.first_set = lazy_first(first_set)
+    return parser
+
+
+# parser -> parser -> Node | UtilityToken
+def repeat_parser(parser):
+    "compiled_many_parser, without going through or_parsers for the empty case"
+    literals = getattr(parser, 'literals', None)
+    if literals and all(len(literal) == 1 for literal in literals):
+        return make_literal_run_parser(literals)
+
+    def repeated(string, pos):
+        out = []
+        here = pos
+        got = parser(string, here)
+        while got is not None:
+            out.append(got)
+            here = got.end
+            got = parser(string, here)
+        if out:
+            return node_from_iterable(out)
+        return UtilityToken('empty', '', pos, pos)
+    repeated.first_set = lazy_first(lambda: _nullable(first_of(parser)))
+    return repeated
+
+
+# parser -> parser -> LanguageToken | Node | UtilityToken
+def maybe_parser(parser):
+    "optional_parser, without going through or_parsers"
+    def maybe(string, pos):
+        got = parser(string, pos)
+        if got is None:
+            return UtilityToken('empty', '', pos, pos)
+        return got
+    maybe.first_set = lazy_first(lambda: _nullable(first_of(parser)))
+    return maybe
+
+
+def _nullable(first):
+    return None if first is None else First(first.chars, True)
+
+
+CLOSURES = Target(
+    terminal=lambda terminal: make_parser_from_terminal(None, terminal),
+    delayed=delay_and_raise,
+    choice=compiled_or_parsers,
+    repeat=repeat_parser,
+    optional=maybe_parser,
+    sequence=sequence_parser,
+    factor=factor_parser)
+
+
+def optimized_parser_table(ebnf_string, roots=None, cache_dir=None,
+                           passes=PASSES):
+    """
+    Like make_parser_table, but the grammar goes through optimize first.
+    Parses to the same trees. Given roots, only they and the rules they
+    need are in the table. With a cache_dir the optimized grammar is
+    kept on disk, see optimized_rules.
+    """
+    return lower(optimized_rules(ebnf_string, roots, cache_dir, passes))
@@ -1,5 +1,9 @@
+from array import array
+import functools
 import re
 
+from poyais.utility import LineIndex
+
 
 # this new lexer is a little sad
 # it has no concept of lines
@@ -16,17 +20,237 @@ import re
 # the only strangeness I see is in multiline strings
 # I'll support them when Java does >:)
 
+TOKEN_CHARS = frozenset(('`', '(', ')', "'"))
+WHITESPACE = frozenset(('\t', ' '))
+SYMBOL_REG = re.compile(r"[a-zA-Z\-\+\*\/0-9]+")
+
+# files have newlines, and reader used to turn them into spaces anyway.
+FILE_WHITESPACE = WHITESPACE | {'\n', '\r'}
+
+
 def lex(program_string,
         string_delim="'",
-        token_chars={'`', '(', ')', "'"},
-        whitespace={'\t', ' '},
-        symbol_reg=re.compile(r"[a-zA-Z\-\+\*\/0-9]+")):
+        token_chars=TOKEN_CHARS,
+        whitespace=WHITESPACE,
+        symbol_reg=SYMBOL_REG):
+    yield from _lex(program_string, True, 0,
+                    token_chars, whitespace, symbol_reg)
+
+
+def lex_charwise(program_string,
+                 string_delim="'",
+                 token_chars=TOKEN_CHARS,
+                 whitespace=WHITESPACE,
+                 symbol_reg=SYMBOL_REG):
+    "The original character at a time lexer, kept to check lex against"
+    yield from _lex_charwise(program_string, True, 0,
+                             token_chars, whitespace, symbol_reg)
+
+
+# the scanner is one regex, run over the program with finditer: each
+# match is optional whitespace followed by a token, and the group that
+# matched is the kind of token. the order of the groups is the order the
+# charwise lexer checks things in, anything else lands in error. this
+# assumes no whitespace character can also start a token.
+STRING_PATTERN = r'"(?:[^"\\]*\\[^"]*")*[^"\\]*"'
+
+# the rest of a string from just inside it, for strings that don't fit
+# in one chunk: up to and past the closing quote, to the quote a
+# backslash is waiting for (the backslash is armed), or as far as there
+# is while still open.
+_STRING_REST = re.compile(STRING_PATTERN[1:])
+_ARMED_REST = re.compile(r'[^"]*"')
+_OPEN_REST = re.compile(STRING_PATTERN[1:-1])
+
+
+@functools.lru_cache(maxsize=8)
+def _scanner(token_chars, whitespace, symbol_reg):
+    return re.compile(r'(?:{})*(?:{}|$)'.format(
+        _char_class(whitespace),
+        '|'.join((
+            '(?P<string>{})'.format(STRING_PATTERN),
+            '(?P<token>{})'.format(_char_class(token_chars)),
+            '(?P<symbol>{})'.format(symbol_reg.pattern),
+            '(?P<error>.)',
+        ))), re.DOTALL).finditer
+
+
+def _char_class(chars):
+    if not chars:
+        return '(?!)'
+    return '[{}]'.format(''.join(re.escape(char) for char in sorted(chars)))
+
+
+def _lex(program_string, final, offset, token_chars, whitespace, symbol_reg):
+    """
+    The lexer proper. When final is False, program_string is only a
+    prefix of the program: instead of yielding a token that runs into
+    the end of it (it might carry on in the next chunk) we stop, and
+    return where that token started so the caller can pick up from there.
+    offset is where program_string starts in the whole program, for
+    error messages.
+    """
+    scan = _scanner(frozenset(token_chars), frozenset(whitespace),
+                    symbol_reg)
+    end = len(program_string)
+    for got in scan(program_string):
+        kind = got.lastgroup
+        if kind == 'symbol':
+            if not final and got.end() == end:
+                return got.start(kind)
+            yield got.group(kind)
+        elif kind == 'token':
+            yield got.group(kind)
+        elif kind == 'string':
+            yield _unescape(got.group(kind))
+        elif kind == 'error':
+            pos = got.start(kind)
+            _unlexable(program_string, pos, offset)
+            # a string that never closes. it might in the next chunk,
+            # at the very end it gets dropped like it always has.
+            return end if final else pos
+    return end
+
+
+def _unlexable(program_string, pos, offset):
+    "Raises for what stopped the scanner, unless it's an unclosed string"
+    char = program_string[pos]
+    if char == "\\":
+        raise ValueError(
+            "Backslash outside of string context at {}".format(offset + pos))
+    elif char != '"':
+        raise ValueError("Uncaught string at pos " + str(offset + pos))
+
+
+def string_end(text, armed=False, pos=0):
+    """
+    Where the string that text is in the middle of (from pos) closes,
+    None if it's still open at the end of text, and whether a backslash
+    is left waiting for its quote. armed says one already was.
+    """
+    if armed:
+        got = _ARMED_REST.match(text, pos)
+        if got is None:
+            return None, True
+        pos = got.end()
+    got = _STRING_REST.match(text, pos)
+    if got is not None:
+        return got.end(), False
+    return None, _OPEN_REST.match(text, pos).end() < len(text)
+
+
+def _unescape(string_token):
+    """
+    A backslash in a string arms the next quote, which is then kept
+    instead of closing the string. Until that quote shows up any further
+    backslashes are kept as they are.
+    """
+    if "\\" not in string_token:
+        return string_token
+    buf = ['"']
+    escaped = False
+    for char in string_token[1:]:
+        if char == "\\" and not escaped:
+            escaped = True
+            continue
+        if char == '"':
+            escaped = False
+        buf.append(char)
+    return "".join(buf)
+
+
+# kinds of token in a TokenBuffer
+STRING, TOKEN, SYMBOL = 0, 1, 2
+TOKEN_KINDS = ('string', 'token', 'symbol')
+
+
+def lex_buffer(program_string,
+               token_chars=TOKEN_CHARS,
+               whitespace=WHITESPACE,
+               symbol_reg=SYMBOL_REG):
+    "lex, but into a TokenBuffer over program_string"
+    scan = _scanner(frozenset(token_chars), frozenset(whitespace),
+                    symbol_reg)
+    offset_code = offset_typecode(len(program_string))
+    starts, ends, kinds = array(offset_code), array(offset_code), array('B')
+    codes = {kind: code for code, kind in enumerate(TOKEN_KINDS)}
+    for got in scan(program_string):
+        kind = got.lastgroup
+        if kind == 'error':
+            _unlexable(program_string, got.start(kind), 0)
+            break
+        elif kind is not None:
+            start, end = got.span(kind)
+            starts.append(start)
+            ends.append(end)
+            kinds.append(codes[kind])
+    return TokenBuffer(program_string, starts, ends, kinds)
+
+
+def offset_typecode(length):
+    return 'I' if length < 2 ** (8 * array('I').itemsize) else 'Q'
+
+
+class TokenBuffer:
+    """
+    The tokens of a program kept as offsets into its source instead of as
+    strings: parallel arrays of start, end and kind. A token's text is
+    only sliced out when it's asked for, indexing and iterating give the
+    same strings lex does.
+    """
+    __slots__ = ('source', 'starts', 'ends', 'kinds', '_lines')
+
+    def __init__(self, source, starts, ends, kinds):
+        self.source = source
+        self.starts = starts
+        self.ends = ends
+        self.kinds = kinds
+        self._lines = None
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def __getitem__(self, idx):
+        raw = self.source[self.starts[idx]:self.ends[idx]]
+        return _unescape(raw) if self.kinds[idx] == STRING else raw
+
+    def __iter__(self):
+        for idx in range(len(self.kinds)):
+            yield self[idx]
+
+    def raw(self, idx):
+        "The token as it's written in the source, escapes and all"
+        return self.source[self.starts[idx]:self.ends[idx]]
+
+    def span(self, idx):
+        return self.starts[idx], self.ends[idx]
+
+    def kind(self, idx):
+        return TOKEN_KINDS[self.kinds[idx]]
+
+    def line_col(self, idx):
+        "1 based line and 0 based column the token starts at"
+        if self._lines is None:
+            self._lines = LineIndex(self.source)
+        return self._lines.line_col(self.starts[idx])
+
+    def line_cols(self):
+        "line_col of every token, in one pass over the lines"
+        if self._lines is None:
+            self._lines = LineIndex(self.source)
+        return self._lines.resolve(self.starts)
+
+
+def _lex_charwise(program_string, final, offset,
+                  token_chars, whitespace, symbol_reg):
     pos = 0
+    end = len(program_string)
     buf = []
     state_string = False
     state_escaped = False
+    string_start = 0
 
-    while pos < len(program_string):
+    while pos < end:
         char = program_string[pos]
         if state_string:
             if char == '"':
@@ -46,27 +270,92 @@ def lex(program_string,
                 buf.append(char)
         elif char == '"':
             state_string = True
+            string_start = pos
             buf.append(char)
         elif char == "\\":
             raise ValueError(
-                "Backslash outside of string context at {}".format(pos))
+                "Backslash outside of string context at {}".format(
+                    offset + pos))
         elif char in token_chars:
             yield char
-        # this bothers me slightly. first for if let
-        # second this is a case where we move more than one.
-        elif symbol_reg.match(program_string[pos:]):
-            match = symbol_reg.match(program_string[pos:]).group()
-            pos += len(match) - 1
-            yield match
-        elif char not in whitespace:
-            raise ValueError(
-                "Uncaught string at pos " + str(pos))
+        else:
+            # this bothers me slightly, this is a case where we move more
+            # than one.
+            match = symbol_reg.match(program_string, pos)
+            if match:
+                if not final and match.end() == end:
+                    return pos
+                pos = match.end() - 1
+                yield match.group()
+            elif char not in whitespace:
+                raise ValueError(
+                    "Uncaught string at pos " + str(offset + pos))
         pos += 1
+    if state_string and not final:
+        return string_start
+    return pos
+
+
+def lex_stream(chunks,
+               token_chars=TOKEN_CHARS,
+               whitespace=WHITESPACE,
+               symbol_reg=SYMBOL_REG):
+    """
+    lex over an iterable of text chunks, yielding the same tokens lex
+    would on their concatenation. Only the unfinished token at the end
+    of a chunk is carried over, so memory doesn't grow with the input.
+    A token that goes on over many chunks is only scanned once more, when
+    it's finished, so that doesn't cost more than one that doesn't.
+    """
+    # the pieces of the unfinished token, the kind of token it is, and
+    # whether it's a string with a backslash waiting for its quote
+    pending = []
+    kind = None
+    armed = False
+    # where the pending token, or failing that the next chunk, starts
+    offset = 0
+    for chunk in chunks:
+        if kind == 'string':
+            closed, armed = string_end(chunk, armed)
+            if closed is None:
+                pending.append(chunk)
+                continue
+            pending.append(chunk[:closed])
+            string = ''.join(pending)
+            yield _unescape(string)
+            offset += len(string)
+            chunk = chunk[closed:]
+        elif kind == 'symbol':
+            got = symbol_reg.match(chunk)
+            pending.append(chunk)
+            if got is not None and got.end() == len(chunk):
+                continue
+            chunk = ''.join(pending)
+        consumed = yield from _lex(chunk, False, offset,
+                                   token_chars, whitespace, symbol_reg)
+        offset += consumed
+        pending = [chunk[consumed:]] if consumed < len(chunk) else []
+        kind = None
+        if pending:
+            # _lex only stops early for a symbol or a string
+            if pending[0][0] == '"':
+                kind = 'string'
+                armed = string_end(pending[0], pos=1)[1]
+            else:
+                kind = 'symbol'
+    yield from _lex(''.join(pending), True, offset,
+                    token_chars, whitespace, symbol_reg)
+
+
+def lex_file(program, chunk_size=64 * 1024):
+    "lex_stream over a text file object, newlines count as whitespace"
+    chunks = iter(lambda: program.read(chunk_size), '')
+    return lex_stream(chunks, whitespace=FILE_WHITESPACE)
 
 
 def reader(filename):
     buf = []
     with open(filename, mode='r', encoding='utf-8') as program:
         for line in program:
-            buf.append(program.readline().strip())
+            buf.append(line.strip())
     return " ".join(buf).strip()
@@ -1,5 +1,6 @@
-from combinator import make_parser_table
-from utility import LanguageNode, LanguageToken
+import threading
+
+from poyais.ir import optimized_parser_table
 
 EBNF_SPEC = """
 letter = "a" | "b" | "c" | "d" | "e" | "f" | "g" | "h" | "i" | "j" | "k"
@@ -20,6 +21,40 @@ quote = "'" ;
 backquote = "`" ;
 quoted list = ( quote , "(" , ")" ) | ( quote, sexp ) ;
 backquoted list = ( backquote , "(" , ")" ) | ( backquote, sexp ) ;
+
+form = sexp | quoted list | backquoted list | symbol ;
+program = { { whitespace }, form }, { whitespace } ;
 """
 
-LISP_PARSER_TABLE = make_parser_table(EBNF_SPEC)
+# the table is built on first use rather than at import, plenty of
+# things import this module without ever parsing scheme. it goes through
+# poyais.ir's passes, which parse to the same trees, only faster.
+# poyais.lisp_parser is the same grammar written out ahead of time by
+# poyais.codegen, for when even that is too much.
+_table = None
+_table_lock = threading.Lock()
+
+
+def lisp_parser_table():
+    "The compiled EBNF_SPEC, built once on first call"
+    global _table
+    table = _table
+    if table is None:
+        with _table_lock:
+            if _table is None:
+                _table = optimized_parser_table(EBNF_SPEC)
+            table = _table
+    return table
+
+
+def warm_up():
+    "Build the parser table now instead of on the first parse"
+    lisp_parser_table()
+
+
+def __getattr__(name):
+    # keeps LISP_PARSER_TABLE working as a module attribute
+    if name == 'LISP_PARSER_TABLE':
+        return lisp_parser_table()
+    raise AttributeError(
+        "module {!r} has no attribute {!r}".format(__name__, name))
@@ -0,0 +1,433 @@
+# Generated by poyais.codegen, edit the grammar instead of this file.
+import re
+
+from poyais.utility import LanguageToken, UtilityToken, node_from_iterable
+
+CHARS0 = frozenset('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ')
+CHARS1 = frozenset('0123456789')
+CHARS2 = frozenset('+-/*')
+CHARS3 = frozenset(' \t\n')
+CHARS4 = frozenset('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789+-/*')
+CHARS5 = frozenset('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ+-/*')
+REG6 = re.compile('[abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789\\+\\-/\\*]+')
+REG7 = re.compile('[\\ \\\t\\\n]+')
+CHARS8 = frozenset("'")
+CHARS9 = frozenset('`')
+CHARS10 = frozenset('(')
+CHARS11 = frozenset('*+-/ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz')
+
+
+def parse_letter(string, pos):
+    # letter
+    char3 = string[pos:pos + 1]
+    if char3 in CHARS0:
+        end2 = pos + 1
+        out1 = LanguageToken('terminal', char3, pos, end2)
+    else:
+        out1 = None
+    return out1
+
+
+def parse_digit(string, pos):
+    # digit
+    char6 = string[pos:pos + 1]
+    if char6 in CHARS1:
+        end5 = pos + 1
+        out4 = LanguageToken('terminal', char6, pos, end5)
+    else:
+        out4 = None
+    return out4
+
+
+def parse_math_symbol(string, pos):
+    # math symbol
+    char9 = string[pos:pos + 1]
+    if char9 in CHARS2:
+        end8 = pos + 1
+        out7 = LanguageToken('terminal', char9, pos, end8)
+    else:
+        out7 = None
+    return out7
+
+
+def parse_whitespace(string, pos):
+    # whitespace
+    char12 = string[pos:pos + 1]
+    if char12 in CHARS3:
+        end11 = pos + 1
+        out10 = LanguageToken('terminal', char12, pos, end11)
+    else:
+        out10 = None
+    return out10
+
+
+def parse_character(string, pos):
+    # character
+    char15 = string[pos:pos + 1]
+    if char15 in CHARS4:
+        end14 = pos + 1
+        out13 = LanguageToken('terminal', char15, pos, end14)
+    else:
+        out13 = None
+    return out13
+
+
+def parse_symbol(string, pos):
+    # symbol
+    out16 = None
+    while True:
+        char20 = string[pos:pos + 1]
+        if char20 in CHARS5:
+            end19 = pos + 1
+            out18 = LanguageToken('terminal', char20, pos, end19)
+        else:
+            out18 = None
+        if out18 is None:
+            break
+        match23 = REG6.match(string, end19)
+        if match23 is None:
+            out21 = UtilityToken('empty', '', end19, end19)
+            end22 = end19
+        else:
+            end22 = match23.end()
+            out21 = node_from_iterable(tuple(
+                LanguageToken('terminal', char, idx, idx + 1)
+                for idx, char in enumerate(match23.group(), end19)))
+        if out21 is None:
+            break
+        out16 = node_from_iterable((out18, out21,))
+        end17 = end22
+        break
+    return out16
+
+
+def parse_sexp(string, pos):
+    # sexp
+    out24 = None
+    while True:
+        if string.startswith('(', pos):
+            end27 = pos + 1
+            out26 = LanguageToken('terminal', '(', pos, end27)
+        else:
+            out26 = None
+        if out26 is None:
+            break
+        match30 = REG7.match(string, end27)
+        if match30 is None:
+            out28 = UtilityToken('empty', '', end27, end27)
+            end29 = end27
+        else:
+            end29 = match30.end()
+            out28 = node_from_iterable(tuple(
+                LanguageToken('terminal', char, idx, idx + 1)
+                for idx, char in enumerate(match30.group(), end27)))
+        if out28 is None:
+            break
+        out31 = parse_symbol(string, end29)
+        if out31 is not None:
+            end32 = out31.end
+        if out31 is None:
+            break
+        items35 = []
+        end34 = end32
+        while True:
+            out36 = None
+            while True:
+                char40 = string[end34:end34 + 1]
+                if char40 in CHARS3:
+                    end39 = end34 + 1
+                    out38 = LanguageToken('terminal', char40, end34, end39)
+                else:
+                    out38 = None
+                if out38 is None:
+                    break
+                out41 = parse_symbol(string, end39)
+                if out41 is not None:
+                    end42 = out41.end
+                if out41 is None:
+                    break
+                out36 = node_from_iterable((out38, out41,))
+                end37 = end42
+                break
+            if out36 is None:
+                break
+            items35.append(out36)
+            end34 = end37
+        if items35:
+            out33 = node_from_iterable(items35)
+        else:
+            out33 = UtilityToken('empty', '', end32, end32)
+        if out33 is None:
+            break
+        match45 = REG7.match(string, end34)
+        if match45 is None:
+            out43 = UtilityToken('empty', '', end34, end34)
+            end44 = end34
+        else:
+            end44 = match45.end()
+            out43 = node_from_iterable(tuple(
+                LanguageToken('terminal', char, idx, idx + 1)
+                for idx, char in enumerate(match45.group(), end34)))
+        if out43 is None:
+            break
+        if string.startswith(')', end44):
+            end47 = end44 + 1
+            out46 = LanguageToken('terminal', ')', end44, end47)
+        else:
+            out46 = None
+        if out46 is None:
+            break
+        out24 = node_from_iterable((out26, out28, out31, out33, out43, out46,))
+        end25 = end47
+        break
+    return out24
+
+
+def parse_quote(string, pos):
+    # quote
+    if string.startswith("'", pos):
+        end49 = pos + 1
+        out48 = LanguageToken('terminal', "'", pos, end49)
+    else:
+        out48 = None
+    return out48
+
+
+def parse_backquote(string, pos):
+    # backquote
+    if string.startswith('`', pos):
+        end51 = pos + 1
+        out50 = LanguageToken('terminal', '`', pos, end51)
+    else:
+        out50 = None
+    return out50
+
+
+def parse_quoted_list(string, pos):
+    # quoted list
+    out52 = None
+    while True:
+        if string[pos:pos + 1] in CHARS8:
+            out54 = None
+            while True:
+                char58 = string[pos:pos + 1]
+                if char58 in CHARS8:
+                    end57 = pos + 1
+                    out56 = LanguageToken('terminal', char58, pos, end57)
+                else:
+                    out56 = None
+                if out56 is None:
+                    break
+                if string.startswith('(', end57):
+                    end60 = end57 + 1
+                    out59 = LanguageToken('terminal', '(', end57, end60)
+                else:
+                    out59 = None
+                if out59 is None:
+                    break
+                if string.startswith(')', end60):
+                    end62 = end60 + 1
+                    out61 = LanguageToken('terminal', ')', end60, end62)
+                else:
+                    out61 = None
+                if out61 is None:
+                    break
+                out54 = node_from_iterable((out56, out59, out61,))
+                end55 = end62
+                break
+            if out54 is not None:
+                out52, end53 = out54, end55
+                break
+        if string[pos:pos + 1] in CHARS8:
+            out63 = None
+            while True:
+                char67 = string[pos:pos + 1]
+                if char67 in CHARS8:
+                    end66 = pos + 1
+                    out65 = LanguageToken('terminal', char67, pos, end66)
+                else:
+                    out65 = None
+                if out65 is None:
+                    break
+                out68 = parse_sexp(string, end66)
+                if out68 is not None:
+                    end69 = out68.end
+                if out68 is None:
+                    break
+                out63 = node_from_iterable((out65, out68,))
+                end64 = end69
+                break
+            if out63 is not None:
+                out52, end53 = out63, end64
+                break
+        break
+    return out52
+
+
+def parse_backquoted_list(string, pos):
+    # backquoted list
+    out70 = None
+    while True:
+        if string[pos:pos + 1] in CHARS9:
+            out72 = None
+            while True:
+                char76 = string[pos:pos + 1]
+                if char76 in CHARS9:
+                    end75 = pos + 1
+                    out74 = LanguageToken('terminal', char76, pos, end75)
+                else:
+                    out74 = None
+                if out74 is None:
+                    break
+                if string.startswith('(', end75):
+                    end78 = end75 + 1
+                    out77 = LanguageToken('terminal', '(', end75, end78)
+                else:
+                    out77 = None
+                if out77 is None:
+                    break
+                if string.startswith(')', end78):
+                    end80 = end78 + 1
+                    out79 = LanguageToken('terminal', ')', end78, end80)
+                else:
+                    out79 = None
+                if out79 is None:
+                    break
+                out72 = node_from_iterable((out74, out77, out79,))
+                end73 = end80
+                break
+            if out72 is not None:
+                out70, end71 = out72, end73
+                break
+        if string[pos:pos + 1] in CHARS9:
+            out81 = None
+            while True:
+                char85 = string[pos:pos + 1]
+                if char85 in CHARS9:
+                    end84 = pos + 1
+                    out83 = LanguageToken('terminal', char85, pos, end84)
+                else:
+                    out83 = None
+                if out83 is None:
+                    break
+                out86 = parse_sexp(string, end84)
+                if out86 is not None:
+                    end87 = out86.end
+                if out86 is None:
+                    break
+                out81 = node_from_iterable((out83, out86,))
+                end82 = end87
+                break
+            if out81 is not None:
+                out70, end71 = out81, end82
+                break
+        break
+    return out70
+
+
+def parse_form(string, pos):
+    # form
+    out88 = None
+    while True:
+        if string[pos:pos + 1] in CHARS10:
+            out90 = parse_sexp(string, pos)
+            if out90 is not None:
+                end91 = out90.end
+            if out90 is not None:
+                out88, end89 = out90, end91
+                break
+        if string[pos:pos + 1] in CHARS8:
+            out92 = parse_quoted_list(string, pos)
+            if out92 is not None:
+                end93 = out92.end
+            if out92 is not None:
+                out88, end89 = out92, end93
+                break
+        if string[pos:pos + 1] in CHARS9:
+            out94 = parse_backquoted_list(string, pos)
+            if out94 is not None:
+                end95 = out94.end
+            if out94 is not None:
+                out88, end89 = out94, end95
+                break
+        if string[pos:pos + 1] in CHARS11:
+            out96 = parse_symbol(string, pos)
+            if out96 is not None:
+                end97 = out96.end
+            if out96 is not None:
+                out88, end89 = out96, end97
+                break
+        break
+    return out88
+
+
+def parse_program(string, pos):
+    # program
+    out98 = None
+    while True:
+        items102 = []
+        end101 = pos
+        while True:
+            out103 = None
+            while True:
+                match107 = REG7.match(string, end101)
+                if match107 is None:
+                    out105 = UtilityToken('empty', '', end101, end101)
+                    end106 = end101
+                else:
+                    end106 = match107.end()
+                    out105 = node_from_iterable(tuple(
+                        LanguageToken('terminal', char, idx, idx + 1)
+                        for idx, char in enumerate(match107.group(), end101)))
+                if out105 is None:
+                    break
+                out108 = parse_form(string, end106)
+                if out108 is not None:
+                    end109 = out108.end
+                if out108 is None:
+                    break
+                out103 = node_from_iterable((out105, out108,))
+                end104 = end109
+                break
+            if out103 is None:
+                break
+            items102.append(out103)
+            end101 = end104
+        if items102:
+            out100 = node_from_iterable(items102)
+        else:
+            out100 = UtilityToken('empty', '', pos, pos)
+        if out100 is None:
+            break
+        match112 = REG7.match(string, end101)
+        if match112 is None:
+            out110 = UtilityToken('empty', '', end101, end101)
+            end111 = end101
+        else:
+            end111 = match112.end()
+            out110 = node_from_iterable(tuple(
+                LanguageToken('terminal', char, idx, idx + 1)
+                for idx, char in enumerate(match112.group(), end101)))
+        if out110 is None:
+            break
+        out98 = node_from_iterable((out100, out110,))
+        end99 = end111
+        break
+    return out98
+
+
+PARSER_TABLE = {
+    'letter': parse_letter,
+    'digit': parse_digit,
+    'math symbol': parse_math_symbol,
+    'whitespace': parse_whitespace,
+    'character': parse_character,
+    'symbol': parse_symbol,
+    'sexp': parse_sexp,
+    'quote': parse_quote,
+    'backquote': parse_backquote,
+    'quoted list': parse_quoted_list,
+    'backquoted list': parse_backquoted_list,
+    'form': parse_form,
+    'program': parse_program,
+}
@@ -1,6 +1,8 @@
 from collections import namedtuple
 import re
 
+from poyais.lexer import SYMBOL_REG
+
 # given a stream of tokens, tag them
 # the fact that I identify these by regs mean
 # that I should probably write a parser combinator
@@ -20,6 +22,8 @@ RegTokenPairing = namedtuple('RegTokenPairing', ['reg', 'symbol_type'])
 # I've got this built already and am not going to use it outside of
 # the context of building token recognization.  but I decided against
 # it, because it breaks nested tokens.
+# ...which left lisp_symbol unanchored, happily matching the front of
+# anything. every pattern gets anchored now, nested tokens can wait.
 
 def buildPairing(reg, symbol_type):
     return RegTokenPairing(re.compile(reg), symbol_type)
@@ -33,26 +37,81 @@ def buildPairing(reg, symbol_type):
 # or turn this types thing into a dictionary and build the pairing
 # at iteration time
 # that... seems reasonable actually
-TYPES = (
-    buildPairing(r'^\($', 'open_paren'),
-    buildPairing(r'^\)$', 'close_paren'),
-    buildPairing("^'$", 'single_quote'),
-    buildPairing("^`$", 'backtick'),
-    buildPairing('^"[^"]*"$', 'string'),  # does this match the empty string?
-    buildPairing(r"^[0-9]+$", 'number'),  # id numbers before symbols
-    buildPairing(r"[a-zA-z\-0-9]+", 'lisp_symbol'),
+TYPE_PATTERNS = (
+    (r'\(', 'open_paren'),
+    (r'\)', 'close_paren'),
+    ("'", 'single_quote'),
+    ("`", 'backtick'),
+    ('"[^"]*"', 'string'),  # does this match the empty string?
+    (r"[0-9]+", 'number'),  # id numbers before symbols
+    # symbols are whatever the lexer thinks they are.
+    (SYMBOL_REG.pattern, 'lisp_symbol'),
 )
 
+TYPES = tuple(buildPairing('^{}$'.format(reg), symbol_type)
+              for reg, symbol_type in TYPE_PATTERNS)
+
+# all of TYPES as one regex, the name of the group that matched is the
+# symbol type. alternation is ordered so numbers still win over symbols.
+CLASSIFIER = re.compile('|'.join(
+    '(?P<{}>{})'.format(symbol_type, reg)
+    for reg, symbol_type in TYPE_PATTERNS))
+
 TokenSymbolPairing = namedtuple('TokenSymbolPairing', ['token', 'symbol_type'])
 
 
-def parse(lexical_stream):
-    for lexical_token in lexical_stream:
-        yield parse_token(lexical_token)
+def parse(lexical_stream, symbols=None):
+    """
+    Pair each token with its symbol type. Given a SymbolTable, tokens
+    are interned in it and symbol types are its integer codes, see
+    symbol_codes.
+    """
+    classify = CLASSIFIER.fullmatch
+    if symbols is None:
+        for lexical_token in lexical_stream:
+            yield _pair(lexical_token, classify(lexical_token))
+    else:
+        pair = _interning_pair(symbols)
+        for lexical_token in lexical_stream:
+            yield pair(lexical_token, classify(lexical_token))
+
+
+def parse_token(lexical_token, symbols=None):
+    pair = _pair if symbols is None else _interning_pair(symbols)
+    return pair(lexical_token, CLASSIFIER.fullmatch(lexical_token))
+
+
+def parse_tokens(lexical_tokens, symbols=None):
+    """
+    parse_token over a whole list of tokens (or a TokenBuffer) at once,
+    with the regex calls done by map rather than a python loop.
+    """
+    lexical_tokens = list(lexical_tokens)
+    pair = _pair if symbols is None else _interning_pair(symbols)
+    return list(map(pair, lexical_tokens,
+                    map(CLASSIFIER.fullmatch, lexical_tokens)))
+
+
+def symbol_codes(symbols):
+    """
+    symbol type -> its code in symbols. Every type gets its code up
+    front, in TYPES order, so a fresh table always numbers them the same.
+    """
+    return {symbol_type: symbols.code(symbol_type)
+            for _, symbol_type in TYPE_PATTERNS}
+
+
+def _pair(lexical_token, match):
+    if match is not None:
+        return TokenSymbolPairing(lexical_token, match.lastgroup)
+
 
+def _interning_pair(symbols):
+    codes = symbol_codes(symbols)
+    intern = symbols.intern
 
-def parse_token(lexical_token):
-    for pairing in TYPES:
-        if pairing.reg.match(lexical_token):
-            return TokenSymbolPairing(lexical_token,
-                                      pairing.symbol_type)
+    def pair(lexical_token, match):
+        if match is not None:
+            return TokenSymbolPairing(intern(lexical_token),
+                                      codes[match.lastgroup])
+    return pair
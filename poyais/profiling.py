@@ -0,0 +1,108 @@
+from collections import namedtuple
+import functools
+import time
+
+from poyais.combinator import track_reach
+
+# per rule profiling. make_parser_table(spec, profiler=Profiler()) wraps
+# every rule the way packrat mode does, and every parser built for a rule
+# with Profiler.reader, the same way incremental parsing finds out how
+# far rules read. without a profiler none of this is in the table at all.
+
+# rules that are nothing but literals get collapsed into whoever uses
+# them (see compiled_or_parsers), so they only show up where they're
+# called by name at the top of a parse. their time is their callers'.
+
+RuleProfile = namedtuple('RuleProfile', (
+    'invocations', 'successes', 'failures', 'backtracked',
+    'inclusive', 'exclusive'))
+
+
+class Profiler:
+    """
+    Collects, for each rule: how often it ran, succeeded and failed, how
+    many characters it read before failing (backtracked), and the time
+    spent in it both with (inclusive) and without (exclusive) the rules
+    it called. Times are in seconds, from clock.
+    """
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        # rule -> [invocations, successes, failures, backtracked,
+        #          inclusive, exclusive]
+        self.rules = {}
+        # tuple of rules, outermost first -> exclusive time
+        self.stacks = {}
+        self.reach = 0
+        # frames of the rules running right now: [path, time in children]
+        self._frames = []
+        # rule -> how many times it's on the stack, so recursion isn't
+        # counted twice in inclusive time
+        self._active = {}
+
+    def clear(self):
+        # the wrapped parsers hold on to their rule's counts, so zero
+        # them where they are
+        for counts in self.rules.values():
+            counts[:] = [0, 0, 0, 0, 0.0, 0.0]
+        self.stacks.clear()
+        self.reach = 0
+
+    def reader(self, parser, lookahead):
+        return track_reach(self, parser, lookahead)
+
+    def wrap(self, rule, parser):
+        counts = self.rules.setdefault(rule, [0, 0, 0, 0, 0.0, 0.0])
+        frames = self._frames
+        active = self._active
+        stacks = self.stacks
+        clock = self.clock
+
+        @functools.wraps(parser)
+        def profiled(string, pos):
+            path = frames[-1][0] + (rule,) if frames else (rule,)
+            frame = [path, 0.0]
+            frames.append(frame)
+            active[rule] = active.get(rule, 0) + 1
+            outer_reach, self.reach = self.reach, pos
+            start = clock()
+            try:
+                out = parser(string, pos)
+            finally:
+                elapsed = clock() - start
+                frames.pop()
+                active[rule] -= 1
+            counts[0] += 1
+            if out is None:
+                counts[2] += 1
+                counts[3] += max(self.reach - pos, 0)
+            else:
+                counts[1] += 1
+            if not active[rule]:
+                counts[4] += elapsed
+            exclusive = elapsed - frame[1]
+            counts[5] += exclusive
+            stacks[path] = stacks.get(path, 0.0) + exclusive
+            if frames:
+                frames[-1][1] += elapsed
+            self.reach = max(outer_reach, self.reach)
+            return out
+        return profiled
+
+    def report(self):
+        """
+        rule -> RuleProfile for every rule that ran, the rules with the
+        most exclusive time first
+        """
+        return {rule: RuleProfile(*counts) for rule, counts in sorted(
+            self.rules.items(), key=lambda item: item[1][5], reverse=True)
+            if counts[0]}
+
+    def folded(self):
+        """
+        The time spent in each stack of rules, in the folded format
+        flamegraph.pl and speedscope read: one line per stack, rules
+        separated by semicolons, then the exclusive time in microseconds.
+        """
+        return ''.join(
+            '{} {}\n'.format(';'.join(path), round(seconds * 1e6))
+            for path, seconds in sorted(self.stacks.items()))
@@ -1,24 +1,114 @@
-from collections import namedtuple
-import operator
+from array import array
+from bisect import bisect_left
+from collections import namedtuple, OrderedDict
+import functools
+from hashlib import blake2b
 import re
+import time
 
 
-def memoize(fun):
-    cache = {}
+CacheInfo = namedtuple('CacheInfo',
+                       ('hits', 'misses', 'evictions', 'size', 'weight'))
 
+
+def memoize(fun=None, maxsize=None, policy='lru', ttl=None, key=None,
+            clock=time.monotonic):
+    """
+    Cache fun's results on its arguments. Works bare, as @memoize, or
+    configured, as @memoize(maxsize=...).
+
+    Unbounded unless given a maxsize. The policy decides what maxsize
+    counts: 'lru' counts entries, 'size' counts the length of the string
+    arguments each entry was called with. Either way the least recently
+    used entries go first. Entries older than ttl seconds are dropped
+    when next looked up. key replaces the arguments as the cache key,
+    see content_key.
+
+    The memoized function has cache_info() and cache_clear().
+    """
+    if fun is None:
+        return functools.partial(memoize, maxsize=maxsize, policy=policy,
+                                 ttl=ttl, key=key, clock=clock)
+    weigh = WEIGHERS[policy]
+    # key -> (result, weight, expiry). ordered by last use.
+    cache = OrderedDict()
+    hits = misses = evictions = weight = 0
+
+    @functools.wraps(fun)
     def memoized(*args, **kwargs):
-        hashable_params = (
-            args,
-            frozenset(kwargs.items()))
-        if hashable_params not in cache:
-            out = fun(*args, **kwargs)
-            cache[hashable_params] = out
-            return out
+        nonlocal hits, misses, evictions, weight
+        if key is not None:
+            hashable_params = key(*args, **kwargs)
+        elif kwargs:
+            hashable_params = (args, frozenset(kwargs.items()))
         else:
-            return cache[hashable_params]
+            hashable_params = args
+
+        entry = cache.get(hashable_params)
+        if entry is not None:
+            out, entry_weight, expiry = entry
+            if expiry is None or clock() < expiry:
+                hits += 1
+                if maxsize is not None:
+                    cache.move_to_end(hashable_params)
+                return out
+            del cache[hashable_params]
+            weight -= entry_weight
+            evictions += 1
+
+        misses += 1
+        out = fun(*args, **kwargs)
+        entry_weight = weigh(args, kwargs)
+        cache[hashable_params] = (
+            out, entry_weight, None if ttl is None else clock() + ttl)
+        weight += entry_weight
+        while maxsize is not None and weight > maxsize:
+            _, (_, evicted_weight, _) = cache.popitem(last=False)
+            weight -= evicted_weight
+            evictions += 1
+        return out
+
+    def cache_info():
+        return CacheInfo(hits, misses, evictions, len(cache), weight)
+
+    def cache_clear():
+        nonlocal hits, misses, evictions, weight
+        cache.clear()
+        hits = misses = evictions = weight = 0
+
+    memoized.cache_info = cache_info
+    memoized.cache_clear = cache_clear
     return memoized
 
 
+def _weigh_entry(args, kwargs):
+    return 1
+
+
+def _weigh_strings(args, kwargs):
+    return sum(len(arg) if isinstance(arg, (str, bytes)) else 1
+               for arg in args + tuple(kwargs.values()))
+
+
+WEIGHERS = {
+    'lru': _weigh_entry,
+    'size': _weigh_strings,
+}
+
+
+def content_key(*args, **kwargs):
+    """
+    memoize key that swaps string arguments for a digest of them, so the
+    cache doesn't keep whole sources alive just to compare against.
+    """
+    def digest(arg):
+        if isinstance(arg, str):
+            return blake2b(arg.encode('utf-8'), digest_size=16).digest()
+        return arg
+    return (tuple(digest(arg) for arg in args),
+            frozenset((name, digest(arg)) for name, arg in kwargs.items()))
+
+
 def node_from_iterable(it):
     got = reversed(it)
     here = None
@@ -27,19 +117,33 @@ def node_from_iterable(it):
     return here
 
 
-# idx would be useful for compile errors.
-# but since this is a PoC, leave it for now.
-LanguageToken = namedtuple('LanguageToken', ('tag', 'match'))
+# start and end are offsets into the parsed string, end exclusive.
+# they're optional so tokens can still be built by hand.
+LanguageToken = namedtuple('LanguageToken', ('tag', 'match', 'start', 'end'),
+                           defaults=(None, None))
 
 # mostly for empty matches
-UtilityToken = namedtuple('UtilityToken', ('tag', 'match'))
+UtilityToken = namedtuple('UtilityToken', ('tag', 'match', 'start', 'end'),
+                          defaults=(None, None))
 
 
 class LanguageNode:
+    __slots__ = ('value', 'link', 'length', 'start', 'end')
+
     def __init__(self, value, link=None):
         self.value = value
         assert link is None or isinstance(link, LanguageNode)
         self.link = link
+        # nodes are only ever built back to front, so the link already
+        # knows its span. working ours out here keeps len O(1) instead
+        # of walking the subtree every time a combinator advances.
+        value_len = 0 if value is None else len_of_token_or_node(value)
+        self.length = value_len + (0 if link is None else link.length)
+        start = getattr(value, 'start', None)
+        if start is None and link is not None and link.start is not None:
+            start = link.start - value_len
+        self.start = start
+        self.end = None if start is None else start + self.length
 
     def __iter__(self):
         here = self
@@ -48,11 +152,15 @@ class LanguageNode:
             here = here.link
 
     def __str__(self):
-        return "".join(str(token.match) for token in iter_traverse(self))
+        return node_str(self)
 
     def __len__(self):
-        got = iter_traverse(self)
-        return sum(len(token.match) for token in got)
+        return self.length
+
+    def __reduce__(self):
+        # pickle the chain as a tuple of its values, pickling it link by
+        # link recurses once per element and long programs blow the stack.
+        return node_from_iterable, (tuple(self),)
 
     def __repr__(self):
         return "LanguageNode({}{})".format(
@@ -60,6 +168,110 @@ class LanguageNode:
             self.value, ', ...' if self.link is not None else '')
 
 
+class SymbolTable:
+    """
+    Interning for one parse session. Every string interned through the
+    same table comes back as the same object, so a symbol repeated a
+    million times is stored once and compares with is. Tags get small
+    integer codes in the order they're first seen, and tag() turns a
+    code back into its name for display.
+
+    Unlike sys.intern, it all goes when the table does.
+    """
+    __slots__ = ('strings', 'codes', 'tags')
+
+    def __init__(self, tags=()):
+        self.strings = {}
+        self.codes = {}
+        self.tags = []
+        for tag in tags:
+            self.code(tag)
+
+    def intern(self, string):
+        return self.strings.setdefault(string, string)
+
+    def code(self, tag):
+        code = self.codes.get(tag)
+        if code is None:
+            code = self.codes[tag] = len(self.tags)
+            self.tags.append(tag)
+        return code
+
+    def tag(self, code):
+        return self.tags[code]
+
+    def __len__(self):
+        return len(self.strings)
+
+    def __contains__(self, string):
+        return string in self.strings
+
+
+def shift_positions(language_obj, delta):
+    """
+    Copy of a parse result with every offset moved along by delta. Parse
+    results are shared, so this never touches the original.
+    """
+    if isinstance(language_obj, LanguageNode):
+        return node_from_iterable(
+            tuple(shift_positions(value, delta) for value in language_obj))
+    elif (isinstance(language_obj, (LanguageToken, UtilityToken)) and
+            language_obj.start is not None):
+        return language_obj._replace(start=language_obj.start + delta,
+                                     end=language_obj.end + delta)
+    return language_obj
+
+
+class ShiftedNode(LanguageNode):
+    """
+    A LanguageNode seen delta characters further along. Nothing is
+    copied: what's under it is shifted as it's looked at.
+    """
+    __slots__ = ('node', 'delta')
+
+    def __init__(self, node, delta):
+        self.node = node
+        self.delta = delta
+
+    @property
+    def value(self):
+        return shifted(self.node.value, self.delta)
+
+    @property
+    def link(self):
+        return shifted(self.node.link, self.delta)
+
+    @property
+    def length(self):
+        return self.node.length
+
+    @property
+    def start(self):
+        start = self.node.start
+        return None if start is None else start + self.delta
+
+    @property
+    def end(self):
+        end = self.node.end
+        return None if end is None else end + self.delta
+
+
+def shifted(language_obj, delta):
+    """
+    shift_positions, but a node comes back as a ShiftedNode instead of a
+    copy, so it costs the same however big the node is.
+    """
+    if not delta:
+        return language_obj
+    if isinstance(language_obj, ShiftedNode):
+        delta += language_obj.delta
+        language_obj = language_obj.node
+        return ShiftedNode(language_obj, delta) if delta else language_obj
+    if isinstance(language_obj, LanguageNode):
+        return ShiftedNode(language_obj, delta)
+    return shift_positions(language_obj, delta)
+
+
 def len_of_token_or_node(language_obj):
     if isinstance(language_obj, (LanguageToken, UtilityToken)):
         return len(language_obj.match)
@@ -73,60 +285,156 @@ def traverse(language_node):
     return iter_traverse(language_node)
 
 
+def iter_tokens(language_obj):
+    """
+    The language tokens under a node (or a lone token), depth first,
+    yielded as they're found. Keeps its own stack of the links still to
+    visit instead of recursing, so however deep or long the tree, there's
+    no recursion limit to hit and nothing gets copied.
+    """
+    links = [language_obj]
+    while links:
+        here = links.pop()
+        while isinstance(here, LanguageNode):
+            if here.link is not None:
+                links.append(here.link)
+            here = here.value
+        if isinstance(here, LanguageToken):
+            yield here
+
+
 def recursive_traverse(language_node):
     """
     Depth first traversal of the language node, returning a mutable
-    list of only language tokens.
+    list of only language tokens. It used to recurse once per link,
+    it's iter_tokens now like everything else.
     """
     if language_node is None:
         return []
-    if isinstance(language_node.value, LanguageNode):
-        here = traverse(language_node.value)
-    elif isinstance(language_node.value, LanguageToken):
-        here = [language_node.value]
-
-    return here + traverse(language_node.link)
+    return list(iter_tokens(language_node))
 
 
 def iter_traverse(language_node):
+    "iter_tokens, as a list"
+    return list(iter_tokens(language_node))
+
+
+def node_str(language_obj):
+    "The text a node matched, in one walk over it"
+    return "".join([token.match for token in iter_tokens(language_obj)])
+
+
+def node_len(language_obj):
+    "The length of the text a node matched, in one walk over it"
+    return sum(len(token.match) for token in iter_tokens(language_obj))
+
+
+def strongly_connected(graph):
     """
-    Half way point between an iterative and a recursive solution
+    The strongly connected components of graph (node -> the nodes it
+    points at), by Tarjan's algorithm. Every component comes after all
+    the components it points into, so working through them in order
+    sees a node's successors before the node, cycles aside. Keeps its
+    own stack, so long chains don't hit the recursion limit.
     """
+    index = {}
+    low = {}
+    stack = []
+    on_stack = set()
     out = []
-    for element in language_node:
-        if isinstance(element, LanguageNode):
-            out.extend(iter_traverse(element))
-        elif isinstance(element, LanguageToken):
-            out.append(element)
+    for root in graph:
+        if root in index:
+            continue
+        # (node, iterator over what it points at)
+        work = [(root, iter(graph[root]))]
+        index[root] = low[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        while work:
+            node, successors = work[-1]
+            for successor in successors:
+                if successor not in index:
+                    index[successor] = low[successor] = len(index)
+                    stack.append(successor)
+                    on_stack.add(successor)
+                    work.append((successor, iter(graph[successor])))
+                    break
+                elif successor in on_stack:
+                    low[node] = min(low[node], index[successor])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+                if low[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    out.append(component)
     return out
 
 
-def node_str(language_node):
-    return "".join(str(token.match) for token in traverse(language_node))
-
+def what_is_linum_of_idx(program_string, absolute_idx):
+    line, column = line_index(program_string).line_col(absolute_idx)
+    # relative_idx has always counted from the newline ending the previous
+    # line, so past the first line it's one more than the column.
+    return Linum(line, column if line == 1 else column + 1)
 
-def node_len(language_node):
-    return operator.add(len(token.match) for token in traverse(language_node))
 
+# a handful is plenty for runs of lookups into the same few sources,
+# without holding on to every source ever seen.
+@memoize(maxsize=8)
+def line_index(program_string):
+    return LineIndex(program_string)
 
-def what_is_linum_of_idx(program_string, absolute_idx):
-    line_map = build_idx_line_map(program_string)
-    if not line_map:
-        return Linum(1, absolute_idx)
-    line_num = _search(line_map, absolute_idx)
-    if line_num == 0:
-        chars_consumed = 0
-    else:
-        chars_consumed = line_map[line_num - 1]
 
-    return Linum(1 + line_num, absolute_idx - chars_consumed)
+class LineIndex:
+    """
+    Where every line of a source starts, for turning offsets into 1 based
+    lines and 0 based columns. Build it once per source: single lookups
+    bisect, and resolve() does a whole sorted batch in one sweep.
+    """
+    __slots__ = ('source', 'newlines')
+
+    def __init__(self, source):
+        self.source = source
+        self.newlines = array('q', build_idx_line_map(source))
+
+    def line_col(self, offset):
+        line = bisect_left(self.newlines, offset)
+        return line + 1, offset - self._line_start(line)
+
+    def resolve(self, offsets):
+        """
+        line_col of each offset. Sorted offsets are resolved by walking
+        forward through the lines once, anything out of order is bisected.
+        """
+        newlines = self.newlines
+        count = len(newlines)
+        line, previous = 0, 0
+        out = []
+        for offset in offsets:
+            if offset < previous:
+                line = bisect_left(newlines, offset)
+            else:
+                while line < count and newlines[line] < offset:
+                    line += 1
+            previous = offset
+            out.append((line + 1, offset - self._line_start(line)))
+        return out
+
+    def _line_start(self, line):
+        return self.newlines[line - 1] + 1 if line else 0
 
 
 # mapping is implicit, the index of the match is the line number it is on.
-@memoize
 def build_idx_line_map(program_string):
     newline_reg = re.compile("\n")
-    return sorted(x.start() for x in newline_reg.finditer(program_string))
+    return [x.start() for x in newline_reg.finditer(program_string)]
 
 
 Linum = namedtuple('Linum', ('line', 'relative_idx'))
@@ -137,11 +445,4 @@ def _search(listing, absolute_idx):
     Assuming the idx is in the string that generated the listing, find
     the line that it was on.
     """
-    if not listing:
-        return 0
-    if len(listing) == 1:
-        return 0 if absolute_idx <= listing[0] else 1
-
-    for idx, line_break_idx in enumerate(listing):
-        if line_break_idx >= absolute_idx:
-            return idx
+    return bisect_left(listing, absolute_idx)
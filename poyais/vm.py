@@ -0,0 +1,389 @@
+import re
+
+from poyais.cache import cached_ebnf_lexer
+from poyais.combinator import dispatch, GROUP_COMPANIONS, First
+from poyais.utility import (
+    LanguageToken, UtilityToken, node_from_iterable, strongly_connected)
+
+# a parsing machine, after LPeg: the grammar compiles to one flat list of
+# instructions and a single loop runs them, keeping its own stacks for
+# backtracking and rule calls. no closures calling closures, and no
+# python recursion, so nesting is only limited by max_depth. it isn't
+# any faster than the closures, though: most of a parse is building the
+# tokens and nodes, which costs both the same, and a trip round the loop
+# costs about what the calls it saves did.
+
+# every expression's code pushes exactly one value when it matches: the
+# same token, node or empty token the closure parser would have returned.
+# when it doesn't, the machine backtracks to the most recent choice.
+
+# instructions are (opcode, argument) pairs.
+(END, STRING, SET, LITERALS, SPAN, EMPTY, MARK, NODE, CHOICE, COMMIT,
+ CALL, RETURN, TEST) = range(13)
+
+OPCODES = ('end', 'string', 'set', 'literals', 'span', 'empty', 'mark',
+           'node', 'choice', 'commit', 'call', 'return', 'test')
+
+# expressions, built by poyais.combinator.dispatch from the lexed rules:
+#   ('terminal', string), ('and', exprs), ('or', exprs),
+#   ('many', expr), ('optional', expr), ('call', rule)
+VM_COMBINATORS = {
+    '|': lambda *exprs: ('or', exprs),
+    ',': lambda *exprs: ('and', exprs),
+}
+
+VM_GROUPS = {
+    '}': lambda expr: ('many', expr),
+    ']': lambda expr: ('optional', expr),
+    ')': lambda expr: expr,
+}
+
+
+def _terminal(rule, terminal):
+    return ('terminal', terminal)
+
+
+def _call(rules, identifier):
+    return ('call', identifier)
+
+
+def rule_expressions(lexed_rules):
+    "rule -> expression, for each of the lexed rules"
+    out = {}
+    for lexed_rule in lexed_rules:
+        out[lexed_rule.identifier] = dispatch(
+            out, lexed_rule, iter(lexed_rule.tokens), {},
+            VM_COMBINATORS, VM_GROUPS, GROUP_COMPANIONS,
+            make_terminal=_terminal, make_identifier=_call)
+    return out
+
+
+def compile_program(ebnf_string, cache_dir=None, max_depth=100000):
+    "Compile ebnf_string into a Program, see make_parser_table"
+    lexed_rules = cached_ebnf_lexer(ebnf_string, cache_dir)
+    return Program(rule_expressions(lexed_rules), max_depth)
+
+
+def vm_parser_table(ebnf_string, cache_dir=None):
+    """
+    rule -> parser, every parser running on one Program. Parses to the
+    same trees as make_parser_table in about the same time, and takes
+    inputs nested deeper than python's recursion limit allows.
+    """
+    program = compile_program(ebnf_string, cache_dir)
+    return {rule: program.parser(rule) for rule in program.labels}
+
+
+def calls_of(expr):
+    "The rules expr calls, anywhere in it"
+    if expr[0] == 'call':
+        return {expr[1]}
+    elif expr[0] == 'terminal':
+        return set()
+    elif expr[0] in ('many', 'optional'):
+        return calls_of(expr[1])
+    return set().union(*map(calls_of, expr[1]))
+
+
+class Analysis:
+    """
+    The literals and FIRST set of every rule, worked
+    out once for the whole grammar so the backends can look them up
+    instead of following calls every time they ask.
+
+    Rules are taken a strongly connected group at a time, callees first.
+    A rule calling back into its own group can't be all literals, and
+    the FIRST sets of a group are iterated until they stop growing.
+    """
+    def __init__(self, rules):
+        self.rules = rules
+        self.rule_literals = {}
+        self.rule_firsts = {}
+        graph = {rule: [called for called in calls_of(expr)
+                        if called in rules]
+                 for rule, expr in rules.items()}
+        for group in strongly_connected(graph):
+            if len(group) == 1 and group[0] not in graph[group[0]]:
+                rule = group[0]
+                self.rule_literals[rule] = self.literals(rules[rule])
+                self.rule_firsts[rule] = self.first(rules[rule])
+                continue
+            for rule in group:
+                self.rule_literals[rule] = None
+                self.rule_firsts[rule] = First(frozenset(), False)
+            changed = True
+            while changed:
+                changed = False
+                for rule in group:
+                    got = self.first(rules[rule])
+                    if got != self.rule_firsts[rule]:
+                        self.rule_firsts[rule] = got
+                        changed = True
+
+    def literals(self, expr):
+        "The literals expr matches if that's all it is, else None"
+        kind = expr[0]
+        if kind == 'terminal':
+            return (expr[1],)
+        elif kind == 'or':
+            out = ()
+            for alternative in expr[1]:
+                got = self.literals(alternative)
+                if got is None:
+                    return None
+                out += got
+            return out
+        elif kind == 'call':
+            return self.rule_literals.get(expr[1])
+        return None
+
+    def first(self, expr):
+        "expr's FIRST set, None if it calls a rule that isn't there"
+        kind = expr[0]
+        if kind == 'terminal':
+            return First(frozenset(expr[1][:1]), expr[1] == '')
+        elif kind == 'call':
+            return self.rule_firsts.get(expr[1])
+        elif kind in ('many', 'optional'):
+            got = self.first(expr[1])
+            return None if got is None else First(got.chars, True)
+        firsts = []
+        for sub_expr in expr[1]:
+            got = self.first(sub_expr)
+            if got is None:
+                return None
+            firsts.append(got)
+            if kind == 'and' and not got.nullable:
+                break
+        return First(frozenset().union(*(f.chars for f in firsts)),
+                     all(f.nullable for f in firsts) if kind == 'and'
+                     else any(f.nullable for f in firsts))
+
+
+class Program:
+    """
+    The instructions for a set of rule expressions, and the machine that
+    runs them. labels maps each rule to where its code starts.
+    """
+    def __init__(self, rules, max_depth=100000):
+        self.rules = rules
+        self.analysis = Analysis(rules)
+        self.max_depth = max_depth
+        # returning from the outermost rule lands on END at 0
+        self.code = [(END, None)]
+        self.labels = {}
+        calls = []
+        for rule, expr in rules.items():
+            self.labels[rule] = len(self.code)
+            self._emit(expr, calls)
+            self.code.append((RETURN, None))
+        for idx in calls:
+            rule = self.code[idx][1]
+            if rule not in self.labels:
+                raise KeyError("Undefined rule: {}".format(rule))
+            self.code[idx] = (CALL, self.labels[rule])
+        # what run reads: the opcodes and arguments apart, so a step
+        # doesn't unpack a pair
+        self.ops = tuple(op for op, _ in self.code)
+        self.args = tuple(arg for _, arg in self.code)
+
+    def parser(self, rule):
+        label = self.labels[rule]
+
+        def parser(string, pos):
+            return self.run(label, string, pos)
+        return parser
+
+    def parse(self, rule, string, pos=0):
+        return self.run(self.labels[rule], string, pos)
+
+    def dump(self):
+        "The instructions, one per line, for reading"
+        names = {label: rule for rule, label in self.labels.items()}
+        return ''.join(
+            '{}{:>5}  {} {}\n'.format(
+                '{}:\n'.format(names[idx]) if idx in names else '',
+                idx, OPCODES[op], '' if arg is None else arg)
+            for idx, (op, arg) in enumerate(self.code))
+
+    def _test(self, expr):
+        """
+        Emits a TEST skipping expr when the next character can't start
+        it, if that's known. Returns its index to patch the target into.
+        """
+        first = self.analysis.first(expr)
+        if first is None or first.nullable:
+            return None
+        self.code.append((TEST, first.chars))
+        return len(self.code) - 1
+
+    def _patch_test(self, test, target):
+        if test is not None:
+            self.code[test] = (TEST, (self.code[test][1], target))
+
+    def _emit(self, expr, calls):
+        code = self.code
+        kind = expr[0]
+        literals = self.analysis.literals(expr)
+        if literals is not None and kind != 'terminal':
+            # a rule or alternation of nothing but literals matches the
+            # same token as whichever literal comes first, same as the
+            # collapsed matchers in poyais.combinator.
+            if all(len(literal) == 1 for literal in literals):
+                code.append((SET, frozenset(literals)))
+            else:
+                code.append((LITERALS, re.compile(
+                    '|'.join(re.escape(literal) for literal in literals))))
+        elif kind == 'terminal':
+            code.append((STRING, expr[1]))
+        elif kind == 'call':
+            calls.append(len(code))
+            code.append((CALL, expr[1]))
+        elif kind == 'and':
+            code.append((MARK, None))
+            for sub_expr in expr[1]:
+                self._emit(sub_expr, calls)
+            code.append((NODE, None))
+        elif kind == 'or':
+            commits = []
+            for alternative in expr[1][:-1]:
+                test = self._test(alternative)
+                choice = len(code)
+                code.append(None)
+                self._emit(alternative, calls)
+                commits.append(len(code))
+                code.append(None)
+                code[choice] = (CHOICE, len(code))
+                self._patch_test(test, len(code))
+            self._emit(expr[1][-1], calls)
+            for commit in commits:
+                code[commit] = (COMMIT, len(code))
+        elif kind == 'optional':
+            test = self._test(expr[1])
+            choice = len(code)
+            code.append(None)
+            self._emit(expr[1], calls)
+            code.append((COMMIT, len(code) + 2))
+            code[choice] = (CHOICE, len(code))
+            self._patch_test(test, len(code))
+            code.append((EMPTY, None))
+        elif kind == 'many':
+            inner = self.analysis.literals(expr[1])
+            if inner and all(len(literal) == 1 for literal in inner):
+                code.append((SPAN, re.compile('[{}]+'.format(
+                    ''.join(re.escape(char) for char in inner)))))
+                return
+            # collect matches until one fails, then make a node of them,
+            # or an empty token if there weren't any.
+            code.append((MARK, None))
+            loop = len(code)
+            test = self._test(expr[1])
+            choice = len(code)
+            code.append(None)
+            self._emit(expr[1], calls)
+            code.append((COMMIT, loop))
+            code[choice] = (CHOICE, len(code))
+            self._patch_test(test, len(code))
+            code.append((NODE, None))
+        else:
+            raise AssertionError('Unknown expression: {}'.format(expr))
+
+    def run(self, label, string, pos):
+        """
+        Run the code at label over string from pos. Returns what the rule
+        matched, or None.
+        """
+        ops, args = self.ops, self.args
+        max_depth = self.max_depth
+        values = []
+        # where each unfinished node's values start
+        marks = []
+        calls = [0]
+        # (where to go, pos, and how big the other stacks were)
+        backtrack = []
+        pc = label
+        # the opcodes are tested in order of how often a parse of lisp
+        # runs them
+        while True:
+            op = ops[pc]
+            pc += 1
+            if op == MARK:
+                marks.append(len(values))
+                continue
+            elif op == NODE:
+                start = marks.pop()
+                if len(values) > start:
+                    node = node_from_iterable(values[start:])
+                    del values[start:]
+                    values.append(node)
+                else:
+                    values.append(UtilityToken('empty', '', pos, pos))
+                continue
+            elif op == SET:
+                char = string[pos:pos + 1]
+                if char in args[pc - 1]:
+                    values.append(
+                        LanguageToken('terminal', char, pos, pos + 1))
+                    pos += 1
+                    continue
+            elif op == TEST:
+                # only a guess at whether what follows can match, so
+                # failing it isn't failing: skip ahead instead.
+                chars, target = args[pc - 1]
+                if string[pos:pos + 1] not in chars:
+                    pc = target
+                continue
+            elif op == SPAN:
+                match = args[pc - 1].match(string, pos)
+                if match is None:
+                    values.append(UtilityToken('empty', '', pos, pos))
+                else:
+                    values.append(node_from_iterable(tuple(
+                        LanguageToken('terminal', char, idx, idx + 1)
+                        for idx, char in enumerate(match.group(), pos))))
+                    pos = match.end()
+                continue
+            elif op == RETURN:
+                pc = calls.pop()
+                continue
+            elif op == CALL:
+                if len(calls) > max_depth:
+                    raise RecursionError(
+                        "Rules nested deeper than {}".format(max_depth))
+                calls.append(pc)
+                pc = args[pc - 1]
+                continue
+            elif op == CHOICE:
+                backtrack.append(
+                    (args[pc - 1], pos, len(values), len(marks), len(calls)))
+                continue
+            elif op == COMMIT:
+                backtrack.pop()
+                pc = args[pc - 1]
+                continue
+            elif op == STRING:
+                arg = args[pc - 1]
+                if string.startswith(arg, pos):
+                    end = pos + len(arg)
+                    values.append(LanguageToken('terminal', arg, pos, end))
+                    pos = end
+                    continue
+            elif op == LITERALS:
+                match = args[pc - 1].match(string, pos)
+                if match is not None:
+                    values.append(LanguageToken(
+                        'terminal', match.group(), pos, match.end()))
+                    pos = match.end()
+                    continue
+            elif op == EMPTY:
+                values.append(UtilityToken('empty', '', pos, pos))
+                continue
+            elif op == END:
+                return values.pop()
+            # didn't match, go back to the last choice
+            if not backtrack:
+                return None
+            pc, pos, value_count, mark_count, call_count = backtrack.pop()
+            del values[value_count:]
+            del marks[mark_count:]
+            del calls[call_count:]
@@ -12,12 +12,16 @@ setup(
         'Development Status :: 1 - Super-Alpha',
         'License :: OSI Approved :: MIT License',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.3',
-        'Programming Language :: Python :: 3.4',
-        'Programming Language :: Python :: 3.5',
+        'Programming Language :: Python :: 3.7',
+        'Programming Language :: Python :: 3.8',
+        'Programming Language :: Python :: 3.9',
+        'Programming Language :: Python :: 3.10',
+        'Programming Language :: Python :: 3.11',
+        'Programming Language :: Python :: 3.12',
         ],
     keywords='',
     packages=['poyais'],
+    python_requires='>=3.7',
     extras_require={
         'test': ['pytest', 'hypothesis'],
     },
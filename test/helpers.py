@@ -0,0 +1,74 @@
+"Specs and helpers the tests of the different parser backends share"
+from poyais.utility import LanguageNode
+
+
+BACKTRACKING_SPEC = """
+    quote = "@" ;
+    word = "w", "o", "r", "d" ;
+    quoted = ( quote, "(", ")" ) | ( quote, word ) ;
+"""
+
+
+SYMBOL_SPEC = """
+    letter = "a" | "b" | "c" | "D" | "E" ;
+    digit = "0" | "1" | "2" ;
+    math symbol = "+" | "-" ;
+    character = letter | digit | math symbol ;
+    symbol = ( letter | math symbol ) , { character } ;
+    keyword = "if" | "i" | "in" ;
+"""
+
+
+FIRST_SPEC = """
+    word = "w", "o", "r", "d" ;
+    space = { " " } ;
+    spaced = space, word ;
+    list = "(", space, { word, space }, ")" ;
+    item = word | list | spaced ;
+    maybe = [ "x" ] ;
+"""
+
+
+FACTOR_SPEC = """
+both = ( "x", "y", "z" ) | ( "x", "y" ) | ( "x", "w", "v" ) | "q"
+     | ( "x", "q" ) ;
+"""
+
+
+# the specs and programs test_combinator puts the closure parsers through
+CASES = (
+    ('groupd = ( "this", " and ", "that") | "neither" ;',
+     'groupd', ("this and that", "neither", "this and", "")),
+    ('whitespace = "\n" | "\t" | " " ;', 'whitespace', (" ", "\t\n", "x")),
+    ('bike = ["bicycle"] ;', 'bike', ("bicycle", "")),
+    ('here = ["optionally: "], "here" ;', 'here',
+     ("optionally: here", "here", "optionally: ")),
+    ('simple = "w", "o", "r", "d"; complex = simple;', 'complex',
+     ("word", "wordextra", "wor")),
+    ('simple = "h", "e", "l", "l", "o"; moderate = "e", "l", "m", "o";'
+     "complex = simple, ' ', moderate;", 'complex', ("hello elmo",)),
+    ('short = "h", "i"; obnoxious = { short };', 'obnoxious',
+     ("", "hi", "hihi", "hih")),
+    ('word = "w", "o", "r", "d"; words = word, " ", word;', 'words',
+     ("word word", "word wor")),
+    ("this = 't' | 'h' | 'i' | 's';", 'this', ("t", "h", "i", "s", "w")),
+    (BACKTRACKING_SPEC, 'quoted', ("@()", "@word", "@nope")),
+    (SYMBOL_SPEC, 'symbol', ("aD+0", "-", "0a", "")),
+    (SYMBOL_SPEC, 'keyword', ("in", "if", "x")),
+    (FIRST_SPEC, 'item', ("word", "(word word )", "  word", "( )", "x")),
+    (FIRST_SPEC, 'maybe', ("x", "")),
+)
+
+
+def with_positions(got):
+    if isinstance(got, LanguageNode):
+        return (got.start, got.end, tuple(with_positions(v) for v in got))
+    return got
+
+
+def call_chain_spec(depth):
+    "Every rule calls the one before it twice, once per alternative"
+    rules = ['r0 = "x" ;']
+    rules.extend('r{0} = ( r{1}, "x" ) | ( r{1}, "y" ) ;'.format(
+        idx, idx - 1) for idx in range(1, depth))
+    return '\n'.join(rules)
@@ -0,0 +1,92 @@
+from hypothesis import given
+from hypothesis.strategies import text
+import pytest
+
+from benchmarks.inputs import scheme_source
+from poyais.arena import (
+    arena_parser_table, ArenaNode, TreeArena, ARENA, NODE, TOKEN, EMPTY)
+from poyais.combinator import make_parser_table
+from poyais.ebnf import ebnf_lexer
+from poyais.ir import grammar_ir, optimize, lower
+from poyais.lisp import EBNF_SPEC
+from poyais.utility import LanguageToken, UtilityToken, node_str
+
+from helpers import SYMBOL_SPEC, FACTOR_SPEC, CASES, with_positions
+
+
+def materialized(got):
+    if isinstance(got, ArenaNode):
+        return got.language_node()
+    return got
+
+
+@pytest.mark.parametrize('spec, rule, programs', CASES + (
+    (FACTOR_SPEC, 'both', ("xyz", "xy", "xwv", "xw", "q", "xq", "x", "")),
+))
+def test_arena_same_trees(spec, rule, programs):
+    closures = make_parser_table(spec)[rule]
+    arena = arena_parser_table(spec)[rule]
+    for program in programs:
+        for pos in range(len(program) + 1):
+            assert (with_positions(materialized(arena(program, pos))) ==
+                    with_positions(closures(program, pos)))
+
+
+@given(text(alphabet='abcDE012+-xyz'))
+def test_arena_same_symbols(program):
+    closures = make_parser_table(SYMBOL_SPEC)['symbol']
+    arena = arena_parser_table(SYMBOL_SPEC)['symbol']
+    assert with_positions(materialized(arena(program, 0))) == with_positions(
+        closures(program, 0))
+
+
+def test_arena_same_program():
+    source = scheme_source(2048)
+    closures = make_parser_table(EBNF_SPEC)['program'](source, 0)
+    got = arena_parser_table(EBNF_SPEC)['program'](source, 0)
+    assert with_positions(got.language_node()) == with_positions(closures)
+    assert str(got) == node_str(closures) == source
+    assert len(got) == len(closures)
+
+
+def test_arena_node_interface():
+    got = arena_parser_table('list = "(", { "x" }, ")" ;')['list']('(xx)')
+    assert (got.start, got.end, len(got), str(got)) == (0, 4, 4, '(xx)')
+    assert got.value == LanguageToken('terminal', '(', 0, 1)
+    inner = got.link.value
+    assert isinstance(inner, ArenaNode)
+    assert [token.match for token in inner] == ['x', 'x']
+    assert (inner.start, inner.end) == (1, 3)
+    assert got.link.link.value == LanguageToken('terminal', ')', 3, 4)
+    assert got.link.link.link is None
+    assert repr(got) == "ArenaNode({}, ...)".format(got.value)
+
+
+def test_failed_matches_take_no_rows():
+    rules = optimize(grammar_ir(ebnf_lexer(
+        'either = ( "a", "b", "c" ) | ( "a", "b", "d" ) | [ "e" ] ;')))
+    parser = lower(rules, ARENA)['either']
+    arena = TreeArena('abd')
+    row = parser(arena, 'abd', 0)
+    # the three tokens and their node
+    assert len(arena) == 4
+    assert arena.kind(row) == 'node'
+    assert [arena.kinds[child] for child in range(3)] == [TOKEN] * 3
+    assert list(arena.parents[:3]) == [row] * 3
+
+    arena = TreeArena('x')
+    assert arena.value(parser(arena, 'x', 0)) == UtilityToken(
+        'empty', '', 0, 0)
+    assert list(arena.kinds) == [EMPTY]
+
+
+def test_arena_rows():
+    arena = TreeArena('ab')
+    first, second = arena.add(TOKEN, 0, 1), arena.add(TOKEN, 1, 2)
+    node = arena.node([first, second])
+    assert arena.kinds[node] == NODE
+    assert arena.first_children[node] == first
+    assert arena.next_siblings[first] == second
+    assert (arena.starts[node], arena.ends[node]) == (0, 2)
+    arena.truncate(1)
+    assert len(arena) == 1 and len(arena.ends) == 1
@@ -0,0 +1,87 @@
+import pickle
+
+from poyais.batch import parse_files, FileResult
+from poyais.lisp import lisp_parser_table
+from poyais.utility import node_str, iter_traverse
+
+PROGRAMS = (
+    "(define x)\n(car x)",
+    "'(a b c)",
+    "`(lambda x y)\n\n(foo)",
+    "(unclosed",
+    "",
+)
+
+
+def write_programs(tmp_path, programs=PROGRAMS):
+    paths = []
+    for idx, program in enumerate(programs):
+        path = tmp_path / "program{}.scm".format(idx)
+        path.write_text(program, encoding='utf-8')
+        paths.append(str(path))
+    return paths
+
+
+def tokens(tree):
+    return [] if tree is None else iter_traverse(tree)
+
+
+def test_parse_files_in_order(tmp_path):
+    paths = write_programs(tmp_path)
+    got = list(parse_files(paths, jobs=2, chunksize=2))
+    assert [result.path for result in got] == paths
+    program = lisp_parser_table()['program']
+    for result, source in zip(got, PROGRAMS):
+        assert tokens(result.tree) == tokens(program(source, 0))
+    assert [result.error is None for result in got] == [
+        True, True, True, False, True]
+    assert "line 1, index 0" in str(got[3].error)
+
+
+def test_parse_files_unordered(tmp_path):
+    paths = write_programs(tmp_path, PROGRAMS * 5)
+    ordered = list(parse_files(paths, jobs=1))
+    unordered = list(parse_files(paths, jobs=3, ordered=False))
+    assert (sorted((r.path, node_str(r.tree) if r.tree else None)
+                   for r in unordered) ==
+            sorted((r.path, node_str(r.tree) if r.tree else None)
+                   for r in ordered))
+
+
+def test_parse_files_transform(tmp_path):
+    paths = write_programs(tmp_path)
+    got = list(parse_files(paths, jobs=2, transform=node_str))
+    assert [result.tree for result in got] == [
+        PROGRAMS[0], PROGRAMS[1], PROGRAMS[2], '', '']
+
+
+def test_parse_files_errors_are_results(tmp_path):
+    missing = str(tmp_path / "missing.scm")
+    paths = write_programs(tmp_path)[:1] + [missing]
+    got = list(parse_files(paths, jobs=2))
+    assert got[0].error is None
+    assert got[1] == FileResult(missing, None, got[1].error)
+    assert isinstance(got[1].error, FileNotFoundError)
+
+
+def test_parse_files_interleaved(tmp_path):
+    paths = write_programs(tmp_path)
+    trees = parse_files(paths, jobs=1)
+    first = next(trees)
+    # starting another one in this process changes nothing for the first
+    forms = parse_files(paths, jobs=1, rule='form', transform=node_str)
+    assert next(forms).tree == "(define x)"
+    got = [first] + list(trees)
+    expected = list(parse_files(paths, jobs=1))
+    assert [tokens(result.tree) for result in got] == [
+        tokens(result.tree) for result in expected]
+    assert [str(result.error) for result in got] == [
+        str(result.error) for result in expected]
+
+
+def test_long_trees_pickle():
+    source = "(a b) " * 3000
+    tree = lisp_parser_table()['program'](source, 0)
+    again = pickle.loads(pickle.dumps(tree))
+    assert iter_traverse(again) == iter_traverse(tree)
+    assert (again.start, again.end) == (0, len(source))
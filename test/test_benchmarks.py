@@ -0,0 +1,60 @@
+import pytest
+
+from benchmarks.inputs import (
+    scheme_source, grammar_source, readme_grammar, parse_size)
+from benchmarks.run import compare, scaling_exponent, Result, README
+from poyais.combinator import make_parser_table
+from poyais.ebnf import ebnf_lexer
+from poyais.lisp import EBNF_SPEC
+
+
+def test_inputs_are_reproducible():
+    assert scheme_source(1024) == scheme_source(1024)
+    assert grammar_source(1024) == grammar_source(1024)
+    assert scheme_source(1024) != scheme_source(1024, seed=1)
+    assert len(scheme_source(1024)) >= 1024
+
+
+@pytest.mark.parametrize('grammar, separator', (
+    (EBNF_SPEC, '\n'),
+    (readme_grammar(README), ' '),
+))
+def test_scheme_source_parses(grammar, separator):
+    source = scheme_source(1024, separator=separator)
+    got = make_parser_table(grammar)['program'](source, 0)
+    assert got is not None and got.end == len(source)
+
+
+def test_grammar_source_compiles():
+    grammar = grammar_source(1024)
+    assert make_parser_table(grammar).keys() == {
+        rule.identifier for rule in ebnf_lexer(grammar)}
+
+
+def test_parse_size():
+    assert parse_size('1KB') == 1024
+    assert parse_size('100MB') == 100 * 1024 ** 2
+    assert parse_size('300') == 300
+    with pytest.raises(ValueError):
+        parse_size('lots')
+
+
+def test_scaling_exponent():
+    linear = [Result('w', None, n, n * 1e-6, None, None)
+              for n in (1024, 4096, 16384)]
+    quadratic = [Result('w', None, n, n * n * 1e-9, None, None)
+                 for n in (1024, 4096, 16384)]
+    assert scaling_exponent(linear) == pytest.approx(1)
+    assert scaling_exponent(quadratic) == pytest.approx(2)
+    assert scaling_exponent(linear[:1]) is None
+
+
+def test_compare():
+    def results(seconds, peak):
+        return {'results': [{'workload': 'lex', 'size': '1KB',
+                             'seconds': seconds, 'peak_memory': peak}]}
+    assert compare(results(1.0, 100), results(1.05, 100), 0.1) == []
+    assert len(compare(results(1.0, 100), results(1.2, 100), 0.1)) == 1
+    assert len(compare(results(1.0, 100), results(1.0, 200), 0.1)) == 1
+    # nothing to compare against
+    assert compare({'results': []}, results(9.0, 900), 0.1) == []
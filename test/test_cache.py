@@ -0,0 +1,80 @@
+from poyais.cache import (
+    cached_ebnf_lexer, grammar_key, dump_rules, load_rules)
+from poyais.combinator import make_parser_table
+from poyais.ebnf import ebnf_lexer
+from poyais.ir import (
+    grammar_ir, optimize, optimized_rules, optimized_parser_table, dump_ir,
+    load_ir, same)
+from poyais.lisp import EBNF_SPEC
+import os
+import pytest
+
+SPEC = """
+    digit = "0" | "1" | "2" ;
+    number = digit, { digit } ;
+    pair = "(", number, " ", number, ")" ;
+"""
+
+
+def test_rules_round_trip():
+    lexed = tuple(ebnf_lexer(SPEC))
+    assert load_rules(dump_rules(lexed)) == lexed
+
+
+def test_load_rejects_other_formats():
+    with pytest.raises(ValueError):
+        load_rules('{"format": -1, "rules": []}')
+
+
+def test_grammar_key_follows_text():
+    assert grammar_key(SPEC) == grammar_key(SPEC)
+    assert grammar_key(SPEC) != grammar_key(SPEC + " ")
+
+
+def test_cache_written_then_read(tmp_path):
+    first = cached_ebnf_lexer(SPEC, str(tmp_path))
+    written = list(tmp_path.iterdir())
+    assert [path.name for path in written] == [grammar_key(SPEC) + '.json']
+    assert cached_ebnf_lexer(SPEC, str(tmp_path)) == first
+    assert first == tuple(ebnf_lexer(SPEC))
+
+
+def test_no_cache_dir():
+    assert cached_ebnf_lexer(SPEC) == tuple(ebnf_lexer(SPEC))
+
+
+def test_corrupt_cache_is_ignored(tmp_path):
+    (tmp_path / (grammar_key(SPEC) + '.json')).write_text('{not json')
+    assert cached_ebnf_lexer(SPEC, str(tmp_path)) == tuple(ebnf_lexer(SPEC))
+
+
+def test_failed_write_leaves_nothing_behind(tmp_path, monkeypatch):
+    def failing_replace(src, dst):
+        raise OSError('disk full')
+    monkeypatch.setattr(os, 'replace', failing_replace)
+    assert cached_ebnf_lexer(SPEC, str(tmp_path)) == tuple(ebnf_lexer(SPEC))
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_parser_table_from_cache(tmp_path):
+    make_parser_table(SPEC, cache_dir=str(tmp_path))
+    table = make_parser_table(SPEC, cache_dir=str(tmp_path))
+    assert str(table['pair']("(10 2)", 0)) == "(10 2)"
+
+
+def test_ir_round_trip():
+    rules = optimize(grammar_ir(ebnf_lexer(EBNF_SPEC)))
+    loaded = load_ir(dump_ir(rules))
+    assert list(loaded) == list(rules)
+    assert all(same(loaded[rule], rules[rule]) for rule in rules)
+
+
+def test_optimized_rules_from_cache(tmp_path):
+    first = optimized_rules(SPEC, cache_dir=str(tmp_path))
+    assert (tmp_path / (grammar_key(SPEC, 'ir') + '.json')).exists()
+    assert optimized_rules(SPEC, cache_dir=str(tmp_path)) == first
+    # other roots are kept apart
+    assert set(optimized_rules(
+        SPEC, roots=('digit',), cache_dir=str(tmp_path))) == {'digit'}
+    table = optimized_parser_table(SPEC, cache_dir=str(tmp_path))
+    assert str(table['pair']("(10 2)", 0)) == "(10 2)"
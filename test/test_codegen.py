@@ -0,0 +1,88 @@
+import importlib.util
+import os
+
+from hypothesis import given
+from hypothesis.strategies import text
+import pytest
+
+from benchmarks.inputs import scheme_source
+from poyais import lisp_parser
+from poyais.codegen import generate_parser, main
+from poyais.combinator import make_parser_table
+from poyais.lisp import EBNF_SPEC
+
+from helpers import SYMBOL_SPEC, CASES, with_positions, call_chain_spec
+
+
+def load_parser(tmp_path, ebnf_string, name='generated'):
+    path = tmp_path / (name + '.py')
+    path.write_text(generate_parser(ebnf_string), encoding='utf-8')
+    spec = importlib.util.spec_from_file_location(name, str(path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.mark.parametrize('spec, rule, programs', CASES)
+def test_generated_same_trees(tmp_path, spec, rule, programs):
+    closures = make_parser_table(spec)[rule]
+    generated = load_parser(tmp_path, spec).PARSER_TABLE[rule]
+    for program in programs:
+        for pos in range(len(program) + 1):
+            assert (with_positions(generated(program, pos)) ==
+                    with_positions(closures(program, pos)))
+
+
+@given(text(alphabet='abcDE012+-xyz'))
+def test_generated_same_symbols(program):
+    closures = make_parser_table(SYMBOL_SPEC)['symbol']
+    generated = SYMBOL_MODULE['symbol']
+    assert with_positions(generated(program, 0)) == with_positions(
+        closures(program, 0))
+
+
+SYMBOL_MODULE = {}
+exec(generate_parser(SYMBOL_SPEC), SYMBOL_MODULE)
+SYMBOL_MODULE = SYMBOL_MODULE['PARSER_TABLE']
+
+
+def test_lisp_parser_is_up_to_date():
+    path = os.path.splitext(lisp_parser.__file__)[0] + '.py'
+    with open(path, encoding='utf-8') as generated:
+        assert generated.read() == generate_parser(EBNF_SPEC), (
+            "regenerate poyais/lisp_parser.py with poyais.codegen")
+
+
+def test_lisp_parser_same_trees():
+    source = scheme_source(2048)
+    closures = make_parser_table(EBNF_SPEC)['program']
+    assert with_positions(
+        lisp_parser.PARSER_TABLE['program'](source, 0)) == with_positions(
+            closures(source, 0))
+
+
+def test_deep_nesting(tmp_path):
+    # more nested loops than python allows in one function
+    spec = 'deep = {}"a"{} ;'.format('( "x", "b" | ' * 30, ')' * 30)
+    closures = make_parser_table(spec)['deep']
+    module = load_parser(tmp_path, spec)
+    assert any(name.startswith('_part') for name in vars(module))
+    generated = module.PARSER_TABLE['deep']
+    for program in ("a", "xb", "xc"):
+        assert with_positions(generated(program, 0)) == with_positions(
+            closures(program, 0))
+
+
+def test_generated_analysis_is_per_rule(tmp_path):
+    module = load_parser(tmp_path, call_chain_spec(60))
+    assert module.PARSER_TABLE['r59']('x' * 60, 0).end == 60
+
+
+def test_main(tmp_path, capsys):
+    grammar = tmp_path / 'grammar.ebnf'
+    grammar.write_text(SYMBOL_SPEC, encoding='utf-8')
+    out = tmp_path / 'symbols.py'
+    main([str(grammar), '-o', str(out)])
+    assert out.read_text(encoding='utf-8') == generate_parser(SYMBOL_SPEC)
+    main([str(grammar)])
+    assert capsys.readouterr().out == generate_parser(SYMBOL_SPEC)
@@ -1,6 +1,7 @@
 from poyais.combinator import (
     make_tagged_matcher, and_parsers, or_parsers, make_parser_from_rule,
-    make_parser_table, many_parser, UtilityToken, EMPTY_PARSER, optional_parser
+    make_parser_table, many_parser, UtilityToken, EMPTY_PARSER,
+    optional_parser, PackratMemo, make_literal_matcher, First, first_sets
 )
 from hypothesis.strategies import text, lists, sampled_from
 from poyais.ebnf import LexedRule, Rule, lex_rule
@@ -8,6 +9,8 @@ from poyais.utility import LanguageToken, LanguageNode
 from hypothesis import given
 import pytest
 import string
+
+from helpers import BACKTRACKING_SPEC, SYMBOL_SPEC, FIRST_SPEC
 import pytest
 
 
@@ -251,6 +254,19 @@ def test_many_identifiers():
     assert str(twice) == 'hihi'
 
 
+def test_parse_records_positions():
+    spec = """
+        word = "w", "o", "r", "d";
+        words = word, " ", word;
+    """
+    got = make_parser_table(spec)['words']("xx word word", 3)
+    assert (got.start, got.end) == (3, 12)
+    assert (got.value.start, got.value.end) == (3, 7)
+    second = got.link.link.value
+    assert (second.start, second.end) == (8, 12)
+    assert second.value == LanguageToken('terminal', 'w', 8, 9)
+
+
 def test_make_parser_table():
     rules = "this = 't' | 'h' | 'i' | 's';"
     table = make_parser_table(rules)
@@ -264,6 +280,131 @@ def test_make_parser_table():
     assert this_p('w', 0) is None
 
 
+def test_packrat_matches_plain_parse():
+    plain = make_parser_table(BACKTRACKING_SPEC)
+    memo = PackratMemo()
+    packrat = make_parser_table(BACKTRACKING_SPEC, memo=memo)
+    for program in ("@()", "@word", "@nope"):
+        got, expected = (packrat['quoted'](program, 0),
+                         plain['quoted'](program, 0))
+        assert str(got) == str(expected)
+
+
+def test_packrat_reuses_backtracked_rule():
+    memo = PackratMemo()
+    table = make_parser_table(BACKTRACKING_SPEC, memo=memo)
+    assert str(table['quoted']("@word", 0)) == "@word"
+    # quote gets tried at 0 by both alternatives, the second is a hit.
+    stats = memo.stats()
+    assert stats.hits == 1
+    assert stats.misses == 3
+
+
+def test_packrat_new_string_is_new_parse():
+    memo = PackratMemo()
+    table = make_parser_table(BACKTRACKING_SPEC, memo=memo)
+    assert str(table['quoted']("@word", 0)) == "@word"
+    assert table['quoted']("@wore", 0) is None
+    assert memo.stats().entries == 3
+
+
+def test_packrat_max_entries():
+    memo = PackratMemo(max_entries=2)
+    table = make_parser_table(BACKTRACKING_SPEC, memo=memo)
+    assert str(table['quoted']("@word", 0)) == "@word"
+    stats = memo.stats()
+    assert stats.entries == 2
+    assert stats.evictions == 1
+
+
+def uncollapsed_symbol_parser():
+    def terminals(chars):
+        return or_parsers(*(make_tagged_matcher('terminal', c) for c in chars))
+    letter, digit, math = terminals('abcDE'), terminals('012'), terminals('+-')
+    character = or_parsers(letter, digit, math)
+    return and_parsers(or_parsers(letter, math), many_parser(character))
+
+
+def shape(got):
+    if isinstance(got, LanguageNode):
+        return tuple(shape(value) for value in got)
+    return got
+
+
+def test_literal_rules_collapse():
+    table = make_parser_table(SYMBOL_SPEC)
+    assert table['character'].literals == tuple('abcDE012+-')
+
+
+@given(text(alphabet='abcDE012+-xyz'))
+def test_collapsed_literals_same_tree(program):
+    collapsed = make_parser_table(SYMBOL_SPEC)['symbol']
+    uncollapsed = uncollapsed_symbol_parser()
+    for pos in range(len(program) + 1):
+        assert shape(collapsed(program, pos)) == shape(
+            uncollapsed(program, pos))
+
+
+def test_literal_matcher_keeps_alternative_order():
+    table = make_parser_table(SYMBOL_SPEC)
+    assert table['keyword']('in', 0).match == 'i'
+    assert make_literal_matcher(('in', 'i'))('in', 0).match == 'in'
+    assert make_literal_matcher(('a', 'b'))('', 0) is None
+
+
+def test_literal_matches_share_strings():
+    matcher = make_literal_matcher(('in', 'if'))
+    assert matcher('x if', 2).match is matcher.literals[1]
+
+
+def test_first_sets():
+    firsts = first_sets(make_parser_table(FIRST_SPEC))
+    assert firsts['word'] == First(frozenset('w'), False)
+    assert firsts['space'] == First(frozenset(' '), True)
+    assert firsts['spaced'] == First(frozenset(' w'), False)
+    assert firsts['item'] == First(frozenset('w( '), False)
+    assert firsts['maybe'] == First(frozenset('x'), True)
+
+
+def test_or_parsers_skips_impossible_alternatives():
+    called = []
+
+    def spy(parser):
+        def p(string, pos):
+            called.append(p)
+            return parser(string, pos)
+        p.first_set = parser.first_set
+        return p
+
+    foo = spy(make_tagged_matcher('foo', 'foo'))
+    bar = spy(make_tagged_matcher('bar', 'bar'))
+    fob = spy(make_tagged_matcher('fob', 'fob'))
+    p = or_parsers(foo, bar, fob)
+    assert p('bar', 0).tag == 'bar'
+    assert called == [bar]
+    del called[:]
+    assert p('fob', 0).tag == 'fob'
+    assert called == [foo, fob]
+    del called[:]
+    assert p('zap', 0) is None
+    assert called == []
+
+
+def test_or_parsers_tries_unknown_alternatives():
+    def anything(string, pos):
+        return LanguageToken('any', string[pos:], pos, len(string))
+    p = or_parsers(make_tagged_matcher('foo', 'foo'), anything)
+    assert p('zap', 0).tag == 'any'
+    assert p('', 0).tag == 'any'
+
+
+def test_recursive_rule_has_unknown_first():
+    spec = """
+        loop = [ "x" ], loop ;
+    """
+    assert first_sets(make_parser_table(spec))['loop'] is None
+
+
 @pytest.mark.skip("unimplemented")
 def test_ast_properties():
     spec = r"""
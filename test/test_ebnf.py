@@ -1,5 +1,12 @@
+from hypothesis import given
+from hypothesis.strategies import integers
+import pytest
+
+from benchmarks.inputs import grammar_source
 from poyais.ebnf import Rule, split_into_rules, lex_rule, EBNFToken, EBNFSymbol
 from poyais.ebnf import TERMINAL, IDENTIFIER
+from poyais.ebnf import ebnf_lexer, ebnf_lexer_charwise, LexedRule
+from poyais.lisp import EBNF_SPEC
 
 
 def test_rule_splitter():
@@ -52,3 +59,58 @@ def test_rule_identifier_whitespace():
 
     for idx in (1, 3):
         assert got[idx].contents == "|"
+
+
+def test_quoted_newline_survives_splitting():
+    ex = 'whitespace = " " | "\n" ;'
+    result = list(split_into_rules(ex))
+    assert result == [Rule('whitespace', '" " | "\n"')]
+
+
+def test_terminal_of_a_quote_character():
+    got = tuple(lex_rule(Rule('quote', '"\'" | \'"\'')))
+    assert got[0] == EBNFToken(TERMINAL, "'")
+    assert got[2] == EBNFToken(TERMINAL, '"')
+
+
+def without_positions(lexed_rules):
+    return [(rule.identifier, tuple(token[:2] for token in rule.tokens))
+            for rule in lexed_rules]
+
+
+@given(integers(min_value=0, max_value=2 ** 16))
+def test_ebnf_lexer_same_as_charwise(seed):
+    grammar = grammar_source(512, seed=seed)
+    assert without_positions(ebnf_lexer(grammar)) == without_positions(
+        ebnf_lexer_charwise(grammar))
+
+
+def test_ebnf_lexer_same_as_charwise_on_lisp():
+    assert without_positions(ebnf_lexer(EBNF_SPEC)) == without_positions(
+        ebnf_lexer_charwise(EBNF_SPEC))
+
+
+def test_ebnf_lexer_positions():
+    got = list(ebnf_lexer('a = "x" ;\nmath symbol =\n  { a | \'y\' } ;'))
+    assert got[0] == LexedRule('a', (EBNFToken(TERMINAL, 'x', 1, 4),))
+    assert got[1].identifier == 'math symbol'
+    assert [(token.contents, token.line, token.column)
+            for token in got[1].tokens] == [
+        ('{', 3, 2), ('a', 3, 4), ('|', 3, 6), ('y', 3, 8), ('}', 3, 12)]
+
+
+def test_ebnf_lexer_quoted_semicolon():
+    got = list(ebnf_lexer('end = ";" | "=" ;'))
+    assert [token.contents for token in got[0].tokens] == [';', '|', '=']
+
+
+def test_ebnf_lexer_errors():
+    with pytest.raises(AssertionError, match='unquoted terminal'):
+        list(ebnf_lexer('a = "x ;'))
+    with pytest.raises(AssertionError, match="Unquoted '='"):
+        list(ebnf_lexer('a = b = c ;'))
+    with pytest.raises(AssertionError, match='Semicolon'):
+        list(ebnf_lexer('a ; b = c ;'))
+    # no ; no rule, same as ever
+    assert list(ebnf_lexer('a = "x" ; b = "y"')) == [
+        LexedRule('a', (EBNFToken(TERMINAL, 'x', 1, 4),))]
@@ -0,0 +1,184 @@
+import asyncio
+
+from hypothesis import given
+from hypothesis.strategies import integers, lists
+import pytest
+
+from benchmarks.inputs import scheme_source
+from poyais.forms import (
+    FormScanner, FormReader, scan_forms, parse_forms, read_forms)
+from poyais.lisp import lisp_parser_table
+
+from helpers import with_positions
+
+
+def forms_of(text):
+    return [text[start:end] for start, end in scan_forms(text)]
+
+
+def test_scan_forms():
+    assert forms_of("(a b) c") == ["(a b)", "c"]
+    assert forms_of("'(a (b))\n`(c)  d") == ["'(a (b))", "`(c)", "d"]
+    assert forms_of('abc(def) "x (y" z') == ["abc", "(def)", '"x (y"', "z"]
+    assert forms_of("") == []
+
+
+def test_scan_forms_resyncs_after_nonsense():
+    assert forms_of("(a") == ["(a"]
+    assert forms_of("a ) (b)") == ["a", ")", "(b)"]
+    assert forms_of("a \\ b") == ["a", "\\ b"]
+    # a bad form inside a list ends with the list
+    assert forms_of("(a \\ b) (c)") == ["(a \\ b)", "(c)"]
+    # or at the next newline
+    assert forms_of(") x\ny") == [") x", "y"]
+    assert forms_of("(a ) )\n(b)") == ["(a )", ")", "(b)"]
+
+
+@given(lists(integers(min_value=1, max_value=40), max_size=20))
+def test_form_scanner_chunks(cuts):
+    text = (scheme_source(300, separator=' ') + ' "a \\" string" b ) c\n' +
+            scheme_source(100) + ' (d \\ e) \\ f')
+    scanner = FormScanner()
+    spans = []
+    pos = 0
+    for cut in cuts:
+        spans.extend(scanner.feed(text[pos:pos + cut]))
+        pos += cut
+    spans.extend(scanner.feed(text[pos:], final=True))
+    assert spans == scan_forms(text)
+
+
+def test_form_scanner_scans_long_tokens_once():
+    text = '(a "{}") {} (b)'.format('x\\y"z ' * 100000, 'q' * 100000)
+    scanner = FormScanner()
+    scan = scanner._scan
+    scanned = []
+
+    def counted(text):
+        scanned.append(len(text))
+        return scan(text)
+    scanner._scan = counted
+    spans = []
+    for idx in range(0, len(text), 4096):
+        spans.extend(scanner.feed(text[idx:idx + 4096]))
+    spans.extend(scanner.feed('', final=True))
+    assert spans == scan_forms(text)
+    assert sum(scanned) < 2 * len(text)
+
+
+@pytest.mark.parametrize('jobs', (1, 2))
+def test_parse_forms_same_as_sequential(jobs):
+    text = scheme_source(4096)
+    form = lisp_parser_table()['form']
+    expected = [with_positions(form(text, start))
+                for start, _ in scan_forms(text)]
+    got = parse_forms(text, jobs=jobs, chunksize=7)
+    assert [with_positions(tree) for tree in got] == expected
+    # and every form is one the whole program is made of
+    assert lisp_parser_table()['program'](text, 0).end == len(text)
+
+
+@pytest.mark.parametrize('jobs', (1, 2))
+def test_parse_forms_only_grammar_whitespace(jobs):
+    # the grammar has no '\r', so neither does the scanner
+    text = "(a b)\r\n(c d)"
+    assert lisp_parser_table()['program'](text, 0).end == 5
+    with pytest.raises(ValueError, match="index 5"):
+        parse_forms(text, jobs=jobs)
+
+
+def test_parse_forms_raises():
+    with pytest.raises(ValueError, match="index 6"):
+        parse_forms("(a b) (c 1d) (e)", jobs=2, chunksize=1)
+
+
+def feed_in_chunks(text, cuts):
+    reader = FormReader()
+    got = []
+    pos = 0
+    for cut in cuts:
+        reader.feed(text[pos:pos + cut])
+        got.extend(reader.forms())
+        pos += cut
+    reader.feed(text[pos:])
+    reader.feed_eof()
+    got.extend(reader.forms())
+    return reader, got
+
+
+@given(lists(integers(min_value=1, max_value=60), max_size=30))
+def test_form_reader_chunks(cuts):
+    text = scheme_source(600)
+    _, got = feed_in_chunks(text, cuts)
+    assert [(form.start, form.end) for form in got] == scan_forms(text)
+    assert [with_positions(form.tree) for form in got] == [
+        with_positions(tree) for tree in parse_forms(text, jobs=1)]
+    assert all(form.error is None for form in got)
+
+
+def test_form_reader_only_keeps_unfinished_form():
+    reader = FormReader()
+    for _ in range(1000):
+        reader.feed("(foo bar)\n")
+    reader.feed("(unfinished ")
+    assert len(list(reader.forms())) == 1000
+    assert ''.join(reader._chunks) == "(unfinished "
+
+
+def test_form_reader_errors_are_forms():
+    _, got = feed_in_chunks("(a) (b 1c) (d)", [])
+    assert [form.text for form in got] == ["(a)", "(b 1c)", "(d)"]
+    assert [form.error is None for form in got] == [True, False, True]
+    assert got[1].tree is None
+
+
+def test_form_reader_carries_on_after_nonsense():
+    reader = FormReader()
+    reader.feed(") ")
+    for _ in range(1000):
+        reader.feed("(foo bar)\n")
+    got = list(reader.forms())
+    assert [form.text for form in got[:2]] == [")", "(foo bar)"]
+    assert got[0].error is not None
+    assert len(got) == 1001 and all(form.error is None for form in got[1:])
+    assert ''.join(reader._chunks) == ""
+
+
+def test_form_reader_async():
+    async def session():
+        reader = FormReader()
+        arrived = []
+
+        async def consume():
+            async for form in reader:
+                arrived.append(form.text)
+
+        consumer = asyncio.ensure_future(consume())
+        for chunk, expected in (("(define", []), (" x)", ["(define x)"]),
+                                ("\n'(a b", ["(define x)"]),
+                                (") sym", ["(define x)", "'(a b)"]),
+                                ("bol ", ["(define x)", "'(a b)", "symbol"])):
+            reader.feed(chunk)
+            await asyncio.sleep(0)
+            # each form arrives as soon as it's finished
+            assert arrived == expected
+        reader.feed_eof()
+        await consumer
+        return arrived
+    assert asyncio.run(session()) == ["(define x)", "'(a b)", "symbol"]
+
+
+def test_read_forms_from_stream():
+    async def session():
+        stream = asyncio.StreamReader()
+        data = '(x "λ") (foo)\nbar'.encode('utf-8')
+        # splits λ in two
+        stream.feed_data(data[:5])
+        stream.feed_data(data[5:])
+        stream.feed_eof()
+        return [form async for form in read_forms(stream, chunk_size=2)]
+    got = asyncio.run(session())
+    assert [form.text for form in got] == ['(x "λ")', "(foo)", "bar"]
+    # the grammar has no strings
+    assert got[0].error is not None
+    assert [form.error for form in got[1:]] == [None, None]
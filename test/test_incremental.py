@@ -0,0 +1,97 @@
+import time
+
+from poyais.incremental import IncrementalParser
+from poyais.combinator import make_parser_table
+from poyais.utility import shift_positions, shifted, node_from_iterable
+from poyais.utility import LanguageToken, LanguageNode, iter_traverse
+from hypothesis.strategies import text, integers, tuples, lists
+from hypothesis import given
+
+from helpers import with_positions
+
+SPEC = """
+    letter = "a" | "b" | "c" ;
+    space = " " | "\n" ;
+    atom = letter, { letter } ;
+    empty list = "(", ")" ;
+    list = empty list | ( "(", { item | space }, ")" ) ;
+    item = atom | list ;
+    program = { item | space } ;
+"""
+
+PLAIN_TABLE = make_parser_table(SPEC)
+
+
+def fresh_parse(program):
+    return PLAIN_TABLE['program'](program, 0)
+
+
+def test_reparse_after_edit():
+    session = IncrementalParser(SPEC, 'program', "(ab c) (a (b)) ca")
+    before = session.memo.stats()
+    got = session.edit(8, 1, "cc")
+    assert session.text == "(ab c) (cc (b)) ca"
+    assert with_positions(got) == with_positions(fresh_parse(session.text))
+    after = session.memo.stats()
+    assert after.hits > before.hits
+    # only the edited list and whatever contains it are reparsed
+    assert after.misses - before.misses < before.misses
+
+
+@given(text(alphabet='abc ()'),
+       lists(tuples(integers(min_value=0), integers(min_value=0, max_value=3),
+                    text(alphabet='abc ()', max_size=3)), max_size=5))
+def test_edits_agree_with_fresh_parse(program, edits):
+    session = IncrementalParser(SPEC, 'program', program)
+    for offset, deleted, inserted in edits:
+        offset = offset % (len(session.text) + 1)
+        deleted = min(deleted, len(session.text) - offset)
+        got = session.edit(offset, deleted, inserted)
+        assert with_positions(got) == with_positions(
+            fresh_parse(session.text))
+
+
+def test_shift_positions():
+    node = node_from_iterable((LanguageToken('t', 'a', 1, 2),
+                               LanguageToken('t', 'b', 2, 3)))
+    moved = shift_positions(node, 3)
+    assert (moved.start, moved.end) == (4, 6)
+    assert moved.link.value == LanguageToken('t', 'b', 5, 6)
+    assert (node.start, node.end) == (1, 3)
+
+
+def test_shifted():
+    node = node_from_iterable((LanguageToken('t', 'a', 1, 2),
+                               node_from_iterable((
+                                   LanguageToken('t', 'b', 2, 3),))))
+    moved = shifted(shifted(node, 1), 2)
+    assert isinstance(moved, LanguageNode)
+    assert (moved.start, moved.end, len(moved)) == (4, 6, 2)
+    assert with_positions(moved) == with_positions(shift_positions(node, 3))
+    assert iter_traverse(moved) == [LanguageToken('t', 'a', 4, 5),
+                                    LanguageToken('t', 'b', 5, 6)]
+    assert shifted(moved, -3) is node
+
+
+def edit_cost(forms):
+    "Lookups and best time of an edit near the start of a text of forms"
+    session = IncrementalParser(SPEC, 'program', "(ab (c a) b)\n" * forms)
+    session.edit(20, 1, "b")
+    lookups, times = set(), []
+    for idx in range(10):
+        before = session.memo.stats()
+        start = time.perf_counter()
+        session.edit(20, 1, "ab"[idx % 2])
+        times.append(time.perf_counter() - start)
+        after = session.memo.stats()
+        lookups.add((after.hits - before.hits, after.misses - before.misses))
+    return lookups, min(times)
+
+
+def test_edit_cost_is_flat():
+    small_lookups, small_time = edit_cost(100)
+    large_lookups, large_time = edit_cost(5000)
+    # nothing after the edit is looked at again, bar the rest of the
+    # top level repetition in one go
+    assert small_lookups == large_lookups
+    assert large_time < 10 * small_time
@@ -0,0 +1,146 @@
+from hypothesis import given
+from hypothesis.strategies import text
+import pytest
+
+from benchmarks.inputs import scheme_source
+from poyais.combinator import make_parser_table
+from poyais.ebnf import ebnf_lexer
+from poyais.ir import (
+    grammar_ir, optimize, optimized_parser_table, inline_rules, flatten,
+    left_factor, merge_terminals, recursive_rules, lower, same, Terminal,
+    Terminals, Reference, Seq, Choice, Repeat, Optional, Factor)
+from poyais.lisp import EBNF_SPEC
+
+from helpers import SYMBOL_SPEC, FACTOR_SPEC, CASES, with_positions
+
+
+def rules_of(spec):
+    return grammar_ir(ebnf_lexer(spec))
+
+
+@pytest.mark.parametrize('spec, rule, programs', CASES + (
+    (FACTOR_SPEC, 'both', ("xyz", "xy", "xwv", "xw", "q", "xq", "x", "")),
+    # the same tuples, but not the same expressions
+    ('r = ( { "x" } , "y" ) | ( [ "x" ] , "z" ) ;', 'r', ("xxz", "xz", "z")),
+    ('a = "q", "w" ; r = ( "a", "b" ) | ( a, "c" ) ;', 'r',
+     ("qwc", "ab", "ac")),
+))
+def test_optimized_same_trees(spec, rule, programs):
+    closures = make_parser_table(spec)[rule]
+    optimized = optimized_parser_table(spec)[rule]
+    for program in programs:
+        for pos in range(len(program) + 1):
+            assert (with_positions(optimized(program, pos)) ==
+                    with_positions(closures(program, pos)))
+
+
+@given(text(alphabet='abcDE012+-xyz'))
+def test_optimized_same_symbols(program):
+    closures = make_parser_table(SYMBOL_SPEC)['symbol']
+    optimized = optimized_parser_table(SYMBOL_SPEC)['symbol']
+    assert with_positions(optimized(program, 0)) == with_positions(
+        closures(program, 0))
+
+
+def test_optimized_same_program():
+    source = scheme_source(2048)
+    closures = make_parser_table(EBNF_SPEC)['program']
+    optimized = optimized_parser_table(EBNF_SPEC)['program']
+    assert with_positions(optimized(source, 0)) == with_positions(
+        closures(source, 0))
+
+
+def test_grammar_ir():
+    rules = rules_of('a = "x", [ b ], { "y" | "z" } ; b = "w" ;')
+    assert rules == {
+        'a': Seq((Terminal('x'), Optional(Reference('b')),
+                  Repeat(Choice((Terminal('y'), Terminal('z')))))),
+        'b': Terminal('w'),
+    }
+
+
+def test_inline_rules():
+    rules = inline_rules(rules_of(
+        'x = "x" ; either = x | "y" ; list = "(", { list | either }, ")" ;'))
+    assert rules['either'] == Choice((Terminal('x'), Terminal('y')))
+    # recursive rules are still called
+    assert rules['list'] == Seq((
+        Terminal('('),
+        Repeat(Choice((Reference('list'),
+                       Choice((Terminal('x'), Terminal('y')))))),
+        Terminal(')')))
+
+
+def test_recursive_rules():
+    rules = rules_of('a = "(", b, ")" | "x" ; b = a ; c = a ;')
+    assert recursive_rules(rules) == {'a', 'b'}
+
+
+def test_recursive_rules_self_call():
+    rules = rules_of('a = "x", [ a ] ; b = a ;')
+    assert recursive_rules(rules) == {'a'}
+
+
+def test_long_chain_of_rules():
+    # one rule calling the next, 2000 deep
+    spec = '\n'.join('r{} = "x", r{} ;'.format(idx, idx + 1)
+                     for idx in range(2000)) + ' r2000 = "x" ;'
+    table = lower(optimize(rules_of(spec)))
+    assert len(table) == 2001
+    assert table['r1900']('x' * 101, 0).end == 101
+    assert lower(inline_rules(rules_of(
+        spec.replace('"x", ', ''))))['r0']('x', 0).match == 'x'
+
+
+def test_same():
+    assert same(Seq((Terminal('a'),)), Seq((Terminal('a'),)))
+    assert not same(Terminal('a'), Reference('a'))
+    assert not same(Repeat(Terminal('x')), Optional(Terminal('x')))
+    assert not same(Seq((Terminal('a'),)), Seq((Reference('a'),)))
+
+
+def test_flatten():
+    rules = flatten({'a': Choice((Terminal('x'), Choice((
+        Terminal('y'), Terminal('z'))))),
+        'b': Optional(Optional(Terminal('x'))),
+        'c': Seq((Terminal('x'), Seq((Terminal('y'), Terminal('z')))))})
+    assert rules['a'] == Choice(
+        (Terminal('x'), Terminal('y'), Terminal('z')))
+    assert rules['b'] == Optional(Terminal('x'))
+    # that's a node inside a node, so it stays
+    assert rules['c'] == Seq(
+        (Terminal('x'), Seq((Terminal('y'), Terminal('z')))))
+
+
+def test_left_factor():
+    rules = left_factor(rules_of(FACTOR_SPEC))
+    x, y, z, w, v, q = map(Terminal, 'xyzwvq')
+    assert rules['both'] == Choice((
+        Factor((x,), ((y, z), (y,), (w, v))),
+        q,
+        Seq((x, q))))
+
+
+def test_left_factor_lisp():
+    rules = optimize(rules_of(EBNF_SPEC))
+    assert rules['quoted list'] == Factor(
+        (Terminal("'"),),
+        ((Terminals(('(', ')')),), (Reference('sexp'),)))
+
+
+def test_merge_terminals():
+    rules = merge_terminals(rules_of('a = "x", "y", b, "z" ; b = "w" ;'))
+    assert rules['a'] == Seq(
+        (Terminals(('x', 'y')), Reference('b'), Terminal('z')))
+
+
+def test_remove_unreachable():
+    rules = optimize(rules_of(EBNF_SPEC), roots=('sexp',))
+    assert set(rules) == {'sexp', 'symbol'}
+    assert set(optimized_parser_table(EBNF_SPEC, roots=('sexp',))) == {
+        'sexp', 'symbol'}
+
+
+def test_undefined_rule():
+    with pytest.raises(KeyError):
+        optimized_parser_table('a = "x", b ;')
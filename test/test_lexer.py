@@ -1,4 +1,11 @@
-from poyais.lexer import lex
+from poyais import lexer
+from poyais.lexer import (
+    lex, lex_stream, lex_file, reader, lex_charwise, lex_buffer, string_end)
+import random
+import re
+from hypothesis.strategies import text, lists, integers
+from hypothesis import given
+import pytest
 
 
 def test_empty_exp():
@@ -33,3 +40,134 @@ def test_string():
 def test_single_digits():
     digits_exp = "(define () 5)"
     assert list(lex(digits_exp)) == ["(", "define", "(", ")", "5", ")"]
+
+
+PROGRAM_ALPHABET = 'ab+1 \t\n()\'`"\\'
+
+
+def outcome(tokens):
+    got = []
+    try:
+        for token in tokens:
+            got.append(token)
+    except ValueError as err:
+        return got, str(err)
+    return got, None
+
+
+def chunked(program, cuts):
+    cuts = sorted(set(cut % (len(program) + 1) for cut in cuts))
+    return [program[start:end]
+            for start, end in zip([0] + cuts, cuts + [len(program)])]
+
+
+@given(text(alphabet=PROGRAM_ALPHABET), lists(integers(min_value=0)))
+def test_lex_stream_matches_lex(program, cuts):
+    chunks = chunked(program, cuts)
+    assert ''.join(chunks) == program
+    assert outcome(lex_stream(chunks)) == outcome(lex(program))
+
+
+def test_lex_stream_token_across_chunks():
+    chunks = ['(lam', 'bda () "a (', 'string)" 12', '3)']
+    assert list(lex_stream(chunks)) == [
+        "(", "lambda", "(", ")", '"a (string)"', "123", ")"]
+
+
+def test_lex_stream_scans_long_tokens_once(monkeypatch):
+    program = '(a "{}" {} b)'.format('x\\y"z ' * 100000, 'q' * 100000)
+    chunks = [program[idx:idx + 4096]
+              for idx in range(0, len(program), 4096)]
+    expected = list(lex(program))
+    scanned = []
+    scan = lexer._lex
+
+    def counted(program_string, *args):
+        scanned.append(len(program_string))
+        return scan(program_string, *args)
+    monkeypatch.setattr(lexer, '_lex', counted)
+    assert list(lex_stream(chunks)) == expected
+    # every chunk, and each of the long tokens once more
+    assert sum(scanned) < 2 * len(program)
+
+
+def test_string_end():
+    assert string_end('ab" c') == (3, False)
+    assert string_end('a\\b"c" d') == (6, False)
+    assert string_end('a\\b') == (None, True)
+    assert string_end('b"c" d', armed=True) == (4, False)
+    assert string_end('"ab', pos=1) == (None, False)
+
+
+def test_lex_stream_error_position():
+    with pytest.raises(ValueError) as err:
+        list(lex_stream(['(foo ', 'bar \\)']))
+    assert str(err.value) == "Backslash outside of string context at 9"
+
+
+def test_lex_file_reads_every_line(tmp_path):
+    path = tmp_path / 'program.scm'
+    path.write_text('(define\n  (foo)\n  "bar")\n(baz)\n')
+    with open(str(path), encoding='utf-8') as program:
+        got = list(lex_file(program, chunk_size=3))
+    assert got == ["(", "define", "(", "foo", ")", '"bar"', ")",
+                   "(", "baz", ")"]
+    assert got == list(lex(reader(str(path))))
+
+
+@given(text(alphabet=PROGRAM_ALPHABET))
+def test_lex_matches_charwise(program):
+    assert outcome(lex(program)) == outcome(lex_charwise(program))
+
+
+def test_escapes():
+    program = r'"a\"b" "c\\"d\e""'
+    assert list(lex(program)) == ['"a"b"', r'"c\"de""']
+    assert list(lex(program)) == list(lex_charwise(program))
+
+
+def test_unterminated_string_dropped():
+    assert list(lex('(foo "bar')) == ['(', 'foo']
+
+
+def test_large_program_matches_charwise():
+    rand = random.Random(8)
+    words = ('(', ')', "'", '`', 'define', 'lambda', '+', 'x1', '42',
+             '"a string"', r'"with \"escapes\""', ' ', '  ', '\t')
+    program = ' '.join(rand.choice(words) for _ in range(50000))
+    assert list(lex(program)) == list(lex_charwise(program))
+
+
+@given(text(alphabet=PROGRAM_ALPHABET))
+def test_lex_buffer_matches_lex(program):
+    expected = outcome(lex(program))
+    try:
+        got = (list(lex_buffer(program)), None)
+    except ValueError as err:
+        # the buffer never comes back, so check the tokens before the
+        # error with a buffer of the text up to it
+        error_pos = int(re.search(r'\d+$', str(err)).group())
+        got = (list(lex_buffer(program[:error_pos])), str(err))
+    assert got == expected
+
+
+def test_lex_buffer_positions():
+    program = '(define\tfoo\t"a\\"b")'
+    buf = lex_buffer(program, whitespace={' ', '\t', '\n'})
+    assert len(buf) == 5
+    assert buf[2] == 'foo'
+    assert buf.span(2) == (8, 11)
+    assert buf.kind(2) == 'symbol'
+    assert buf.kind(0) == 'token'
+    assert buf.kind(3) == 'string'
+    assert buf[3] == '"a"b"'
+    assert buf.raw(3) == '"a\\"b"'
+    assert buf[-1] == ')'
+
+
+def test_lex_buffer_line_col():
+    program = '(foo\n  bar)\n\n(baz)'
+    buf = lex_buffer(program, whitespace={' ', '\n'})
+    assert [buf.line_col(idx) for idx in range(len(buf))] == [
+        (1, 0), (1, 1), (2, 2), (2, 5), (4, 0), (4, 1), (4, 4)]
+    assert buf.line_cols() == [buf.line_col(idx) for idx in range(len(buf))]
@@ -0,0 +1,64 @@
+from poyais import lisp
+import subprocess
+import sys
+import threading
+
+# generous, it's here to catch the table creeping back into import time
+# rather than to benchmark anything.
+IMPORT_BUDGET_SECONDS = 0.5
+
+MEASURE_IMPORT = """
+import time
+start = time.perf_counter()
+import poyais.lisp
+elapsed = time.perf_counter() - start
+print(elapsed, poyais.lisp._table is None)
+"""
+
+
+def test_import_is_cheap():
+    out = subprocess.run(
+        [sys.executable, '-c', MEASURE_IMPORT], check=True,
+        stdout=subprocess.PIPE, universal_newlines=True).stdout
+    elapsed, untouched = out.split()
+    assert untouched == 'True'
+    assert float(elapsed) < IMPORT_BUDGET_SECONDS
+
+
+def test_table_built_once(monkeypatch):
+    calls = []
+    barrier = threading.Barrier(8)
+
+    def counting_table(spec):
+        calls.append(spec)
+        return {}
+
+    monkeypatch.setattr(lisp, '_table', None)
+    monkeypatch.setattr(lisp, 'optimized_parser_table', counting_table)
+    got = []
+
+    def build():
+        barrier.wait()
+        got.append(lisp.lisp_parser_table())
+
+    threads = [threading.Thread(target=build) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert all(table is got[0] for table in got)
+
+
+def test_warm_up_and_module_attribute():
+    lisp.warm_up()
+    assert lisp._table is not None
+    assert lisp.LISP_PARSER_TABLE is lisp.lisp_parser_table()
+
+
+def test_parse_sexp():
+    table = lisp.lisp_parser_table()
+    assert str(table['sexp']("(foo\nbar )", 0)) == "(foo\nbar )"
+    assert str(table['quoted list']("'(+ a b1)", 0)) == "'(+ a b1)"
+    assert str(table['quoted list']("'()", 0)) == "'()"
+    assert table['sexp']("(1 foo)", 0) is None
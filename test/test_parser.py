@@ -0,0 +1,62 @@
+from poyais.parser import (
+    parse, parse_token, parse_tokens, TokenSymbolPairing, TYPES,
+    symbol_codes)
+from poyais.lexer import lex, lex_buffer
+from poyais.utility import SymbolTable
+from hypothesis.strategies import text
+from hypothesis import given
+
+
+def slow_parse_token(lexical_token):
+    for pairing in TYPES:
+        if pairing.reg.match(lexical_token):
+            return TokenSymbolPairing(lexical_token, pairing.symbol_type)
+
+
+def test_parse_token_types():
+    program = '(define (f x) `(+ x 12 "str"))'
+    got = [pairing.symbol_type for pairing in parse(lex(program))]
+    assert got == [
+        'open_paren', 'lisp_symbol', 'open_paren', 'lisp_symbol',
+        'lisp_symbol', 'close_paren', 'backtick', 'open_paren',
+        'lisp_symbol', 'lisp_symbol', 'number', 'string', 'close_paren',
+        'close_paren']
+
+
+def test_symbols_are_anchored():
+    assert parse_token('foo') == TokenSymbolPairing('foo', 'lisp_symbol')
+    assert parse_token('foo^') is None
+    assert parse_token('[]') is None
+    assert parse_token('12') == TokenSymbolPairing('12', 'number')
+
+
+@given(text(alphabet='ab12+()\'`"[_ '))
+def test_combined_regex_agrees_with_types(token):
+    assert parse_token(token) == slow_parse_token(token)
+
+
+def test_parse_tokens_batch():
+    program = "(foo '(1 2) \"bar\")"
+    expected = list(parse(lex(program)))
+    assert parse_tokens(list(lex(program))) == expected
+    assert parse_tokens(lex(program)) == expected
+    assert parse_tokens(lex_buffer(program)) == expected
+
+
+def test_parse_interns_symbols():
+    program = "(foo (foo bar) 12 foo)"
+    symbols = SymbolTable()
+    got = list(parse(lex(program), symbols))
+    assert [symbols.tag(pairing.symbol_type) for pairing in got] == [
+        pairing.symbol_type for pairing in parse(lex(program))]
+    foos = [pairing.token for pairing in got if pairing.token == 'foo']
+    assert len(foos) == 3
+    assert all(foo is foos[0] for foo in foos)
+    assert parse_token('foo', symbols).token is foos[0]
+    assert parse_tokens(lex_buffer(program), symbols) == got
+
+
+def test_symbol_codes_follow_types():
+    codes = symbol_codes(SymbolTable())
+    assert [codes[pairing.symbol_type] for pairing in TYPES] == list(
+        range(len(TYPES)))
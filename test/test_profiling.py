@@ -0,0 +1,75 @@
+from itertools import count
+
+from poyais.combinator import make_parser_table
+from poyais.profiling import Profiler, RuleProfile
+from poyais.utility import node_str
+
+SPEC = """
+    word = "ab", { "ab" } ;
+    short = word, "." ;
+    long = word, word, "!" ;
+    line = long | short ;
+    list = "(", { list }, ")" ;
+"""
+
+
+def ticking_clock():
+    "A clock that moves one second every time it's read"
+    return count().__next__
+
+
+def test_profiler_leaves_parse_alone():
+    plain = make_parser_table(SPEC)
+    profiled = make_parser_table(SPEC, profiler=Profiler())
+    for program in ("ab.", "abab.", "((()))"):
+        rule = 'list' if program.startswith('(') else 'line'
+        assert (node_str(plain[rule](program, 0)) ==
+                node_str(profiled[rule](program, 0)))
+
+
+def test_profiler_counts():
+    profiler = Profiler()
+    table = make_parser_table(SPEC, profiler=profiler)
+    assert table['line']("abab.", 0) is not None
+    report = profiler.report()
+    # long reads the word, then finds no second one and gives up
+    assert report['long'] == RuleProfile(
+        1, 0, 1, report['long'].backtracked, *report['long'][4:])
+    assert report['long'].backtracked >= len("abab")
+    assert report['short'][:4] == (1, 1, 0, 0)
+    assert report['line'][:3] == (1, 1, 0)
+    # twice for long (the second word isn't there), once for short
+    assert report['word'][:3] == (3, 2, 1)
+
+
+def test_profiler_times():
+    profiler = Profiler(clock=ticking_clock())
+    table = make_parser_table(SPEC, profiler=profiler)
+    table['list']("(())", 0)
+    report = profiler.report()
+    # list runs 3 times, each inside the last: the innermost takes 1
+    # tick, the next 3 and the outermost 5. that's all list's own time,
+    # and recursion doesn't get to count it more than once.
+    assert report['list'][:3] == (3, 2, 1)
+    assert report['list'].inclusive == 5
+    assert report['list'].exclusive == 5
+
+
+def test_profiler_folded():
+    profiler = Profiler(clock=ticking_clock())
+    table = make_parser_table(SPEC, profiler=profiler)
+    table['short']("ab.", 0)
+    assert profiler.folded() == "short 2000000\nshort;word 1000000\n"
+
+
+def test_profiler_clear():
+    profiler = Profiler()
+    table = make_parser_table(SPEC, profiler=profiler)
+    table['short']("ab.", 0)
+    profiler.clear()
+    assert profiler.report() == {}
+    assert profiler.folded() == ''
+    # the table keeps counting into the same profiler
+    table['short']("ab.", 0)
+    assert profiler.report()['short'][:4] == (1, 1, 0, 0)
+    assert profiler.folded() != ''
@@ -1,8 +1,9 @@
 from poyais.utility import (
-    traverse, LanguageNode, LanguageToken,
+    traverse, LanguageNode, LanguageToken, UtilityToken, iter_tokens,
+    recursive_traverse, node_str, node_len,
     node_from_iterable,
     memoize, build_idx_line_map, _search, what_is_linum_of_idx,
-    Linum)
+    Linum, LineIndex, content_key, SymbolTable, strongly_connected)
 from hypothesis.strategies import text
 from hypothesis import given
 
@@ -46,6 +47,72 @@ def test_memoize_caches():
     assert potentially_expensive_network_request('network') == 'up'
 
 
+def test_memoize_lru_eviction():
+    calls = []
+
+    @memoize(maxsize=2)
+    def double(x):
+        calls.append(x)
+        return x * 2
+
+    assert [double(1), double(2), double(1), double(3)] == [2, 4, 2, 6]
+    # 2 was the least recently used, so it went to make room for 3
+    assert double(1) == 2
+    assert double(2) == 4
+    assert calls == [1, 2, 3, 2]
+    info = double.cache_info()
+    assert (info.hits, info.misses, info.evictions, info.size) == (2, 4, 2, 2)
+
+
+def test_memoize_size_policy():
+    @memoize(maxsize=10, policy='size')
+    def shout(word):
+        return word.upper()
+
+    shout('hello')
+    shout('there')
+    assert shout.cache_info().weight == 10
+    shout('x')
+    info = shout.cache_info()
+    assert (info.size, info.weight, info.evictions) == (2, 6, 1)
+
+
+def test_memoize_ttl():
+    now = [0]
+    calls = []
+
+    @memoize(ttl=5, clock=lambda: now[0])
+    def fetch(key):
+        calls.append(key)
+        return key
+
+    fetch('a')
+    now[0] = 4
+    fetch('a')
+    now[0] = 6
+    fetch('a')
+    assert calls == ['a', 'a']
+    assert fetch.cache_info().evictions == 1
+
+
+def test_memoize_key_and_clear():
+    calls = []
+
+    @memoize(key=content_key)
+    def length(source, extra=0):
+        calls.append(source)
+        return len(source) + extra
+
+    assert length('abc') == 3
+    assert length(''.join(['a', 'b', 'c'])) == 3
+    assert length('abc', extra=1) == 4
+    assert len(calls) == 2
+    length.cache_clear()
+    assert length.cache_info() == (0, 0, 0, 0, 0)
+    length('abc')
+    assert len(calls) == 3
+
+
 def test__search():
     assert _search([], 9543) == 0
 
@@ -68,6 +135,32 @@ def test_end_to_end_what_is_linum():
     assert what_is_linum_of_idx(full, 15) == Linum(2, 2)
 
 
+def test_what_is_linum_past_last_newline():
+    full = "a\nb\nlast line"
+    assert what_is_linum_of_idx(full, 8) == Linum(3, 5)
+
+
+def test_line_index():
+    index = LineIndex("ab\n\ncd\n")
+    assert index.line_col(0) == (1, 0)
+    assert index.line_col(2) == (1, 2)
+    assert index.line_col(3) == (2, 0)
+    assert index.line_col(5) == (3, 1)
+    assert index.line_col(7) == (4, 0)
+
+
+@given(text(alphabet='ab\n'))
+def test_line_index_resolve(source):
+    index = LineIndex(source)
+    offsets = list(range(len(source) + 1))
+    expected = [(source.count("\n", 0, offset) + 1,
+                 offset - (source.rfind("\n", 0, offset) + 1))
+                for offset in offsets]
+    assert [index.line_col(offset) for offset in offsets] == expected
+    assert index.resolve(offsets) == expected
+    assert index.resolve(offsets[::-1]) == expected[::-1]
+
+
 def test_node_from_iterable_empty():
     assert node_from_iterable(()) is None
 
@@ -121,6 +214,21 @@ def test_make_ast_nested_empty():
     assert got.link.link.link is None
 
 
+def test_node_span_from_positioned_tokens():
+    got = node_from_iterable((LanguageToken('tag', 'foo', 3, 6),
+                              LanguageToken('tag', 'bar', 6, 9)))
+    assert (got.start, got.end) == (3, 9)
+    assert (got.link.start, got.link.end) == (6, 9)
+    assert len(got) == 6
+
+
+def test_node_len_without_positions():
+    got = make_ast_from_iterable('foo', (('lambda', '+'), '5', '3'))
+    assert len(got) == 9
+    assert got.start is None
+    assert len(got.value) == 7
+
+
 def make_ast_from_iterable(tag, tokens, idx=0):
     if idx < len(tokens):
         curr = tokens[idx]
@@ -141,3 +249,67 @@ def make_ast_from_iterable(tag, tokens, idx=0):
 def make_language_token_node(tag, it):
     return node_from_iterable(
         tuple(LanguageToken(tag, match) for match in it))
+
+
+def test_traversals_agree():
+    got = make_ast_from_iterable('foo', (('lambda', ('+', ())), '5', '3'))
+    tokens = traverse(got)
+    assert [token.match for token in tokens] == ['lambda', '+', '5', '3']
+    assert list(iter_tokens(got)) == tokens
+    assert recursive_traverse(got) == tokens
+    assert node_str(got) == str(got) == 'lambda+53'
+    assert node_len(got) == len(got) == 9
+
+
+def test_traversals_skip_empty_matches():
+    got = node_from_iterable((LanguageToken('t', 'a', 0, 1),
+                              UtilityToken('empty', '', 1, 1),
+                              LanguageToken('t', 'b', 1, 2)))
+    assert [token.match for token in recursive_traverse(got)] == ['a', 'b']
+    assert node_str(got) == 'ab'
+    assert node_str(UtilityToken('empty', '', 0, 0)) == ''
+    assert node_str(LanguageToken('t', 'a', 0, 1)) == 'a'
+
+
+def test_traverse_deep_tree():
+    # nested much deeper than the recursion limit
+    got = LanguageToken('t', 'x', 0, 1)
+    for _ in range(10000):
+        got = LanguageNode(got, LanguageNode(LanguageToken('t', 'y')))
+    assert len(traverse(got)) == 10001
+    assert len(recursive_traverse(got)) == 10001
+    assert node_str(got) == 'x' + 'y' * 10000
+    assert node_len(got) == len(got) == 10001
+
+
+def test_symbol_table():
+    symbols = SymbolTable(('open_paren',))
+    first = symbols.intern(''.join(['fo', 'o']))
+    again = symbols.intern(''.join(['f', 'oo']))
+    assert first == again == 'foo' and first is again
+    assert 'foo' in symbols and len(symbols) == 1
+    assert symbols.code('open_paren') == 0
+    assert symbols.code('lisp_symbol') == 1
+    assert symbols.code('open_paren') == 0
+    assert symbols.tag(1) == 'lisp_symbol'
+
+
+def test_strongly_connected():
+    graph = {'a': ['b'], 'b': ['a', 'c'], 'c': [], 'd': ['d', 'a']}
+    got = [sorted(component) for component in strongly_connected(graph)]
+    # callees first
+    assert got == [['c'], ['a', 'b'], ['d']]
+
+
+def test_strongly_connected_long_chain():
+    chain = {idx: [idx + 1] for idx in range(10000)}
+    chain[10000] = []
+    got = strongly_connected(chain)
+    assert got[0] == [10000] and got[-1] == [0]
+    chain[10000] = [0]
+    assert len(strongly_connected(chain)) == 1
+
+
+def test_recursive_traverse_long_node():
+    tokens = tuple(LanguageToken('t', 'x') for _ in range(5000))
+    assert recursive_traverse(node_from_iterable(tokens)) == list(tokens)
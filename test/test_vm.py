@@ -0,0 +1,78 @@
+from hypothesis import given
+from hypothesis.strategies import text
+import pytest
+
+from benchmarks.inputs import scheme_source
+from poyais.combinator import make_parser_table, First
+from poyais.lisp import EBNF_SPEC
+from poyais.vm import vm_parser_table, compile_program, CALL, SET
+
+from helpers import SYMBOL_SPEC, CASES, with_positions, call_chain_spec
+
+
+@pytest.mark.parametrize('spec, rule, programs', CASES)
+def test_vm_same_trees(spec, rule, programs):
+    closures = make_parser_table(spec)[rule]
+    vm = vm_parser_table(spec)[rule]
+    for program in programs:
+        for pos in range(len(program) + 1):
+            assert (with_positions(vm(program, pos)) ==
+                    with_positions(closures(program, pos)))
+
+
+@given(text(alphabet='abcDE012+-xyz'))
+def test_vm_same_symbols(program):
+    closures = make_parser_table(SYMBOL_SPEC)['symbol']
+    vm = vm_parser_table(SYMBOL_SPEC)['symbol']
+    assert with_positions(vm(program, 0)) == with_positions(
+        closures(program, 0))
+
+
+def test_vm_same_program():
+    source = scheme_source(2048)
+    closures = make_parser_table(EBNF_SPEC)['program']
+    vm = vm_parser_table(EBNF_SPEC)['program']
+    assert with_positions(vm(source, 0)) == with_positions(
+        closures(source, 0))
+
+
+def test_vm_has_no_recursion_limit():
+    spec = 'list = "(", { list }, ")" ;'
+    source = "(" * 5000 + ")" * 5000
+    got = compile_program(spec).parse('list', source)
+    assert (got.start, got.end) == (0, len(source))
+
+
+def test_vm_max_depth():
+    spec = 'list = "(", { list }, ")" ;'
+    with pytest.raises(RecursionError):
+        compile_program(spec, max_depth=10).parse('list', "(" * 20)
+
+
+def test_vm_collapses_literals():
+    program = compile_program(SYMBOL_SPEC)
+    ops = [op for op, _ in program.code]
+    assert CALL not in ops
+    assert (SET, frozenset('abcDE012+-')) in program.code
+
+
+def test_vm_undefined_rule():
+    with pytest.raises(KeyError):
+        compile_program('a = b ;')
+
+
+def test_vm_analysis_is_per_rule():
+    # following every call on every question takes 2 ** depth steps
+    program = compile_program(call_chain_spec(60))
+    assert program.parse('r59', 'x' * 60).end == 60
+    assert program.analysis.rule_firsts['r59'].chars == {'x'}
+
+
+def test_vm_recursive_first_sets():
+    program = compile_program(
+        'list = ( "(", { list }, ")" ) | atom ; atom = "a" | "b" ;')
+    assert program.analysis.rule_firsts['list'] == First(
+        frozenset('(ab'), False)
+    assert program.analysis.rule_literals['list'] is None
+    assert program.analysis.rule_literals['atom'] == ('a', 'b')
+    assert str(program.parse('list', '((a)b)')) == '((a)b)'